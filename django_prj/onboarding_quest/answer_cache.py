@@ -0,0 +1,141 @@
+# 의미 기반 답변 캐시 (부서 + doc_filter + 질의 임베딩 유사도)
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from retrieval_types import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # 코사인 유사도 기준
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))  # 초
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))  # 캐시 키(부서+필터)별 최대 항목 수
+
+
+class _CacheEntry:
+    __slots__ = ("vector", "question", "answer", "contexts", "versions", "created")
+
+    def __init__(self, vector, question, answer, contexts, versions, created):
+        self.vector = vector
+        self.question = question
+        self.answer = answer
+        self.contexts = contexts
+        self.versions = versions
+        self.created = created
+
+
+class SemanticAnswerCache:
+    """
+    (department_id, doc_filter) 별로 이전 답변과 질의 벡터를 보관하고,
+    새 질의 벡터와의 코사인 유사도가 threshold 이상이면 저장된 답변을 재사용
+    - 항목은 저장 당시 검색한 컬렉션들의 버전을 기억하고, 문서 업로드/삭제로
+      컬렉션 버전이 바뀌면 더 이상 일치하지 않음 (cache_versions 참고)
+    - 캐시는 워커 프로세스별로 유지되고, 무효화는 같은 호스트의 공유 버전 카운터로 전파
+      (다중 호스트에서는 다른 서버의 문서 변경이 ANSWER_CACHE_TTL까지 반영되지 않음)
+    - 키에 대화 맥락이 없으므로 히스토리가 있는 후속 질문은 조회/저장하지 않음 (skip으로 집계만)
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: int = 3600, max_entries: int = 256):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple, OrderedDict] = {}
+        self._lock = threading.Lock()
+        self._counter = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    @staticmethod
+    def make_key(department_id, doc_filter) -> Tuple:
+        return (int(department_id or 0), tuple(sorted(doc_filter or [])))
+
+    @staticmethod
+    def _normalize(query_vec) -> np.ndarray:
+        vector = np.asarray(query_vec, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, department_id, doc_filter, query_vec, versions: Dict[str, int]) -> Optional[dict]:
+        """versions: 검색 대상 컬렉션들의 현재 버전 (cache_versions.get_versions)"""
+        key = self.make_key(department_id, doc_filter)
+        with self._lock:
+            bucket = self._entries.get(key)
+            candidates = list(bucket.items()) if bucket else []
+
+        best_id, best_entry, best_score = None, None, self.threshold
+        if candidates:
+            vector = self._normalize(query_vec)
+            now = time.time()
+            for entry_id, entry in candidates:
+                if now - entry.created > self.ttl:
+                    continue
+                score = float(np.dot(vector, entry.vector))
+                if score >= best_score:
+                    best_id, best_entry, best_score = entry_id, entry, score
+
+        if best_entry is not None and best_entry.versions != versions:
+            # 컬렉션이 변경된 뒤에 저장된 답변 → 폐기
+            with self._lock:
+                self._entries.get(key, {}).pop(best_id, None)
+            best_entry = None
+
+        with self._lock:
+            if best_entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        logger.info(f"🎯 답변 캐시 적중 (유사도 {best_score:.3f}) - 원 질문: {best_entry.question}")
+        return {
+            "answer": best_entry.answer,
+            "contexts": list(best_entry.contexts),
+            "similarity": best_score,
+            "cached_question": best_entry.question,
+        }
+
+    def skip(self):
+        """캐시를 쓰지 않은 후속 질문 집계"""
+        with self._lock:
+            self.skipped += 1
+
+    def store(self, department_id, doc_filter, query_vec, versions: Dict[str, int],
+              question: str, answer: str, contexts: List[RetrievedChunk]):
+        """versions는 답변 생성 전에 조회한 값을 넘겨야 생성 도중의 문서 변경이 반영됨"""
+        if any(v < 0 for v in versions.values()):
+            return
+        entry = _CacheEntry(
+            vector=self._normalize(query_vec),
+            question=question,
+            answer=answer,
+            contexts=list(contexts),
+            versions=versions,
+            created=time.time(),
+        )
+        key = self.make_key(department_id, doc_filter)
+        with self._lock:
+            self._counter += 1
+            bucket = self._entries.setdefault(key, OrderedDict())
+            bucket[self._counter] = entry
+            while len(bucket) > self.max_entries:
+                bucket.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "lookups": lookups,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped_followups": self.skipped,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": sum(len(bucket) for bucket in self._entries.values()),
+                "threshold": self.threshold,
+            }
@@ -0,0 +1,93 @@
+# DB 연결 벤치마크: 요청마다 psycopg2.connect vs 공용 커넥션 풀의 턴당 DB 오버헤드 비교
+#
+# 사용법 (django_prj/onboarding_quest 에서, .env의 DB_* 설정 사용):
+#   python benchmarks/bench_db_pool.py --turns 200
+#   python benchmarks/bench_db_pool.py --turns 200 --threads 8   # 동시 요청 상황
+#
+# 한 턴은 RAG 그래프가 DB를 쓰는 횟수만큼(문서 필터 조회, 히스토리 로드, 메시지 저장 2회) 연결을 사용한다.
+import os
+import sys
+import time
+import argparse
+import statistics
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_pool import PostgresConnectionPool  # noqa: E402
+
+load_dotenv()
+DB_CONFIG = {
+    'host': os.getenv("DB_HOST", "localhost"),
+    'port': os.getenv("DB_PORT", "5432"),
+    'database': os.getenv("DB_NAME", "onboarding_quest_db"),
+    'user': os.getenv("DB_USER", "postgres"),
+    'password': os.getenv("DB_PASSWORD", "")
+}
+
+# 턴당 DB 사용 횟수 (읽기 쿼리로 대체해 실제 데이터는 변경하지 않음)
+TURN_QUERIES = [
+    "SELECT 1",  # doc_filter → 컬렉션 조회
+    "SELECT 1",  # 세션 히스토리 로드
+    "SELECT 1",  # 사용자 메시지 저장
+    "SELECT 1",  # 봇 메시지 저장
+]
+
+
+@contextmanager
+def direct_connection():
+    """기존 방식: 매번 새 연결"""
+    conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_turn(connection_factory):
+    start = time.perf_counter()
+    for query in TURN_QUERIES:
+        with connection_factory() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            cursor.fetchall()
+    return (time.perf_counter() - start) * 1000
+
+
+def measure(name, connection_factory, turns, threads):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        latencies = list(executor.map(lambda _: run_turn(connection_factory), range(turns)))
+        total = time.perf_counter() - start
+    ordered = sorted(latencies)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(f"[{name}] 턴당 평균 {statistics.mean(latencies):.2f}ms | p50 {statistics.median(latencies):.2f}ms | "
+          f"p95 {p95:.2f}ms | 처리량 {turns / total:.1f} 턴/초")
+    return statistics.mean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="턴당 DB 연결 오버헤드 벤치마크")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--pool-max", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"DB: {DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']} | 턴 {args.turns}회 | 스레드 {args.threads}개")
+    before = measure("connect", direct_connection, args.turns, args.threads)
+
+    db_pool = PostgresConnectionPool(DB_CONFIG, maxconn=args.pool_max, cursor_factory=RealDictCursor)
+    run_turn(db_pool.connection)  # 워밍업 (첫 연결 생성)
+    after = measure("pool", db_pool.connection, args.turns, args.threads)
+    print(f"턴당 오버헤드 감소: {before - after:.2f}ms ({before / after:.1f}x) | 풀 상태: {db_pool.stats()}")
+    db_pool.close()
+
+
+if __name__ == "__main__":
+    main()
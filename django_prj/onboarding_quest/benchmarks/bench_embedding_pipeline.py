@@ -0,0 +1,131 @@
+# 임베딩 파이프라인 벤치마크: 단일 호출 vs 토큰 예산 배치 + 동시 요청 + 적응형 백오프 (OpenAI 호출 없음)
+#
+# 사용법 (django_prj/onboarding_quest 에서):
+#   python benchmarks/bench_embedding_pipeline.py --chunks 2000
+#   python benchmarks/bench_embedding_pipeline.py --chunks 2000 --tpm 400000 --concurrency 1 4 8
+#
+# 가상 API: 요청당 지연 = 기본 지연 + 토큰 수 비례, 분당 토큰 한도(--tpm)를 넘으면 429,
+# --error-rate 확률로 일시 오류(500), 요청당 토큰이 --max-request-tokens를 넘으면 400.
+# 단일 호출은 오류 한 번에 문서 전체를 다시 보내는 기존 방식.
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_packing import count_tokens  # noqa: E402
+from embedding_pipeline import EmbeddingPipeline  # noqa: E402
+
+
+class SimulatedError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SimulatedEmbeddingAPI:
+    """분당 토큰 한도 + 지연 + 일시 오류를 흉내 내는 임베딩 API"""
+
+    def __init__(self, tpm: int, base_latency: float, per_token_latency: float, error_rate: float,
+                 max_request_tokens: int, seed: int = 0):
+        self.tpm = tpm
+        self.max_request_tokens = max_request_tokens
+        self.base_latency = base_latency
+        self.per_token_latency = per_token_latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.window = deque()  # [(시각, 토큰 수)]
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+
+    def embed(self, texts):
+        tokens = sum(count_tokens(text) for text in texts)
+        if tokens > self.max_request_tokens:
+            raise SimulatedError(400, f"Requested {tokens} tokens, max_tokens_per_request is {self.max_request_tokens}")
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self.window and now - self.window[0][0] > 60:
+                self.window.popleft()
+            used = sum(t for _, t in self.window)
+            if used + tokens > self.tpm:
+                self.rate_limited += 1
+                raise SimulatedError(429, "Rate limit reached for requests")
+            self.window.append((now, tokens))
+            failed = self.random.random() < self.error_rate
+        time.sleep(self.base_latency + tokens * self.per_token_latency)
+        if failed:
+            raise SimulatedError(500, "The server had an error while processing your request")
+        return [[float(len(text))] * 8 for text in texts]
+
+
+def make_chunks(count: int, rng):
+    words = ["연차", "휴가", "신청", "승인", "규정", "보안", "출장", "정산", "교육", "평가", "근태", "복리후생"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(150, 500))) for _ in range(count)]
+
+
+def run_single_call(api, texts, max_attempts=5):
+    """기존 방식: 문서 전체를 한 번에, 오류 시 전체 재시도"""
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return api.embed(texts), attempt - 1
+        except SimulatedError as e:
+            if e.status_code == 400:
+                raise RuntimeError(str(e))
+            time.sleep(min(8, 2 ** (attempt - 1)) * 0.1)
+    raise RuntimeError("단일 호출 재시도 한도 초과")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="임베딩 파이프라인 처리량 벤치마크 (가상 API)")
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--tpm", type=int, default=1_000_000, help="가상 API 분당 토큰 한도")
+    parser.add_argument("--base-latency", type=float, default=0.15, help="요청당 기본 지연 (초)")
+    parser.add_argument("--per-token-latency", type=float, default=0.000004, help="토큰당 지연 (초)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="요청당 일시 오류 확률")
+    parser.add_argument("--max-request-tokens", type=int, default=300_000, help="가상 API 요청당 최대 토큰")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 4, 8])
+    parser.add_argument("--batch-tokens", type=int, default=16000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    texts = make_chunks(args.chunks, rng)
+    total_tokens = sum(count_tokens(text) for text in texts)
+    print(f"청크 {len(texts)}개 / {total_tokens}토큰 | TPM {args.tpm:,} | 오류율 {args.error_rate:.0%}")
+
+    api = SimulatedEmbeddingAPI(
+        args.tpm, args.base_latency, args.per_token_latency, args.error_rate, args.max_request_tokens
+    )
+    start = time.perf_counter()
+    try:
+        _, retries = run_single_call(api, texts)
+        elapsed = time.perf_counter() - start
+        print(f"{'단일 호출':<14} {elapsed:7.2f}초 | {len(texts) / elapsed:8.1f}청크/초 | "
+              f"{total_tokens / elapsed:10.0f}토큰/초 | 전체 재전송 {retries}회")
+    except RuntimeError as e:
+        print(f"{'단일 호출':<14} 실패: {e} (429 {api.rate_limited}회)")
+
+    for concurrency in args.concurrency:
+        api = SimulatedEmbeddingAPI(
+            args.tpm, args.base_latency, args.per_token_latency, args.error_rate, args.max_request_tokens
+        )
+        pipeline = EmbeddingPipeline(
+            api.embed, max_batch_tokens=args.batch_tokens, concurrency=concurrency, backoff_base=0.2
+        )
+        start = time.perf_counter()
+        vectors = pipeline.embed(texts)
+        elapsed = time.perf_counter() - start
+        assert all(v[0] == len(t) for v, t in zip(vectors, texts)), "순서 불일치"
+        stats = pipeline.stats()
+        print(f"{'파이프라인 x' + str(concurrency):<14} {elapsed:7.2f}초 | {len(texts) / elapsed:8.1f}청크/초 | "
+              f"{total_tokens / elapsed:10.0f}토큰/초 | 요청 {api.requests}회, 배치 재시도 {stats['retries']}회, "
+              f"429 {stats['rate_limited']}회, 최종 동시 {stats['concurrency']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# 내장(NumPy/mmap) 벡터 저장소 벤치마크: 정확 검색 vs IVF의 recall@k / 지연 / 동시 처리량 (Qdrant 불필요)
+#
+# 사용법 (django_prj/onboarding_quest 에서):
+#   python benchmarks/bench_numpy_vector_store.py --points 50000
+#   python benchmarks/bench_numpy_vector_store.py --points 200000 --nprobe 4 8 16 --threads 8
+#
+# 임시 디렉터리에 컬렉션을 만들고 측정 후 삭제한다. 필터 검색은 부서 10개 중 하나를 고르는 조건으로 측정.
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from qdrant_client.models import (
+    VectorParams, Distance, PointStruct, Filter, FieldCondition, MatchValue, SparseVectorParams, Modifier
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_store  # noqa: E402
+from vector_store import NumpyVectorStore  # noqa: E402
+
+COLLECTION = "bench_numpy"
+
+
+def build(store, args, rng):
+    store.create_collection(
+        COLLECTION,
+        vectors_config=VectorParams(size=args.dim, distance=Distance.COSINE),
+        sparse_vectors_config={"sparse": SparseVectorParams(modifier=Modifier.IDF)}
+    )
+    scale = 1.0 / np.sqrt(1.0 + np.arange(args.dim, dtype=np.float32) / 16.0)
+    centers = rng.standard_normal((256, args.dim), dtype=np.float32) * scale
+    start = time.perf_counter()
+    for offset in range(0, args.points, args.batch):
+        size = min(args.batch, args.points - offset)
+        vectors = centers[rng.integers(0, 256, size)] + 0.5 * rng.standard_normal((size, args.dim), np.float32) * scale
+        store.upsert(COLLECTION, points=[
+            PointStruct(
+                id=offset + i,
+                vector=vectors[i].tolist(),
+                payload={"text": f"chunk {offset + i}", "metadata": {"department_id": (offset + i) % 10}}
+            )
+            for i in range(size)
+        ])
+    print(f"적재: {args.points}개 × {args.dim}차원 | {time.perf_counter() - start:.1f}초")
+    return centers, scale
+
+
+def run_queries(store, queries, query_filter, k, threads):
+    def one(query):
+        start = time.perf_counter()
+        ids = [p.id for p in store.query_points(COLLECTION, query=query, query_filter=query_filter, limit=k).points]
+        return ids, (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(one, queries))
+        elapsed = time.perf_counter() - start
+    latencies = sorted(latency for _, latency in results)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return [ids for ids, _ in results], statistics.median(latencies), p95, len(queries) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="내장 벡터 저장소 exact / IVF 벤치마크")
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[4, 8, 16])
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--dir", help="저장 디렉터리 (기본: 임시 디렉터리)")
+    args = parser.parse_args()
+
+    path = args.dir or tempfile.mkdtemp(prefix="bench_numpy_store_")
+    rng = np.random.default_rng(42)
+    store = NumpyVectorStore(path)
+    try:
+        centers, scale = build(store, args, rng)
+        size_mb = sum(
+            os.path.getsize(os.path.join(path, COLLECTION, name)) for name in os.listdir(os.path.join(path, COLLECTION))
+        ) / 1024 ** 2
+        print(f"디스크 사용량: {size_mb:.1f}MB (float16 행렬 + payload 로그)")
+
+        queries = [
+            (centers[rng.integers(0, 256)] + 0.5 * rng.standard_normal(args.dim, np.float32) * scale).tolist()
+            for _ in range(args.queries)
+        ]
+        dept_filter = Filter(must=[FieldCondition(key="metadata.department_id", match=MatchValue(value=3))])
+
+        for label, query_filter in (("필터 없음", None), ("부서 필터", dept_filter)):
+            vector_store.NUMPY_SEARCH_MODE = "exact"
+            truth, p50, p95, qps = run_queries(store, queries, query_filter, args.k, args.threads)
+            print(f"[{label}] exact       p50 {p50:7.1f}ms | p95 {p95:7.1f}ms | {qps:7.1f} qps | recall 1.000")
+
+            vector_store.NUMPY_SEARCH_MODE = "ivf"
+            vector_store.IVF_MIN_POINTS = 0
+            for nprobe in args.nprobe:
+                vector_store.IVF_NPROBE = nprobe
+                found, p50, p95, qps = run_queries(store, queries, query_filter, args.k, args.threads)
+                recall = statistics.mean(len(set(a) & set(b)) / args.k for a, b in zip(found, truth))
+                print(f"[{label}] ivf(np={nprobe:<3}) p50 {p50:7.1f}ms | p95 {p95:7.1f}ms | {qps:7.1f} qps | recall {recall:.3f}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
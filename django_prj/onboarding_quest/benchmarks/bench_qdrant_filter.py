@@ -0,0 +1,106 @@
+# doc_filter 검색 벤치마크: 인덱스 없는 MatchText vs keyword 인덱스 + MatchAny
+#
+# 사용법 (Qdrant 실행 후, django_prj/onboarding_quest 에서):
+#   python benchmarks/bench_qdrant_filter.py --points 100000
+#   python benchmarks/bench_qdrant_filter.py --points 200000 --dim 3072 --files 2000
+#
+# 임시 컬렉션 두 개(bench_filter_plain / bench_filter_indexed)를 만들고 측정 후 삭제한다.
+import os
+import time
+import argparse
+import statistics
+
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    VectorParams, Distance, PointStruct, Filter, FieldCondition, MatchText, MatchAny, PayloadSchemaType
+)
+
+load_dotenv()
+
+PLAIN_COLLECTION = "bench_filter_plain"
+INDEXED_COLLECTION = "bench_filter_indexed"
+
+
+def build_collection(client, name, args, rng, indexed):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(name, vectors_config=VectorParams(size=args.dim, distance=Distance.COSINE))
+    if indexed:
+        client.create_payload_index(name, "metadata.original_file_name", PayloadSchemaType.KEYWORD, wait=True)
+        client.create_payload_index(name, "metadata.department_id", PayloadSchemaType.INTEGER, wait=True)
+
+    for start in range(0, args.points, args.batch):
+        size = min(args.batch, args.points - start)
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        points = [
+            PointStruct(
+                id=start + i,
+                vector=vectors[i].tolist(),
+                payload={"metadata": {
+                    "original_file_name": f"문서_{(start + i) % args.files:05d}.pdf",
+                    "department_id": (start + i) % 10,
+                }}
+            )
+            for i in range(size)
+        ]
+        client.upsert(name, points=points, wait=True)
+    print(f"  {name}: {args.points}개 포인트 적재 완료")
+
+
+def measure(client, name, build_filter, args, rng):
+    latencies = []
+    for _ in range(args.queries):
+        targets = [f"문서_{n:05d}.pdf" for n in rng.choice(args.files, size=args.filter_files, replace=False)]
+        query = rng.standard_normal(args.dim, dtype=np.float32).tolist()
+        start = time.perf_counter()
+        client.search(name, query_vector=query, query_filter=build_filter(targets), limit=10)
+        latencies.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(latencies)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    return statistics.median(ordered), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="doc_filter 필터 검색 지연 벤치마크")
+    parser.add_argument("--qdrant-url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--files", type=int, default=1000, help="서로 다른 파일명 수")
+    parser.add_argument("--filter-files", type=int, default=1, help="질의당 doc_filter 파일 수")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--keep", action="store_true", help="측정 후 컬렉션 유지")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.qdrant_url, timeout=120)
+    rng = np.random.default_rng(42)
+
+    print(f"적재: {args.points}개 포인트, {args.dim}차원, 파일 {args.files}개")
+    build_collection(client, PLAIN_COLLECTION, args, rng, indexed=False)
+    build_collection(client, INDEXED_COLLECTION, args, rng, indexed=True)
+
+    # 기존 방식: 파일명마다 MatchText 조건을 must로 나열 (인덱스 없음)
+    def match_text_filter(targets):
+        return Filter(must=[
+            FieldCondition(key="metadata.original_file_name", match=MatchText(text=name)) for name in targets
+        ])
+
+    # 변경 방식: keyword 인덱스 + MatchAny 정확 일치
+    def match_any_filter(targets):
+        return Filter(must=[FieldCondition(key="metadata.original_file_name", match=MatchAny(any=targets))])
+
+    plain = measure(client, PLAIN_COLLECTION, match_text_filter, args, rng)
+    indexed = measure(client, INDEXED_COLLECTION, match_any_filter, args, rng)
+    print(f"[MatchText, 인덱스 없음] p50 {plain[0]:.1f}ms | p95 {plain[1]:.1f}ms")
+    print(f"[MatchAny, keyword 인덱스] p50 {indexed[0]:.1f}ms | p95 {indexed[1]:.1f}ms")
+    print(f"p50 개선: {plain[0] / indexed[0]:.1f}x")
+
+    if not args.keep:
+        client.delete_collection(PLAIN_COLLECTION)
+        client.delete_collection(INDEXED_COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# 리랭커 벤치마크: hybrid(BM25 + dense) vs LLM 선택 일치도 및 지연 시간 비교
+#
+# 사용법 (django_prj/onboarding_quest 에서):
+#   python benchmarks/bench_reranker.py              # hybrid vs 정답 라벨
+#   python benchmarks/bench_reranker.py --with-llm   # LLM 리랭커까지 실행 (OPENAI_API_KEY 필요)
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rerankers import HybridBM25Reranker, LLMReranker  # noqa: E402
+from retrieval_types import RetrievedChunk  # noqa: E402
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "rerank_corpus.json")
+
+
+def build_candidates(documents: dict, dense_scores: dict):
+    """검색 노드와 같은 형태의 document_candidates 생성 (파일별 그룹, 점수 높은 문서 먼저)"""
+    grouped = []
+    for file_name, scores in dense_scores.items():
+        results = []
+        for chunk, score in zip(documents[file_name], scores):
+            results.append(RetrievedChunk(
+                file_name=file_name,
+                title=chunk["title"],
+                hierarchy_path=chunk.get("hierarchy_path"),
+                text=chunk["text"],
+                score=score
+            ))
+        results.sort(key=lambda r: r.score, reverse=True)
+        grouped.append((file_name, results))
+    grouped.sort(key=lambda item: item[1][0].score, reverse=True)
+
+    candidates = []
+    for i, (file_name, results) in enumerate(grouped, 1):
+        chunks_text = "\n".join(
+            f"- {r.hierarchy_path or r.title}: {r.text[:200]}..."
+            for r in results[:3]
+        )
+        candidates.append((i, file_name, chunks_text, results))
+    return candidates
+
+
+def selected_files(candidates, idxs):
+    return {candidates[i - 1][1] for i in idxs}
+
+
+def run(reranker, cases, repeat):
+    selections, latencies = [], []
+    for query, candidates in cases:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            idxs = reranker.select(query, candidates)
+        latencies.append((time.perf_counter() - start) / repeat * 1000)
+        selections.append(selected_files(candidates, idxs))
+    return selections, latencies
+
+
+def report(name, selections, latencies, golds):
+    top1_hits = sum(1 for sel, gold in zip(selections, golds) if sel & gold)
+    exact = sum(1 for sel, gold in zip(selections, golds) if sel == gold)
+    print(f"[{name}] 정답 문서 포함률: {top1_hits}/{len(golds)} | 정확 일치: {exact}/{len(golds)} | "
+          f"지연 평균 {statistics.mean(latencies):.2f}ms / 최대 {max(latencies):.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="리랭커 선택 일치도/지연 벤치마크")
+    parser.add_argument("--fixture", default=FIXTURE_PATH)
+    parser.add_argument("--repeat", type=int, default=50, help="hybrid 리랭커 반복 측정 횟수")
+    parser.add_argument("--with-llm", action="store_true", help="LLM 리랭커도 실행해 일치도 비교")
+    args = parser.parse_args()
+
+    with open(args.fixture, encoding="utf-8") as f:
+        fixture = json.load(f)
+
+    cases = [(q["query"], build_candidates(fixture["documents"], q["dense"])) for q in fixture["queries"]]
+    golds = [set(q["gold"]) for q in fixture["queries"]]
+
+    hybrid_sel, hybrid_lat = run(HybridBM25Reranker(), cases, args.repeat)
+    report("hybrid", hybrid_sel, hybrid_lat, golds)
+
+    if args.with_llm:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(openai_api_key=os.getenv("OPENAI_API_KEY"), model_name="gpt-4o-mini")
+        llm_sel, llm_lat = run(LLMReranker(llm), cases, 1)
+        report("llm", llm_sel, llm_lat, golds)
+        agree = sum(1 for a, b in zip(hybrid_sel, llm_sel) if a == b)
+        overlap = sum(1 for a, b in zip(hybrid_sel, llm_sel) if a & b)
+        print(f"[hybrid vs llm] 선택 완전 일치: {agree}/{len(cases)} | 1개 이상 겹침: {overlap}/{len(cases)}")
+
+    for (query, _), sel, gold in zip(cases, hybrid_sel, golds):
+        mark = "✅" if sel & gold else "❌"
+        print(f"  {mark} {query} → {sorted(sel)} (정답 {sorted(gold)})")
+
+
+if __name__ == "__main__":
+    main()
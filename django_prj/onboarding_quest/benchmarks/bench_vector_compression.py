@@ -0,0 +1,177 @@
+# 벡터 압축 벤치마크: 양자화(scalar/binary) · Matryoshka 2단계 검색의 recall@k / 지연 / 메모리 비교
+#
+# 사용법 (Qdrant 실행 후, django_prj/onboarding_quest 에서):
+#   python benchmarks/bench_vector_compression.py --points 20000                      # 합성 벡터
+#   python benchmarks/bench_vector_compression.py --source rag_common --queries 200   # 실제 컬렉션 벡터 샘플
+#   python benchmarks/bench_vector_compression.py --configs none,binary,mrl256,binary+mrl256 --deployment 100000 1000000
+#
+# 정답(ground truth)은 전체 3072차원 벡터의 정확한 코사인 top-k (numpy).
+# 설정마다 임시 컬렉션(bench_vc_*)을 만들어 측정 후 삭제한다.
+# 메모리는 청크당 RAM 상주 벡터 바이트 추정치 (양자화 시 원본은 RAG_FULL_VECTOR_ON_DISK=true로 디스크에 둔다고 가정).
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct, Prefetch, OptimizersConfigDiff, CollectionStatus
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_compression import (  # noqa: E402
+    MRL_VECTOR_NAME, quantization_config, search_params, dense_vectors_config, truncate_vector
+)
+
+load_dotenv()
+
+QUANTIZED_BYTES = {"none": lambda dim: dim * 4, "scalar": lambda dim: dim, "binary": lambda dim: dim // 8}
+
+
+def parse_config(name: str):
+    """'binary+mrl256' → ('binary', 256)"""
+    mode, mrl_dim = "none", 0
+    for part in name.split("+"):
+        if part.startswith("mrl"):
+            mrl_dim = int(part[3:])
+        elif part in QUANTIZED_BYTES:
+            mode = part
+        else:
+            raise ValueError(f"알 수 없는 설정: {part}")
+    return mode, mrl_dim
+
+
+def ram_bytes_per_point(dim: int, mode: str, mrl_dim: int) -> int:
+    """청크당 RAM 상주 벡터 바이트 (양자화 시 원본 벡터는 디스크)"""
+    total = QUANTIZED_BYTES[mode](dim)
+    if mrl_dim:
+        total += QUANTIZED_BYTES[mode](mrl_dim)
+    return total
+
+
+def normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def synthetic_vectors(count: int, dim: int, rng):
+    """앞쪽 차원에 정보가 몰린(Matryoshka 학습 임베딩과 비슷한) 합성 벡터"""
+    scale = 1.0 / np.sqrt(1.0 + np.arange(dim, dtype=np.float32) / 16.0)
+    centers = rng.standard_normal((64, dim), dtype=np.float32) * scale
+    vectors = centers[rng.integers(0, 64, count)] + 0.6 * rng.standard_normal((count, dim), dtype=np.float32) * scale
+    return normalize(vectors)
+
+
+def sample_vectors(client, collection_name: str, count: int):
+    """실제 컬렉션에서 dense 벡터 샘플링"""
+    vectors, offset = [], None
+    while len(vectors) < count:
+        points, offset = client.scroll(collection_name, limit=256, offset=offset, with_vectors=True, with_payload=False)
+        for point in points:
+            vector = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+            if vector:
+                vectors.append(vector)
+        if offset is None:
+            break
+    return normalize(np.asarray(vectors[:count], dtype=np.float32))
+
+
+def build_collection(client, name, data, mode, mrl_dim, batch):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        name,
+        vectors_config=dense_vectors_config(data.shape[1], mrl_dim),
+        quantization_config=quantization_config(mode),
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=1000)  # 작은 컬렉션도 HNSW/양자화 인덱스 생성
+    )
+    for start in range(0, len(data), batch):
+        points = []
+        for i, vector in enumerate(data[start:start + batch], start):
+            vector = vector.tolist()
+            points.append(PointStruct(
+                id=i,
+                vector={"": vector, MRL_VECTOR_NAME: truncate_vector(vector, mrl_dim)} if mrl_dim else vector
+            ))
+        client.upsert(name, points=points, wait=True)
+    # 인덱스/양자화 사본 생성 완료까지 대기
+    while client.get_collection(name).status != CollectionStatus.GREEN:
+        time.sleep(0.5)
+
+
+def search(client, name, query, mode, mrl_dim, k, oversampling):
+    if mrl_dim:
+        response = client.query_points(
+            name,
+            prefetch=[Prefetch(
+                query=truncate_vector(query, mrl_dim),
+                using=MRL_VECTOR_NAME,
+                limit=int(k * oversampling),
+                params=search_params(mode)
+            )],
+            query=query,
+            limit=k
+        )
+    else:
+        response = client.query_points(name, query=query, limit=k, search_params=search_params(mode))
+    return [point.id for point in response.points]
+
+
+def measure(client, name, queries, truth, mode, mrl_dim, args):
+    recalls, latencies = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(client, name, query.tolist(), mode, mrl_dim, args.k, args.mrl_oversampling)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(found) & set(expected)) / args.k)
+    ordered = sorted(latencies)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    return statistics.mean(recalls), statistics.median(ordered), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="벡터 양자화 / MRL 2단계 검색 recall·지연·메모리 벤치마크")
+    parser.add_argument("--qdrant-url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--source", help="벡터를 샘플링할 실제 컬렉션 (없으면 합성 벡터)")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=3072, help="합성 벡터 차원")
+    parser.add_argument("--queries", type=int, default=100, help="색인하지 않고 질의로 쓸 벡터 수")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--configs", default="none,scalar,binary,mrl256,mrl512,binary+mrl256,binary+mrl512")
+    parser.add_argument("--mrl-oversampling", type=float, default=4.0, help="MRL 1단계 후보 수 = k × 배수")
+    parser.add_argument("--deployment", type=int, nargs="*", default=[100000, 1000000], help="RAM 추정용 청크 수")
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--keep", action="store_true", help="측정 후 컬렉션 유지")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.qdrant_url, timeout=300)
+    rng = np.random.default_rng(42)
+
+    if args.source:
+        data = sample_vectors(client, args.source, args.points + args.queries)
+        print(f"{args.source}에서 벡터 {len(data)}개 샘플링 ({data.shape[1]}차원)")
+    else:
+        data = synthetic_vectors(args.points + args.queries, args.dim, rng)
+        print(f"합성 벡터 {len(data)}개 생성 ({args.dim}차원)")
+    queries, corpus = data[:args.queries], data[args.queries:]
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k]
+
+    header = f"{'설정':<16} {'recall@' + str(args.k):>9} {'p50(ms)':>8} {'p95(ms)':>8} {'RAM/청크':>10}"
+    header += "".join(f" {'RAM@' + format(n, ','):>14}" for n in args.deployment)
+    print(header)
+    for config in args.configs.split(","):
+        mode, mrl_dim = parse_config(config.strip())
+        name = f"bench_vc_{config.strip().replace('+', '_')}"
+        build_collection(client, name, corpus, mode, mrl_dim, args.batch)
+        recall, p50, p95 = measure(client, name, queries, truth, mode, mrl_dim, args)
+        per_point = ram_bytes_per_point(corpus.shape[1], mode, mrl_dim)
+        row = f"{config:<16} {recall:>9.3f} {p50:>8.1f} {p95:>8.1f} {per_point / 1024:>8.2f}KB"
+        row += "".join(f" {per_point * n / 1024 ** 3:>12.2f}GB" for n in args.deployment)
+        print(row)
+        if not args.keep:
+            client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
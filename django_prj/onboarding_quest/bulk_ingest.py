@@ -0,0 +1,268 @@
+# 문서 일괄 적재 도구 (회사 문서 보관함 초기 적재 / 재적재)
+#
+# - 파싱/청크 분할(PDF·PPTX 로드, 조항 정규식)은 CPU 작업 → 프로세스 풀(--workers)에서 실행
+# - 임베딩/업로드는 비동기 단계(--uploaders개)에서 적재 작업 큐와 같은 upsert_document_chunks로 처리
+#   (임베딩은 embedding_pipeline이 배치·동시 요청·속도 제한을 관리, 청크 임베딩 저장소에 있는 본문은 재사용)
+# - 두 단계 사이는 크기 제한 큐(--queue-size) → 파싱이 앞서가도 메모리에 올라오는 문서 수가 제한됨
+# - 문서 식별 키(doc_key)는 --root 기준 상대 경로 → 폴더가 다른 같은 이름 파일은 다른 문서,
+#   같은 파일을 다시 적재하면(같은 --root) 바뀐 청크만 반영
+# - 끝난 파일은 매니페스트(JSONL)에 기록 → 다시 실행하면 같은 파티션에 같은 내용으로 적재된 파일은 건너뜀
+# - --dry-run: 파싱만 하고 파일별 청크 수, 예상 토큰(저장소에 없어 API로 보낼 토큰)을 출력 (쓰기 없음)
+#
+# 사용법 (django_prj/onboarding_quest 에서):
+#   python bulk_ingest.py data --department-id 3 --dry-run
+#   python bulk_ingest.py data "archive/**/*.pdf" --common --workers 8
+#   python bulk_ingest.py data --department-id 3 --manifest log/bulk_dept3.jsonl --restart
+#   python bulk_ingest.py /mnt/share/hr --root /mnt/share --department-id 3
+import os
+import json
+import glob
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from context_packing import count_tokens
+from document_chunking import split_document
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".csv", ".txt", ".md", ".html", ".pptx")
+DEFAULT_MANIFEST = os.path.join("log", "bulk_ingest_manifest.jsonl")
+
+
+def find_files(paths: List[str]) -> List[str]:
+    """디렉터리(하위 포함) / glob 패턴 / 파일 경로 → 지원 확장자 파일 절대 경로 목록"""
+    found = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                found.update(os.path.join(root, name) for name in names)
+        elif os.path.isfile(path):
+            found.add(path)
+        else:
+            found.update(glob.glob(path, recursive=True))
+    return sorted(
+        os.path.abspath(path) for path in found
+        if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+    )
+
+
+def document_key(path: str, root: str) -> str:
+    """적재 루트 기준 상대 경로 (/ 구분, 루트 밖의 파일은 절대 경로)"""
+    relative = os.path.relpath(path, root)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        relative = os.path.abspath(path)
+    return relative.replace(os.sep, "/")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_file(path: str) -> List[Tuple[str, dict]]:
+    """프로세스 풀 작업자: 파일 → [(청크 본문, 메타데이터)] (피클 비용을 줄이려 기본 타입으로 반환)"""
+    return [(doc.page_content, doc.metadata) for doc in split_document(path)]
+
+
+def load_manifest(path: str) -> Dict[Tuple[str, str], str]:
+    """매니페스트 → {(파일 경로, 파티션): 적재 완료된 내용 해시} (같은 파일의 마지막 기록 기준)"""
+    completed = {}
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 중단으로 잘린 마지막 줄
+            key = (entry["path"], entry["partition"])
+            if entry.get("status") == "succeeded":
+                completed[key] = entry["sha256"]
+            else:
+                completed.pop(key, None)
+    return completed
+
+
+class BulkIngestion:
+    """파싱 프로세스 풀 → 크기 제한 큐 → 비동기 임베딩/업로드 단계"""
+
+    def __init__(self, ingest, files: List[str], department_id=None, common_doc=False, workers: int = 4,
+                 uploaders: int = 2, queue_size: int = 8, manifest_path: str = DEFAULT_MANIFEST,
+                 restart: bool = False, dry_run: bool = False, root: str = "."):
+        """
+        Args:
+            ingest: embed_and_upsert 모듈 (upsert_document_chunks, chunk_embedding_store, partition_name)
+            root: 문서 식별 키 기준 디렉터리 (document_key)
+        """
+        self.ingest = ingest
+        self.files = files
+        self.department_id = department_id
+        self.common_doc = common_doc
+        self.workers = max(1, workers)
+        self.uploaders = max(1, uploaders)
+        self.queue_size = max(1, queue_size)
+        self.manifest_path = manifest_path
+        self.restart = restart
+        self.dry_run = dry_run
+        self.root = os.path.abspath(root)
+        self.partition = ingest.partition_name(department_id, common_doc)
+        self.counters = {
+            "files": len(files), "skipped": 0, "succeeded": 0, "failed": 0,
+            "chunks": 0, "tokens": 0, "api_tokens": 0, "added": 0, "unchanged": 0, "removed": 0,
+        }
+        self._finished = 0
+
+    def _record(self, entry: dict):
+        if self.dry_run:
+            return
+        entry.update(partition=self.partition, finished_at=datetime.now().isoformat(timespec="seconds"))
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _done(self, path: str, message: str):
+        self._finished += 1
+        logger.info(f"[{self._finished}/{len(self.files)}] {os.path.basename(path)} → {message}")
+
+    async def run(self) -> dict:
+        started = time.perf_counter()
+        if not self.dry_run:
+            os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        completed = {} if self.restart else load_manifest(self.manifest_path)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        parse_slots = asyncio.Semaphore(self.workers)  # 파싱 중 + 큐에 넣으려고 기다리는 파일 수
+        loop = asyncio.get_running_loop()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            async def parse(path: str, sha256: str):
+                try:
+                    try:
+                        chunks = await loop.run_in_executor(pool, parse_file, path)
+                    except Exception as e:
+                        self.counters["failed"] += 1
+                        self._record({"path": path, "sha256": sha256, "status": "failed", "error": f"파싱 실패: {e}"})
+                        self._done(path, f"❌ 파싱 실패: {e}")
+                        return
+                    await queue.put((path, sha256, chunks))  # 큐가 차 있으면 여기서 대기 (슬롯을 쥔 채로)
+                finally:
+                    parse_slots.release()
+
+            async def produce():
+                tasks = []
+                for path in self.files:
+                    sha256 = await asyncio.to_thread(file_sha256, path)
+                    if completed.get((path, self.partition)) == sha256:
+                        self.counters["skipped"] += 1
+                        self._done(path, "⏭️ 매니페스트에 적재 완료 기록 있음")
+                        continue
+                    await parse_slots.acquire()
+                    tasks.append(asyncio.create_task(parse(path, sha256)))
+                await asyncio.gather(*tasks)
+                for _ in range(self.uploaders):
+                    await queue.put(None)
+
+            consumers = [asyncio.create_task(self._consume(queue)) for _ in range(self.uploaders)]
+            await asyncio.gather(produce(), *consumers)
+
+        elapsed = time.perf_counter() - started
+        return {
+            **self.counters,
+            "dry_run": self.dry_run,
+            "partition": self.partition,
+            "elapsed_sec": round(elapsed, 1),
+            "files_per_sec": round((self.counters["succeeded"] + self.counters["failed"]) / elapsed, 2) if elapsed else 0.0,
+        }
+
+    async def _consume(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            path, sha256, chunks = item
+            texts = [text for text, _ in chunks]
+            tokens = sum(count_tokens(text) for text in texts)
+            self.counters["chunks"] += len(chunks)
+            self.counters["tokens"] += tokens
+
+            if self.dry_run:
+                store = self.ingest.chunk_embedding_store
+                stored = store.contains_many(texts) if store is not None else [False] * len(texts)
+                api_tokens = sum(count_tokens(text) for text, hit in zip(texts, stored) if not hit)
+                self.counters["api_tokens"] += api_tokens
+                self.counters["succeeded"] += 1
+                self._done(path, f"청크 {len(chunks)}개, 토큰 {tokens:,} (API 예상 {api_tokens:,})")
+                continue
+
+            split_docs = [Document(page_content=text, metadata=metadata) for text, metadata in chunks]
+            try:
+                result = await asyncio.to_thread(
+                    self.ingest.upsert_document_chunks, path, split_docs,
+                    self.department_id, self.common_doc, os.path.basename(path),
+                    doc_key=document_key(path, self.root)
+                )
+            except Exception as e:
+                self.counters["failed"] += 1
+                self._record({"path": path, "sha256": sha256, "status": "failed", "error": f"{type(e).__name__}: {e}"})
+                self._done(path, f"❌ 적재 실패: {e}")
+                continue
+            self.counters["succeeded"] += 1
+            for field in ("added", "unchanged", "removed"):
+                self.counters[field] += getattr(result, field)
+            self._record({
+                "path": path, "sha256": sha256, "status": "succeeded", "chunks": len(chunks), **result._asdict()
+            })
+            self._done(path, f"✅ {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="문서 일괄 적재 (프로세스 풀 파싱 + 비동기 임베딩/업로드)")
+    parser.add_argument("paths", nargs="*", default=["data"], help="디렉터리(하위 포함), 파일 또는 glob 패턴")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--department-id", type=int, help="부서 문서로 적재")
+    target.add_argument("--common", action="store_true", help="공통 문서로 적재")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="파싱 프로세스 수")
+    parser.add_argument("--uploaders", type=int, default=2, help="동시에 임베딩/업로드할 문서 수")
+    parser.add_argument("--queue-size", type=int, default=8, help="파싱이 끝나 업로드를 기다리는 문서 수 상한")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="진행 매니페스트(JSONL) 경로")
+    parser.add_argument("--root", default=".", help="문서 식별 기준 디렉터리 (다시 적재할 때 같은 값 사용)")
+    parser.add_argument("--restart", action="store_true", help="매니페스트를 무시하고 모든 파일 다시 적재")
+    parser.add_argument("--dry-run", action="store_true", help="파싱만 하고 청크 수/예상 토큰 출력")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    files = find_files(args.paths)
+    if not files:
+        parser.error(f"적재할 문서가 없습니다: {' '.join(args.paths)} (지원 형식: {', '.join(SUPPORTED_EXTENSIONS)})")
+
+    import embed_and_upsert  # 파싱 작업자 프로세스에서는 클라이언트를 만들지 않도록 여기서 import
+
+    ingestion = BulkIngestion(
+        embed_and_upsert, files,
+        department_id=args.department_id,
+        common_doc=args.common,
+        workers=args.workers,
+        uploaders=args.uploaders,
+        queue_size=args.queue_size,
+        manifest_path=args.manifest,
+        restart=args.restart,
+        dry_run=args.dry_run,
+        root=args.root,
+    )
+    summary = asyncio.run(ingestion.run())
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    if summary["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# 캐시 무효화용 버전 카운터 (gunicorn 워커 간 공유 SQLite)
+#
+# 단일 호스트 전용: 카운터가 호스트 로컬 파일(RAG_CACHE_DIR)이라 같은 서버의 프로세스끼리만 공유된다.
+# 여러 서버에서 FastAPI/Django/적재 작업을 나눠 실행하면 다른 서버에서 올린 버전이 보이지 않아
+# 문서 변경 후에도 답변 캐시는 ANSWER_CACHE_TTL, doc_filter 인덱스는 DOC_INDEX_MAX_AGE까지 이전 내용을 사용한다.
+import os
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable
+
+from embedding_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DB_PATH = os.path.join(CACHE_DIR, "cache_versions.sqlite3")
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(VERSIONS_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(VERSIONS_DB_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_version (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        _local.conn = conn
+    return conn
+
+
+def bump_versions(names: Iterable[str]):
+    """이름(컬렉션 등)별 버전을 1씩 올려 해당 이름에 의존하는 캐시 항목을 모두 무효화"""
+    names = [name for name in dict.fromkeys(names) if name]
+    if not names:
+        return
+    try:
+        _connect().executemany(
+            "INSERT INTO cache_version (name, version) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+            [(name,) for name in names]
+        )
+        logger.info(f"🔄 캐시 버전 갱신: {names}")
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ 캐시 버전 갱신 실패: {names} | 이유: {e}")
+
+
+def get_versions(names: Iterable[str]) -> Dict[str, int]:
+    """이름별 현재 버전 조회 (한 번도 갱신되지 않은 이름은 0)"""
+    names = list(dict.fromkeys(names))
+    versions = {name: 0 for name in names}
+    if not names:
+        return versions
+    try:
+        placeholders = ",".join("?" for _ in names)
+        rows = _connect().execute(
+            f"SELECT name, version FROM cache_version WHERE name IN ({placeholders})", names
+        ).fetchall()
+        versions.update(dict(rows))
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ 캐시 버전 조회 실패: {e}")
+        versions = {name: -1 for name in names}  # 조회 실패 시 어떤 캐시 항목과도 일치하지 않도록
+    return versions
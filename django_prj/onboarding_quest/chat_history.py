@@ -0,0 +1,200 @@
+# 채팅 히스토리 롤링 윈도우 캐시
+#
+# - 세션의 최근 N턴만 (session_id, create_time DESC, message_id DESC) 인덱스로 조회 (LIMIT 2N+1)
+# - 활성 세션은 메모리에 최근 N턴을 유지하고, 메시지 저장 시 record_message로 갱신 → 턴당 O(N)
+# - 캐시에 없는 세션은 다음 조회 때 DB에서 다시 읽음 (오래된 세션부터 제거)
+# - 윈도우를 쓰기 전에 마지막 확인 이후 DB에 추가된 message_id를 조회해 이 프로세스가 기록한 ID와 비교
+#   → 다른 프로세스(Django, 다른 gunicorn 워커)가 저장한 메시지가 있으면 윈도우를 DB에서 다시 읽음
+#   (다른 프로세스의 중간 메시지 삭제/비활성화는 감지하지 않음, 이 프로세스의 삭제는 invalidate)
+import os
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "10"))  # 프롬프트에 넣을 최근 Q/A 턴 수
+CHAT_HISTORY_CACHED_SESSIONS = int(os.getenv("CHAT_HISTORY_CACHED_SESSIONS", "5000"))
+
+BOT_MESSAGE_TYPES = ("bot", "chatbot")
+
+# loader(session_id, message_limit) → 최근 메시지 [(message_id, message_type, message_text), ...] (오래된 것 → 최신 순)
+MessageLoader = Callable[[int, int], List[Tuple[int, str, str]]]
+# id_loader(session_id, after_id) → after_id보다 큰 활성 메시지 ID 목록
+MessageIdLoader = Callable[[int, int], List[int]]
+
+RECENT_MESSAGES_SQL = """
+    SELECT message_id, message_type, message_text
+    FROM core_chatmessage
+    WHERE session_id = %s AND is_active = TRUE
+    ORDER BY create_time DESC, message_id DESC
+    LIMIT %s
+"""
+
+MESSAGE_IDS_AFTER_SQL = """
+    SELECT message_id
+    FROM core_chatmessage
+    WHERE session_id = %s AND is_active = TRUE AND message_id > %s
+"""
+
+
+def connection_loader(connection_factory) -> MessageLoader:
+    """get_db_connection(RealDictCursor 컨텍스트 매니저) 기반 loader"""
+    def load(session_id: int, message_limit: int) -> List[Tuple[int, str, str]]:
+        with connection_factory() as conn:
+            cursor = conn.cursor()
+            cursor.execute(RECENT_MESSAGES_SQL, (session_id, message_limit))
+            rows = cursor.fetchall()
+        return [(row["message_id"], row["message_type"], row["message_text"]) for row in reversed(rows)]
+    return load
+
+
+def connection_id_loader(connection_factory) -> MessageIdLoader:
+    """get_db_connection 기반 id_loader"""
+    def load_ids(session_id: int, after_id: int) -> List[int]:
+        with connection_factory() as conn:
+            cursor = conn.cursor()
+            cursor.execute(MESSAGE_IDS_AFTER_SQL, (session_id, after_id))
+            return [row["message_id"] for row in cursor.fetchall()]
+    return load_ids
+
+
+def format_turn(question: str, answer: str) -> str:
+    return f"Q: {question}\nA: {answer}"
+
+
+def pair_turns(messages: Iterable[Tuple[int, str, str]]) -> Tuple[List[str], Optional[str]]:
+    """
+    (message_id, message_type, text) 목록 → (Q/A 턴 리스트, 아직 답변이 없는 마지막 질문)
+    LIMIT으로 잘려 질문 없이 시작하는 답변은 버림
+    """
+    turns, question = [], None
+    for _, message_type, text in messages:
+        if message_type == "user":
+            question = text
+        elif message_type in BOT_MESSAGE_TYPES and question is not None:
+            turns.append(format_turn(question, text))
+            question = None
+    return turns, question
+
+
+class _SessionWindow:
+    __slots__ = ("turns", "question", "loading", "stale", "synced_id", "recorded_ids")
+
+    def __init__(self, window: int):
+        self.turns = deque(maxlen=window)
+        self.question = None  # 답변 대기 중인 질문
+        self.loading = True
+        self.stale = False  # 로드 도중 메시지가 추가되면 로드 결과를 캐시하지 않음
+        self.synced_id = 0  # DB와 마지막으로 맞춰 본 시점의 최신 message_id
+        self.recorded_ids = set()  # 그 뒤 이 프로세스가 record_message로 반영한 message_id
+
+
+class ChatHistoryCache:
+    """세션별 최근 N턴 롤링 윈도우 (재사용 전 새 message_id만 확인, 윈도우는 없거나 어긋났을 때만 LIMIT 조회)"""
+
+    def __init__(self, loader: MessageLoader, id_loader: MessageIdLoader, window: int = 10,
+                 max_sessions: int = 5000):
+        self.loader = loader
+        self.id_loader = id_loader
+        self.window = max(1, window)
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # {session_id: _SessionWindow}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "out_of_sync": 0, "appended": 0, "load_failures": 0}
+
+    def recent_turns(self, session_id, loader: Optional[MessageLoader] = None,
+                     id_loader: Optional[MessageIdLoader] = None) -> List[str]:
+        """최근 N턴 ("Q: ...\nA: ..." 문자열, 오래된 것 → 최신 순)"""
+        session_id = int(session_id)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            synced_id = entry.synced_id if entry is not None and not entry.loading else None
+
+        if synced_id is not None:
+            new_ids = (id_loader or self.id_loader)(session_id, synced_id)
+            with self._lock:
+                if self._sessions.get(session_id) is entry and not entry.loading:
+                    if set(new_ids) == entry.recorded_ids:
+                        # 마지막 확인 이후 DB에 추가된 메시지를 모두 이 프로세스가 반영함
+                        entry.synced_id = max(new_ids, default=synced_id)
+                        entry.recorded_ids.clear()
+                        self._sessions.move_to_end(session_id)
+                        self.counters["hits"] += 1
+                        return list(entry.turns)
+                    del self._sessions[session_id]  # 다른 프로세스가 저장한 메시지 → 다시 로드
+                    self.counters["out_of_sync"] += 1
+
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and not entry.loading:
+                entry = None  # 확인 도중 다른 스레드가 다시 로드함 → 새 윈도우로 교체
+            self.counters["misses"] += 1
+            if entry is None:
+                entry = _SessionWindow(self.window)
+                self._sessions.pop(session_id, None)
+                self._sessions[session_id] = entry
+                self._evict()
+
+        try:
+            # 답변 대기 중인 마지막 질문까지 포함하도록 2N+1개
+            rows = (loader or self.loader)(session_id, self.window * 2 + 1)
+        except Exception:
+            with self._lock:
+                if self._sessions.get(session_id) is entry:
+                    del self._sessions[session_id]
+                self.counters["load_failures"] += 1
+            raise
+        turns, question = pair_turns(rows)
+        turns = turns[-self.window:]
+
+        with self._lock:
+            if self._sessions.get(session_id) is entry and entry.loading:
+                if entry.stale:
+                    del self._sessions[session_id]  # 다음 조회 때 다시 로드
+                else:
+                    entry.turns.extend(turns)
+                    entry.question = question
+                    entry.loading = False
+                    entry.synced_id = rows[-1][0] if rows else 0
+        return turns
+
+    def record_message(self, session_id, message_id: int, message_type: str, text: str):
+        """메시지 저장(commit) 직후 호출 - 캐시된 세션의 윈도우만 갱신"""
+        session_id = int(session_id)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            if entry.loading:
+                entry.stale = True
+                return
+            if message_id <= entry.synced_id:
+                return  # 저장 직후 다른 스레드의 로드에 이미 포함됨
+            entry.recorded_ids.add(message_id)
+            if message_type == "user":
+                entry.question = text
+            elif message_type in BOT_MESSAGE_TYPES and entry.question is not None:
+                entry.turns.append(format_turn(entry.question, text))
+                entry.question = None
+            self.counters["appended"] += 1
+
+    def invalidate(self, session_id):
+        """메시지 삭제/세션 삭제 시"""
+        with self._lock:
+            self._sessions.pop(int(session_id), None)
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+                "sessions": len(self._sessions),
+                "window": self.window,
+            }
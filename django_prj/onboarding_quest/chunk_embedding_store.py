@@ -0,0 +1,271 @@
+# 문서 청크 임베딩 디스크 저장소 (모델 + 청크 본문 해시 → 벡터)
+#
+# - 재청크, rag_common ↔ 부서 컬렉션 이동, 컬렉션 재생성 때 본문이 같은 청크는 API를 다시 부르지 않음
+# - 모델별 디렉터리에 float16 샤드 파일(shard-00000.f16, 샤드당 CHUNK_EMBEDDING_SHARD_ROWS행, mmap 읽기)과
+#   추가 전용 인덱스(index.bin: sha256 32바이트 + 샤드 번호 + 행 번호, 레코드 40바이트)를 저장
+# - 벡터를 먼저 쓰고 인덱스를 나중에 쓰므로 인덱스에 있는 키는 항상 벡터가 존재
+# - 다른 프로세스(gunicorn 워커, 일괄 적재 도구)가 추가한 항목은 인덱스 파일 크기 변화를 보고 이어서 읽음
+# - 항목은 지우지 않음 (같은 본문은 한 번만 저장, 정리는 디렉터리 삭제)
+#
+# 사용법 (django_prj/onboarding_quest 에서):
+#   python chunk_embedding_store.py stats
+#   python chunk_embedding_store.py seed --collections rag_3 rag_common   # 기존 컬렉션 벡터로 미리 채우기
+import os
+import json
+import struct
+import hashlib
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl  # 프로세스 간 쓰기 잠금 (Windows는 단일 프로세스 사용 가정)
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_EMBEDDING_STORE_ENABLED = os.getenv("CHUNK_EMBEDDING_STORE_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+CHUNK_EMBEDDING_STORE_DIR = os.getenv("CHUNK_EMBEDDING_STORE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "chunk_embeddings"
+)
+CHUNK_EMBEDDING_SHARD_ROWS = int(os.getenv("CHUNK_EMBEDDING_SHARD_ROWS", "16384"))  # 3072차원 기준 샤드당 약 96MB
+
+INDEX_RECORD = struct.Struct("<32sII")  # sha256, 샤드 번호, 행 번호
+
+
+def text_key(text: str) -> bytes:
+    """청크 본문 해시 (임베딩 입력 그대로, 정규화하지 않음)"""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class ChunkEmbeddingStore:
+    """모델 하나의 청크 임베딩 저장소 (float16 mmap 샤드 + 추가 전용 인덱스)"""
+
+    def __init__(self, directory: str, model: str, dim: int, shard_rows: int = 16384):
+        self.path = os.path.join(directory, model.replace("/", "_"))
+        self.model = model
+        self.dim = dim
+        self.shard_rows = max(1, shard_rows)
+        self._lock = threading.RLock()
+        self._index: Dict[bytes, tuple] = {}  # 해시 → (샤드, 행)
+        self._index_offset = 0
+        self._shards: Dict[int, np.memmap] = {}  # 샤드 번호 → 읽기 mmap (행 수가 늘면 다시 엶)
+        self.counters = {"hits": 0, "misses": 0, "stored": 0}
+
+        os.makedirs(self.path, exist_ok=True)
+        with self.file_lock():
+            meta_path = self._file("meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta["dim"] != dim:
+                    raise ValueError(f"임베딩 저장소 차원 불일치: {self.path} ({meta['dim']} != {dim})")
+                self.shard_rows = meta["shard_rows"]
+            else:
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": model, "dim": dim, "shard_rows": self.shard_rows}, f)
+            open(self._file("index.bin"), "ab").close()
+        self.refresh()
+
+    # --- 파일 ---
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _shard_file(self, shard: int) -> str:
+        return self._file(f"shard-{shard:05d}.f16")
+
+    @contextmanager
+    def file_lock(self):
+        with open(self._file(".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """인덱스 파일에 추가된 레코드만 이어서 읽음"""
+        with self._lock:
+            size = os.path.getsize(self._file("index.bin"))
+            if size - self._index_offset < INDEX_RECORD.size:
+                return
+            with open(self._file("index.bin"), "rb") as f:
+                f.seek(self._index_offset)
+                data = f.read(size - self._index_offset)
+            usable = len(data) - len(data) % INDEX_RECORD.size  # 쓰는 중인 마지막 레코드 제외
+            for key, shard, row in INDEX_RECORD.iter_unpack(data[:usable]):
+                self._index[key] = (shard, row)
+            self._index_offset += usable
+
+    def _row(self, shard: int, row: int) -> np.ndarray:
+        matrix = self._shards.get(shard)
+        if matrix is None or row >= len(matrix):
+            rows = os.path.getsize(self._shard_file(shard)) // (self.dim * 2)
+            matrix = np.memmap(self._shard_file(shard), dtype=np.float16, mode="r", shape=(rows, self.dim))
+            self._shards[shard] = matrix
+        return matrix[row]
+
+    # --- 조회/저장 ---
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """본문별 저장된 벡터 (없으면 None)"""
+        self.refresh()
+        vectors = []
+        with self._lock:
+            for text in texts:
+                location = self._index.get(text_key(text))
+                if location is None:
+                    vectors.append(None)
+                    self.counters["misses"] += 1
+                else:
+                    vectors.append(np.asarray(self._row(*location), dtype=np.float32).tolist())
+                    self.counters["hits"] += 1
+        return vectors
+
+    def contains_many(self, texts: Sequence[str]) -> List[bool]:
+        """본문별 저장 여부 (벡터를 읽지 않음, 일괄 적재 --dry-run 예상 토큰 계산용)"""
+        self.refresh()
+        with self._lock:
+            return [text_key(text) in self._index for text in texts]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> int:
+        """새 본문만 추가 (이미 있는 본문은 건너뜀), 추가한 개수 반환"""
+        with self._lock, self.file_lock():
+            self.refresh()
+            pending, seen = [], set()
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                if key in self._index or key in seen:
+                    continue
+                if len(vector) != self.dim:
+                    raise ValueError(f"임베딩 차원 불일치: {len(vector)} != {self.dim}")
+                seen.add(key)
+                pending.append((key, vector))
+            if not pending:
+                return 0
+
+            next_row, start, records = self._index_offset // INDEX_RECORD.size, 0, []
+            while start < len(pending):
+                # 샤드 경계에서 나눠 샤드별로 한 번에 기록
+                shard, row = divmod(next_row, self.shard_rows)
+                block = pending[start:start + self.shard_rows - row]
+                matrix = np.asarray([vector for _, vector in block], dtype=np.float16)
+                mode = "r+b" if os.path.exists(self._shard_file(shard)) else "wb"
+                with open(self._shard_file(shard), mode) as f:
+                    f.seek(row * self.dim * 2)
+                    f.write(matrix.tobytes())
+                    f.truncate()  # 이전에 중단된 쓰기의 남은 바이트 제거
+                records.extend(INDEX_RECORD.pack(key, shard, row + i) for i, (key, _) in enumerate(block))
+                next_row += len(block)
+                start += len(block)
+            with open(self._file("index.bin"), "r+b") as f:
+                f.seek(self._index_offset)  # 중단된 쓰기로 남은 불완전한 레코드 위에 덮어씀
+                f.write(b"".join(records))
+                f.truncate()
+            self.refresh()
+            self.counters["stored"] += len(records)
+            return len(records)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            items = len(self._index)
+            return {
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+                "items": items,
+                "disk_bytes": items * self.dim * 2 + self._index_offset,
+                "model": self.model,
+            }
+
+
+class StoredEmbeddingPipeline:
+    """저장소를 먼저 조회하고 없는 본문만 임베딩 파이프라인으로 보내는 래퍼 (EmbeddingPipeline.embed와 같은 인터페이스)"""
+
+    def __init__(self, pipeline, store: Optional[ChunkEmbeddingStore]):
+        self.pipeline = pipeline
+        self.store = store
+
+    def embed(self, texts: List[str], progress=None) -> List[List[float]]:
+        if self.store is None:
+            return self.pipeline.embed(texts, progress=progress)
+        try:
+            vectors = self.store.get_many(texts)
+        except Exception as e:
+            logger.warning(f"⚠️ 청크 임베딩 저장소 조회 실패, 전체 임베딩: {e}")
+            vectors = [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        reused = len(texts) - len(missing)
+        if reused:
+            logger.info(f"💾 저장된 청크 임베딩 재사용: {reused}/{len(texts)}개")
+            if progress:
+                progress(reused)
+        if missing:
+            report = (lambda done: progress(reused + done)) if progress else None
+            new_vectors = self.pipeline.embed([texts[i] for i in missing], progress=report)
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+            try:
+                self.store.put_many([texts[i] for i in missing], new_vectors)
+            except Exception as e:
+                logger.warning(f"⚠️ 청크 임베딩 저장 실패: {e}")
+        return vectors
+
+    def stats(self) -> dict:
+        stats = self.pipeline.stats()
+        stats["store"] = self.store.stats() if self.store is not None else {"enabled": False}
+        return stats
+
+
+def build_chunk_embedding_store(model: str, dim: int) -> Optional[ChunkEmbeddingStore]:
+    """환경 변수 설정에 따라 저장소 생성 (비활성/실패 시 None)"""
+    if not CHUNK_EMBEDDING_STORE_ENABLED:
+        return None
+    try:
+        return ChunkEmbeddingStore(CHUNK_EMBEDDING_STORE_DIR, model, dim, CHUNK_EMBEDDING_SHARD_ROWS)
+    except Exception as e:
+        logger.warning(f"⚠️ 청크 임베딩 저장소 초기화 실패, 저장소 없이 진행: {e}")
+        return None
+
+
+def main():
+    from embed_and_upsert import chunk_embedding_store, scroll_points
+
+    parser = argparse.ArgumentParser(description="청크 임베딩 저장소 관리")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="저장 항목 수 / 디스크 사용량")
+    seed = sub.add_parser("seed", help="기존 컬렉션에 저장된 벡터로 저장소 채우기 (API 호출 없음)")
+    seed.add_argument("--collections", nargs="+", required=True)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if chunk_embedding_store is None:
+        parser.error("CHUNK_EMBEDDING_STORE_ENABLED=false 이거나 저장소를 열 수 없습니다")
+
+    if args.command == "seed":
+        for collection_name in args.collections:
+            added = 0
+            texts, vectors = [], []
+            for point in scroll_points(collection_name, with_payload=["text"], with_vectors=True):
+                vector = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+                text = (point.payload or {}).get("text")
+                if not text or vector is None or len(vector) != chunk_embedding_store.dim:
+                    continue
+                texts.append(text)
+                vectors.append(vector)
+                if len(texts) >= 1000:
+                    added += chunk_embedding_store.put_many(texts, vectors)
+                    texts, vectors = [], []
+            added += chunk_embedding_store.put_many(texts, vectors)
+            logger.info(f"🌱 {collection_name} → 저장소에 {added}개 추가")
+    print(json.dumps(chunk_embedding_store.stats(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
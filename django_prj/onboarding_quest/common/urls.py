@@ -9,6 +9,7 @@ urlpatterns = [
     path('chatbot/new-session/', views.new_chat_session, name='new_chat_session'),
     path('chatbot/session/<int:session_id>/delete/', views.delete_chat_session, name='delete_chat_session'),
     path('chatbot/api/send/', views.chatbot_send_api, name='chatbot_send_api'),
+    path('chatbot/api/stream/', views.chatbot_stream_api, name='chatbot_stream_api'),
 
     path('doc/', views.doc, name='doc'),
     path('doc/upload/', views.doc_upload, name='doc_upload'),
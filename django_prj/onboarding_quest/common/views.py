@@ -1,5 +1,5 @@
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.conf import settings
 from core.models import Docs, ChatSession, ChatMessage, Department
@@ -17,9 +17,10 @@ from django.contrib import messages
 import aiohttp
 import asyncio
 import logging
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
-from embed_and_upsert import advanced_embed_and_upsert, get_existing_point_ids
+from embed_and_upsert import advanced_embed_and_upsert, get_existing_point_ids, delete_document_chunks, docs_key
+from cache_versions import bump_versions
+from doc_index import DOC_INDEX_VERSION_KEY
+from storage_layout import partition_name
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
@@ -28,37 +29,21 @@ from django.utils.decorators import method_decorator
 logger = logging.getLogger(__name__)
 
 # Qdrant 삭제 함수
-def delete_from_qdrant(file_path, department_id):
-    """Qdrant에서 특정 파일의 모든 청크 삭제"""
+def delete_from_qdrant(doc):
+    """
+    Qdrant에서 문서의 모든 청크 삭제 (FastAPI 문서 삭제 API와 같은 기준)
+    - 적재 키(docs_id) + 이전 방식(저장 파일명) source, 부서 ID 조건
+    - 공용 여부가 수정됐을 수 있어 부서/공통 파티션 모두에서 삭제
+    """
+    department_id = doc.department.department_id
     try:
-        client = QdrantClient(url=os.getenv("QDRANT_URL"))
-        absolute_path = os.path.abspath(file_path)
-        
-        # 파일 기반 필터링으로 삭제
-        delete_filter = Filter(
-            must=[
-                FieldCondition(
-                    key="metadata.source",
-                    match=MatchValue(value=absolute_path)
-                ),
-                FieldCondition(
-                    key="metadata.department_id",
-                    match=MatchValue(value=department_id)
-                )
-            ]
-        )
-        
-        # 삭제 실행
-        delete_result = client.delete(
-            collection_name="rag_multiformat",
-            points_selector=delete_filter
-        )
-        
-        return delete_result.operation_id
-        
+        for common_doc in (False, True):
+            for doc_key in (docs_key(doc.docs_id), None):
+                delete_document_chunks(doc.file_path, department_id, common_doc, doc_key)
+        return True
     except Exception as e:
         logger.error(f"Qdrant 삭제 중 오류: {e}")
-        return None
+        return False
 
 # 비동기 임베딩 함수
 def embed_document_async(file_path, department_id, common_doc, original_file_name=None):
@@ -211,6 +196,8 @@ def doc_upload(request):
                         file_path=saved_path,
                         common_doc=common_doc
                     )
+                    # RAG doc_filter 인덱스 + 문서 파티션 답변 캐시 무효화
+                    bump_versions([DOC_INDEX_VERSION_KEY, partition_name(department.department_id, common_doc)])
                     
                     return JsonResponse({
                         'success': True,
@@ -242,10 +229,15 @@ def doc_update(request, doc_id):
             common_doc_str = request.POST.get('common_doc', 'false')  # ← 문자열 그대로 받음
             common_doc = common_doc_str.lower() == 'true'  # ← 정확한 문자열 비교
 
+            previous_partition = partition_name(doc.department.department_id, doc.common_doc)
             doc.description = description
             doc.tags = tags
             doc.common_doc = common_doc
             doc.save()
+            # RAG doc_filter 인덱스 + 공용 여부 변경 전후 파티션 답변 캐시 무효화
+            bump_versions([
+                DOC_INDEX_VERSION_KEY, previous_partition, partition_name(doc.department.department_id, common_doc)
+            ])
 
             return JsonResponse({'success': True, 'message': '문서 정보가 수정되었습니다.'})
 
@@ -267,21 +259,24 @@ def doc_delete(request, doc_id):
 
             # 파일 정보 저장
             file_path = os.path.join(settings.MEDIA_ROOT, doc.file_path)
-            department_id = doc.department.department_id
             
             # 1. 실제 파일 삭제
             if doc.file_path and os.path.exists(file_path):
                 os.remove(file_path)
             
             # 2. Qdrant에서 관련 청크 삭제
-            delete_operation = delete_from_qdrant(file_path, department_id)
+            removed_from_vector_db = delete_from_qdrant(doc)
             
             # 3. 데이터베이스에서 문서 삭제
+            partitions = [partition_name(doc.department.department_id, common) for common in (False, True)]
             doc.delete()
+            bump_versions([DOC_INDEX_VERSION_KEY] + partitions)  # RAG doc_filter 인덱스 + 답변 캐시 무효화
             
             return JsonResponse({
                 'success': True,
-                'message': f'문서 및 벡터 데이터가 삭제되었습니다. (작업 ID: {delete_operation})'
+                'message': '문서 및 벡터 데이터가 삭제되었습니다.' if removed_from_vector_db
+                           else '문서가 삭제되었습니다. (벡터 데이터 삭제 실패)',
+                'removed_from_vector_db': removed_from_vector_db
             })
 
         except Docs.DoesNotExist:
@@ -497,3 +492,63 @@ def chatbot_send_api(request):
         logger.error(f"[chatbot_send_api 오류] {str(e)}")
         return JsonResponse({'success': False, 'error': str(e)})
 
+
+@csrf_exempt
+@require_POST
+def chatbot_stream_api(request):
+    """FastAPI RAG 스트리밍(SSE) 응답을 그대로 전달하는 프록시 (메시지 저장은 FastAPI에서 처리)"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'success': False, 'error': '로그인이 필요합니다.'})
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': '잘못된 요청입니다.'})
+
+    question = (data.get('question') or '').strip()
+    doc_filter = data.get('doc_filter') or []
+    if not question and not doc_filter:
+        return JsonResponse({'success': False, 'error': '메시지가 비어 있습니다.'})
+
+    import requests
+    payload = {
+        'question': question,
+        'html_message': data.get('html_message'),
+        'doc_filter': doc_filter,
+        'session_id': data.get('session_id'),
+        'user_id': request.user.user_id,
+        'department_id': request.user.department.department_id if request.user.department else 0
+    }
+
+    try:
+        upstream = requests.post(
+            f"{settings.FASTAPI_BASE_URL}/api/chat/rag/stream",
+            json=payload,
+            stream=True,
+            timeout=(5, 120)  # (연결, 토큰 간 대기)
+        )
+    except requests.RequestException as e:
+        logger.error(f"[chatbot_stream_api 연결 오류] {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+    if upstream.status_code != 200:
+        try:
+            detail = upstream.json().get('detail', upstream.text)
+        except ValueError:
+            detail = upstream.text
+        upstream.close()
+        logger.error(f"[chatbot_stream_api] RAG 스트리밍 오류 ({upstream.status_code}): {detail}")
+        return JsonResponse({'success': False, 'error': detail}, status=upstream.status_code)
+
+    def relay():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                if chunk:
+                    yield chunk
+        finally:
+            upstream.close()
+
+    response = StreamingHttpResponse(relay(), content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
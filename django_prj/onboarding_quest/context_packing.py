@@ -0,0 +1,156 @@
+# 답변 프롬프트용 context 조립
+#
+# 리랭크로 선택된 청크를 그대로 이어 붙이면 chunk_overlap(100자)으로 겹친 문장과
+# 청크마다 붙은 "이 내용은 '{title}'에 대한 설명입니다." 머리말이 매 호출마다 중복 과금된다.
+# 1) 같은 파일 + 같은 조항(hierarchy_path, title) 청크를 chunk_id 순으로 합치면서 겹친 구간 제거
+# 2) 청크 머리말 제거 (조항 정보는 context 헤더에 한 번만 표시), 완전히 같은 청크 제거
+# 3) 점수 높은 묶음부터 토큰 예산(RAG_CONTEXT_TOKEN_BUDGET) 안에서 채움
+# 결과는 조항별로 합친 RetrievedChunk 리스트 (프롬프트 문자열은 retrieval_types.render_contexts로 생성)
+import os
+import re
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+from retrieval_types import RetrievedChunk, CONTEXT_SEPARATOR, render_contexts
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_PACKING = os.getenv("RAG_CONTEXT_PACKING", "true").lower() in ("1", "true", "yes", "on")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_CHUNKS_PER_DOC = int(os.getenv("RAG_CONTEXT_CHUNKS_PER_DOC", "3"))  # 선택된 문서당 후보 청크 수
+TOKENIZER_MODEL = "gpt-4o-mini"
+
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400  # chunk_overlap=100 보다 넉넉하게 (구분자 위치에 따라 길어질 수 있음)
+GAP_MARKER = "\n(…)\n"  # 같은 조항이지만 이어지지 않는 청크 사이
+CHUNK_PREFIX_PATTERN = re.compile(r"^이 내용은 '.*?'에 대한 설명입니다\.\s*", re.DOTALL)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken 토큰 수 (인코딩 파일을 받을 수 없는 환경이면 문자 기반 추정)"""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+                except Exception as e:
+                    logger.warning(f"⚠️ tiktoken 인코딩 로드 실패, 문자 수로 토큰 추정: {e}")
+                    _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return int(ascii_chars / 4 + (len(text) - ascii_chars) * 0.9) + 1
+
+
+def strip_chunk_prefix(text: str) -> str:
+    return CHUNK_PREFIX_PATTERN.sub("", text, count=1)
+
+
+def overlap_length(previous: str, following: str) -> int:
+    """previous의 끝과 following의 시작이 겹치는 길이 (MIN_OVERLAP_CHARS 미만이면 0)"""
+    for size in range(min(len(previous), len(following), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:size]):
+            return size
+    return 0
+
+
+def merge_section(chunks: List[RetrievedChunk]) -> str:
+    """같은 조항 청크를 chunk_id 순으로 합치며 겹친 구간 제거"""
+    ordered = sorted(chunks, key=lambda c: (c.chunk_id is None, c.chunk_id if c.chunk_id is not None else 0))
+    merged = strip_chunk_prefix(ordered[0].text).strip()
+    previous_id = ordered[0].chunk_id
+    for chunk in ordered[1:]:
+        body = strip_chunk_prefix(chunk.text).strip()
+        overlap = overlap_length(merged, body)
+        if overlap:
+            merged += body[overlap:]
+        elif previous_id is not None and chunk.chunk_id == previous_id + 1:
+            merged += "\n" + body
+        else:
+            merged += GAP_MARKER + body
+        previous_id = chunk.chunk_id
+    return merged
+
+
+class ContextPacker:
+    """청크 병합/중복 제거/토큰 예산 채우기 + 절감 토큰 통계"""
+
+    def __init__(self, token_budget: int = 3000, enabled: bool = True):
+        self.token_budget = token_budget
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "raw_tokens": 0, "packed_tokens": 0, "dropped_chunks": 0}
+
+    def pack(self, chunks: List[RetrievedChunk]) -> Tuple[List[RetrievedChunk], Dict[str, int]]:
+        """
+        Returns:
+            (조항별로 합친 레코드 리스트, {"raw_tokens", "packed_tokens", "saved_tokens", "chunks", "sections", "dropped_chunks"})
+        """
+        raw_tokens = count_tokens(render_contexts(chunks)) if chunks else 0
+        if not self.enabled or not chunks:
+            return list(chunks), self._report(raw_tokens, raw_tokens, len(chunks), len(chunks), 0)
+
+        # 완전히 같은 청크(부서/공통 컬렉션에 중복 저장된 경우 등) 제거 후 조항별로 묶기
+        sections: Dict[tuple, List[RetrievedChunk]] = {}
+        seen_texts = set()
+        for chunk in chunks:
+            key_text = strip_chunk_prefix(chunk.text).strip()
+            if (chunk.file_name, key_text) in seen_texts:
+                continue
+            seen_texts.add((chunk.file_name, key_text))
+            sections.setdefault((chunk.file_name, chunk.hierarchy_path, chunk.title), []).append(chunk)
+
+        # 점수 높은 조항부터 예산 안에서 채우기 (넘치는 조항은 건너뛰고 더 작은 조항 시도)
+        ranked = sorted(sections.items(), key=lambda item: max(c.score for c in item[1]), reverse=True)
+        contexts, used_tokens, dropped = [], 0, 0
+        separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+        for (file_name, hierarchy_path, title), section_chunks in ranked:
+            context = RetrievedChunk(
+                file_name=file_name,
+                title=title,
+                hierarchy_path=hierarchy_path,
+                text=merge_section(section_chunks),
+                score=max(c.score for c in section_chunks),
+                chunk_id=min((c.chunk_id for c in section_chunks if c.chunk_id is not None), default=None)
+            )
+            tokens = count_tokens(context.render()) + (separator_tokens if contexts else 0)
+            if contexts and used_tokens + tokens > self.token_budget:
+                dropped += len(section_chunks)
+                continue
+            contexts.append(context)
+            used_tokens += tokens
+
+        return contexts, self._report(raw_tokens, used_tokens, len(chunks), len(contexts), dropped)
+
+    def _report(self, raw_tokens, packed_tokens, chunk_count, section_count, dropped) -> Dict[str, int]:
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters["raw_tokens"] += raw_tokens
+            self.counters["packed_tokens"] += packed_tokens
+            self.counters["dropped_chunks"] += dropped
+        return {
+            "raw_tokens": raw_tokens,
+            "packed_tokens": packed_tokens,
+            "saved_tokens": raw_tokens - packed_tokens,
+            "chunks": chunk_count,
+            "sections": section_count,
+            "dropped_chunks": dropped,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        saved = counters["raw_tokens"] - counters["packed_tokens"]
+        return {
+            **counters,
+            "saved_tokens": saved,
+            "avg_saved_tokens": round(saved / counters["requests"], 1) if counters["requests"] else 0.0,
+            "token_budget": self.token_budget,
+            "enabled": self.enabled,
+        }
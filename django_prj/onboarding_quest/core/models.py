@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.core.validators import RegexValidator
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from datetime import date
@@ -211,6 +212,12 @@ class ChatMessage(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, help_text='채팅 세션')
     is_active = models.BooleanField(default=True, help_text='메시지 활성 여부')
 
+    class Meta:
+        # 최근 히스토리 조회용 (세션별 최신 메시지부터 LIMIT)
+        indexes = [
+            models.Index(fields=['session', '-create_time', '-message_id'], name='chatmsg_session_recent_idx'),
+        ]
+
 class Docs(models.Model):
     docs_id = models.AutoField(primary_key=True, help_text='문서 고유 ID')
     department = models.ForeignKey(Department, on_delete=models.CASCADE, help_text='소속 부서')
@@ -221,6 +228,38 @@ class Docs(models.Model):
     common_doc = models.BooleanField(default=False, help_text='공용 문서 여부')
     original_file_name = models.CharField(max_length=255, null=True, blank=True, help_text='업로드 시 원래 파일명')
 
+class IngestionJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed')
+    ]
+    job_id = models.AutoField(primary_key=True, help_text='작업 고유 ID')
+    docs = models.ForeignKey(Docs, on_delete=models.CASCADE, null=True, blank=True, help_text='대상 문서')
+    file_path = models.CharField(max_length=500, help_text='저장된 파일 경로')
+    original_file_name = models.CharField(max_length=255, null=True, blank=True, help_text='원본 파일명')
+    department_id = models.IntegerField(null=True, blank=True, help_text='부서 ID')
+    common_doc = models.BooleanField(default=False, help_text='공용 문서 여부')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', help_text='작업 상태')
+    attempts = models.IntegerField(default=0, help_text='실행 횟수')
+    max_attempts = models.IntegerField(default=3, help_text='최대 실행 횟수')
+    chunks_parsed = models.IntegerField(default=0, help_text='분리된 청크 수')
+    chunks_embedded = models.IntegerField(default=0, help_text='임베딩된 청크 수')
+    chunks_upserted = models.IntegerField(default=0, help_text='업로드된 청크 수')
+    error = models.TextField(null=True, blank=True, help_text='마지막 실패 사유')
+    worker_id = models.CharField(max_length=100, null=True, blank=True, help_text='실행 중인 작업자')
+    create_time = models.DateTimeField(auto_now_add=True, help_text='생성일시')
+    available_time = models.DateTimeField(default=timezone.now, help_text='실행 가능 시각 (재시도 대기)')
+    start_time = models.DateTimeField(null=True, blank=True, help_text='마지막 실행 시작 시각')
+    heartbeat_time = models.DateTimeField(null=True, blank=True, help_text='마지막 진행 보고 시각')
+    end_time = models.DateTimeField(null=True, blank=True, help_text='완료/실패 시각')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_time'], name='ingestjob_status_available_idx'),
+        ]
+
 
 class Curriculum(models.Model):
     curriculum_id = models.AutoField(primary_key=True, help_text='커리큘럼 고유 ID')
@@ -0,0 +1,178 @@
+# 프로세스 공용 PostgreSQL 커넥션 풀 (RAG 그래프 노드 공용)
+#
+# psycopg2.pool.ThreadedConnectionPool은 minconn을 넘는 연결을 반납 즉시 닫아버려
+# 동시 요청이 많을 때 결국 매번 새로 연결하게 되므로, 유휴 연결 스택을 직접 관리한다.
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_MAX = int(os.getenv("RAG_DB_POOL_MAX", "10"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("RAG_DB_POOL_MAX_LIFETIME", "1800"))  # 초, 이 시간이 지난 연결은 반납 시 폐기
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv("RAG_DB_POOL_HEALTHCHECK_INTERVAL", "30"))  # 초, 이 시간 이상 쉰 연결은 SELECT 1 확인
+DB_POOL_TIMEOUT = float(os.getenv("RAG_DB_POOL_TIMEOUT", "10"))  # 초, 풀이 가득 찼을 때 최대 대기 시간
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """풀의 모든 연결이 사용 중이고 대기 시간이 초과됨"""
+
+
+class PostgresConnectionPool:
+    """
+    스레드 안전 PostgreSQL 커넥션 풀
+    - 동시에 열린 연결은 최대 maxconn개, 가득 차면 acquire_timeout까지 대기
+    - 대여 시: 끊긴 연결 폐기, health_check_interval 이상 쉰 연결은 SELECT 1로 확인
+    - 반납 시: max_lifetime이 지난 연결, 트랜잭션이 남은 연결은 폐기
+    - 프로세스가 fork된 경우(gunicorn preload 등) 부모의 연결은 버리고 새로 연결
+    """
+
+    def __init__(self, db_config: dict, maxconn: int = 10, max_lifetime: float = 1800,
+                 health_check_interval: float = 30, acquire_timeout: float = 10, **connect_kwargs):
+        self.db_config = db_config
+        self.maxconn = max(1, maxconn)
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.connect_kwargs = connect_kwargs
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._idle = deque()  # [(conn, 생성 시각, 마지막 반납 시각)], 최근 반납한 연결부터 재사용
+        self._created_at = {}  # 사용 중인 연결 {id(conn): 생성 시각}
+        self._pid = os.getpid()
+        self.counters = {"acquired": 0, "created": 0, "recycled": 0, "broken": 0, "wait_timeouts": 0}
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # 부모 프로세스와 소켓을 공유하지 않도록 닫지 않고 버림
+                self._idle.clear()
+                self._created_at.clear()
+                self._slots = threading.BoundedSemaphore(self.maxconn)
+                self._pid = os.getpid()
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.db_config, **self.connect_kwargs)
+        with self._lock:
+            self.counters["created"] += 1
+        return conn, time.time()
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.time() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        self._check_fork()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.counters["wait_timeouts"] += 1
+            raise PoolTimeout(f"커넥션 풀 대기 시간 초과 ({self.acquire_timeout}초)")
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    idle = self._idle.pop() if self._idle else None
+                if idle is None:
+                    conn, created_at = self._connect()
+                    break
+                candidate, created_at, last_used = idle
+                if self._is_healthy(candidate, last_used):
+                    conn = candidate
+                else:
+                    with self._lock:
+                        self.counters["broken"] += 1
+                    self._close(candidate)
+            with self._lock:
+                self._created_at[id(conn)] = created_at
+                self.counters["acquired"] += 1
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        with self._lock:
+            created_at = self._created_at.pop(id(conn), None)
+        if created_at is None:
+            # fork 이전에 대여한 연결이거나 이미 반납된 연결
+            self._close(conn)
+            return
+        try:
+            expired = time.time() - created_at > self.max_lifetime
+            broken = conn.closed or conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE
+            if expired or broken:
+                with self._lock:
+                    self.counters["broken" if broken else "recycled"] += 1
+                self._close(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, created_at, time.time()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """대여 → 정상 종료 시 commit, 예외 시 rollback → 반납"""
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "pid": self._pid,
+                "in_use": len(self._created_at),
+                "idle": len(self._idle),
+                "max_connections": self.maxconn,
+            }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+
+def build_connection_pool(db_config: dict, **connect_kwargs) -> PostgresConnectionPool:
+    """RAG_DB_POOL_* 설정으로 풀 생성 (실제 연결은 첫 사용 시 생성)"""
+    return PostgresConnectionPool(
+        db_config,
+        maxconn=DB_POOL_MAX,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        health_check_interval=DB_POOL_HEALTHCHECK_INTERVAL,
+        acquire_timeout=DB_POOL_TIMEOUT,
+        **connect_kwargs
+    )
@@ -0,0 +1,112 @@
+# doc_filter(원본 파일명) → 검색 컬렉션 매핑용 프로세스 로컬 인덱스
+#
+# core_docs 전체를 (original_file_name → 부서/공통 여부/컬렉션)으로 메모리에 올려두고,
+# 문서 업로드/삭제 시 cache_versions의 "core_docs" 버전이 올라가면 다시 읽는다.
+# 버전 확인은 로컬 SQLite 조회라 검색마다 PostgreSQL 왕복이 생기지 않는다.
+# (버전은 같은 호스트 안에서만 공유 → 다중 호스트에서는 DOC_INDEX_MAX_AGE가 변경 반영 상한, cache_versions 참고)
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from cache_versions import get_versions
+
+logger = logging.getLogger(__name__)
+
+DOC_INDEX_VERSION_KEY = "core_docs"
+DOC_INDEX_MAX_AGE = float(os.getenv("DOC_INDEX_MAX_AGE", "600"))  # 초, 버전 갱신 없이 변경된 경우 대비 최대 유지 시간
+
+
+class DocEntry(NamedTuple):
+    department_id: Optional[int]
+    common_doc: bool
+    collection: Optional[str]
+
+
+def collection_for(department_id, common_doc) -> Optional[str]:
+    if common_doc:
+        return "rag_common"
+    if department_id is not None:
+        return f"rag_{department_id}"
+    return None
+
+
+class DocCollectionIndex:
+    """original_file_name → [DocEntry] (같은 파일명이 여러 부서에 있을 수 있음)"""
+
+    def __init__(self, connection_factory, max_age: float = 600):
+        self.connection_factory = connection_factory  # get_db_connection (RealDictCursor 컨텍스트 매니저)
+        self.max_age = max_age
+        self._entries: Optional[Dict[str, List[DocEntry]]] = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()  # 버전이 바뀌었을 때 한 스레드만 다시 읽음
+        self.counters = {"lookups": 0, "reloads": 0, "misses": 0}
+
+    def load(self):
+        """core_docs 전체를 읽어 인덱스 교체"""
+        version = get_versions([DOC_INDEX_VERSION_KEY])[DOC_INDEX_VERSION_KEY]
+        entries: Dict[str, List[DocEntry]] = {}
+        with self.connection_factory() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT original_file_name, department_id, common_doc
+                FROM core_docs
+                WHERE original_file_name IS NOT NULL
+            """)
+            for row in cursor.fetchall():
+                entries.setdefault(row["original_file_name"], []).append(DocEntry(
+                    department_id=row["department_id"],
+                    common_doc=bool(row["common_doc"]),
+                    collection=collection_for(row["department_id"], row["common_doc"])
+                ))
+        with self._lock:
+            self._entries, self._version, self._loaded_at = entries, version, time.time()
+            self.counters["reloads"] += 1
+        logger.info(f"📚 문서 인덱스 로드: 파일 {len(entries)}개 (버전 {version})")
+
+    def _is_fresh(self) -> bool:
+        with self._lock:
+            loaded, version, loaded_at = self._entries is not None, self._version, self._loaded_at
+        if not loaded or time.time() - loaded_at >= self.max_age:
+            return False
+        current = get_versions([DOC_INDEX_VERSION_KEY])[DOC_INDEX_VERSION_KEY]
+        return current == version and current >= 0
+
+    def _ensure_fresh(self):
+        if self._is_fresh():
+            return
+        with self._reload_lock:
+            if not self._is_fresh():
+                self.load()
+
+    def lookup(self, file_names: List[str]) -> List[DocEntry]:
+        """파일명 목록에 해당하는 문서 항목 (입력 순서 유지)"""
+        self._ensure_fresh()
+        with self._lock:
+            entries = self._entries
+            self.counters["lookups"] += 1
+        found = []
+        for name in file_names:
+            matched = entries.get(name)
+            if matched:
+                found.extend(matched)
+            else:
+                with self._lock:
+                    self.counters["misses"] += 1
+                logger.warning(f"⚠️ 문서 인덱스에 없는 파일명: {name}")
+        return found
+
+    def collections_for(self, file_names: List[str]) -> List[str]:
+        return [entry.collection for entry in self.lookup(file_names) if entry.collection]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "files": len(self._entries or {}),
+                "version": self._version,
+                "age_seconds": round(time.time() - self._loaded_at, 1) if self._entries is not None else None,
+            }
@@ -0,0 +1,135 @@
+# 문서 로드 → 조항/문단 섹션 분리 → 계층 경로를 붙인 청크 분할 (CPU 작업만, 임베딩/벡터 DB 없음)
+#
+# embed_and_upsert(적재)와 bulk_ingest의 파싱 프로세스 풀이 함께 사용한다.
+# 프로세스 풀 작업자가 import해도 Qdrant/OpenAI 클라이언트를 만들지 않도록 적재 모듈과 분리.
+import re
+import logging
+from typing import List
+
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from loaders import load_documents
+
+# 조항 패턴 목록 (멀티 포맷 대응)
+SECTION_PATTERNS = [
+    r"(제\s*\d+\s*장[^\n]*)",      # 제1장 총칙
+    r"(제\s*\d+\s*절[^\n]*)",      # 제1절 목적
+    r"(제\s*\d+\s*조[^\n]*)",      # 제1조 목적
+    r"^\s*\d+\.\s*[^\n]+",        # 1. 개요
+    r"^\s*\[\s*.+?\s*\]",         # [목적]
+    r"^\s*제?\w+\s*조\s+[^\n]+"   # 제일조 목적
+]
+
+# 조항 단위로 섹션 분리
+def extract_sections_with_titles(text):
+    # 모든 패턴을 하나의 리스트로 통합하여, 모든 계층(장/절/조 등)에서 섹션을 분리
+    all_matches = []
+    for pattern in SECTION_PATTERNS:
+        all_matches.extend(list(re.finditer(pattern, text, re.MULTILINE)))
+    # 시작 위치 기준 정렬
+    all_matches.sort(key=lambda m: m.start())
+    if len(all_matches) >= 3:
+        logging.info(f"패턴 매치 성공: {len(all_matches)}개 섹션 감지")
+        sections = []
+        for i, match in enumerate(all_matches):
+            start = match.start()
+            end = all_matches[i+1].start() if i+1 < len(all_matches) else len(text)
+            title = match.group(1).strip() if match.groups() else match.group().strip()
+            body = text[start + len(title):end].strip()
+            sections.append((title, body))
+        return sections
+    else:
+        logging.warning("조항 패턴 매치 실패. 전체 문서를 단일 청크로 처리합니다.")
+        return [("전체본문", text)]
+
+
+def get_flexible_sections(text, fallback_chunk_size=700):
+    # 1. 조항 패턴 시도
+    sections = extract_sections_with_titles(text)
+    if sections and len(sections) >= 3 and sections[0][0] != "전체본문":
+        return sections
+
+    logging.warning("⚠ 조항 패턴 실패 → 문단 기반으로 재시도")
+
+    # 2. 문단 기반 시도
+    paragraphs = [p.strip() for p in text.split("\n\n") if len(p.strip()) > 50]
+    if len(paragraphs) >= 3:
+        return [(f"문단 {i+1}", para) for i, para in enumerate(paragraphs)]
+
+    logging.warning("⚠ 문단 패턴 실패 → 고정 길이 청크로 재시도")
+
+    # 3. 고정 길이 fallback
+    chunks = [text[i:i+fallback_chunk_size] for i in range(0, len(text), fallback_chunk_size)]
+    return [(f"청크 {i+1}", chunk) for i, chunk in enumerate(chunks)]
+
+
+def split_document(file_path) -> List[Document]:
+    """파일 → 청크 Document 목록 (metadata: title, 계층을 찾은 경우 hierarchy_path)"""
+    docs = load_documents(file_path)
+    joined_text = "\n".join([doc.page_content for doc in docs])
+    sections = get_flexible_sections(joined_text)
+
+    logging.info(f"문서 로드 개수: {len(docs)}")
+    logging.info(f"조항 추출 개수: {len(sections)}")
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=768,
+        chunk_overlap=100,
+        separators=["\n\n", "\n", ".", " ", ""],
+    )
+
+    split_docs = []
+    hierarchy_levels = [
+        ("장", re.compile(r'(제\s*\d+\s*장|\d+장|[IVXLCDM]+\.|[A-Za-z]+\s*Chapter)', re.UNICODE)),
+        ("절", re.compile(r'(제\s*\d+\s*절|\d+절|Section)', re.UNICODE)),
+        ("조", re.compile(r'(제\s*\d+\s*조|\d+조|Article|\d+\.\d+\.\d+|\d+-\d+|\d+\.\d+)', re.UNICODE)),
+        ("항", re.compile(r'(제\s*\d+\s*항|\d+항)', re.UNICODE)),
+        ("목", re.compile(r'(제\s*\d+\s*목|\d+목)', re.UNICODE)),
+    ]
+    hierarchy_state = {level: None for level, _ in hierarchy_levels}
+
+    for title, content in sections:
+        updated_level = None
+        for level, pattern in hierarchy_levels:
+            if pattern.search(title):
+                hierarchy_state[level] = title.strip()
+                found = False
+                for l, _ in hierarchy_levels:
+                    if l == level:
+                        found = True
+                    elif found:
+                        hierarchy_state[l] = None
+                updated_level = level
+                break
+        # if not updated_level:
+        #     for l in reversed([lvl for lvl, _ in hierarchy_levels]):
+        #         if hierarchy_state[l] is None:
+        #             hierarchy_state[l] = title.strip()
+        #             break
+
+        # hierarchy_path = " > ".join([hierarchy_state[l] for l, _ in hierarchy_levels if hierarchy_state[l]])
+        # chunks = text_splitter.split_text(content)
+        # for chunk in chunks:
+        #     combined_text = f"이 내용은 '{title}'에 대한 설명입니다.\n\n{chunk}"
+        #     split_docs.append(Document(page_content=combined_text, metadata={"title": title, "hierarchy_path": hierarchy_path}))
+        if not updated_level:
+            # 계층 실패 시 모든 계층 초기화
+            for l in hierarchy_state:
+                hierarchy_state[l] = None
+
+        has_valid_hierarchy = updated_level is not None
+        if has_valid_hierarchy:
+            hierarchy_path = " > ".join([
+                hierarchy_state[l] for l, _ in hierarchy_levels if hierarchy_state[l]
+            ])
+
+        chunks = text_splitter.split_text(content)
+        for chunk in chunks:
+            combined_text = f"이 내용은 '{title}'에 대한 설명입니다.\n\n{chunk}"
+            meta = {"title": title}
+            if has_valid_hierarchy:
+                meta["hierarchy_path"] = hierarchy_path
+            split_docs.append(Document(page_content=combined_text, metadata=meta))
+
+    logging.info(f"최종 청크 개수: {len(split_docs)}")
+    return split_docs
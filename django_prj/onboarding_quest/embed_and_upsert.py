@@ -1,16 +1,29 @@
 import os
-import re
-import glob
 import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import NamedTuple
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
+from qdrant_client.models import (
+    PointStruct, SparseVectorParams, SparseVector, Modifier, PayloadSchemaType,
+    KeywordIndexParams, KeywordIndexType, Filter, FieldCondition, MatchValue, HasIdCondition, PointIdsList
+)
 from langchain_openai import OpenAIEmbeddings
-from langchain_core.documents import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from loaders import load_documents
+from document_chunking import split_document
+from cache_versions import bump_versions
+from sparse_encoder import SPARSE_VECTOR_NAME, encode_document
+from embedding_pipeline import (
+    EmbeddingPipeline, EMBED_BATCH_MAX_TOKENS, EMBED_BATCH_MAX_ITEMS, EMBED_CONCURRENCY, EMBED_MAX_RETRIES,
+    EMBED_BACKOFF_BASE, EMBED_MAX_RATE_LIMIT_WAIT
+)
+from chunk_embedding_store import StoredEmbeddingPipeline, build_chunk_embedding_store
+from vector_store import build_vector_client
+from storage_layout import SHARED_COLLECTION, TENANT_KEY, partition_name, physical_collection, tenant_condition
+from vector_compression import (
+    VECTOR_QUANTIZATION, MRL_VECTOR_NAME, quantization_config, dense_vectors_config, truncate_vector, collection_mrl_dim
+)
 import uuid
-from sklearn.feature_extraction.text import TfidfVectorizer
 import os
 from dotenv import load_dotenv
 
@@ -38,284 +51,356 @@ QDRANT_URL = os.getenv("QDRANT_URL")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 # COLLECTION_NAME = "rag_multiformat"
 
+EMBEDDING_MODEL = "text-embedding-3-large"
 VECTOR_SIZE = 3072
+UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "256"))
+SCROLL_PAGE_SIZE = 1000
+
+# 청크 point ID = uuid5(네임스페이스, 문서 식별자 + 섹션 경로 + 청크 본문) → 내용이 같으면 항상 같은 ID
+CHUNK_ID_NAMESPACE = uuid.UUID("3f6b2c1e-8d4a-5b7e-9c0f-2a1d4e6b8c3f")
 
 # Qdrant 클라이언트 및 임베딩 모델 초기화
-client = QdrantClient(url=QDRANT_URL)
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model="text-embedding-3-large")
-
-# 조항 패턴 목록 (멀티 포맷 대응)
-SECTION_PATTERNS = [
-    r"(제\s*\d+\s*장[^\n]*)",      # 제1장 총칙
-    r"(제\s*\d+\s*절[^\n]*)",      # 제1절 목적
-    r"(제\s*\d+\s*조[^\n]*)",      # 제1조 목적
-    r"^\s*\d+\.\s*[^\n]+",        # 1. 개요
-    r"^\s*\[\s*.+?\s*\]",         # [목적]
-    r"^\s*제?\w+\s*조\s+[^\n]+"   # 제일조 목적
-]
-
-# 조항 단위로 섹션 분리
-def extract_sections_with_titles(text):
-    # 모든 패턴을 하나의 리스트로 통합하여, 모든 계층(장/절/조 등)에서 섹션을 분리
-    all_matches = []
-    for pattern in SECTION_PATTERNS:
-        all_matches.extend(list(re.finditer(pattern, text, re.MULTILINE)))
-    # 시작 위치 기준 정렬
-    all_matches.sort(key=lambda m: m.start())
-    if len(all_matches) >= 3:
-        logging.info(f"패턴 매치 성공: {len(all_matches)}개 섹션 감지")
-        sections = []
-        for i, match in enumerate(all_matches):
-            start = match.start()
-            end = all_matches[i+1].start() if i+1 < len(all_matches) else len(text)
-            title = match.group(1).strip() if match.groups() else match.group().strip()
-            body = text[start + len(title):end].strip()
-            sections.append((title, body))
-        return sections
-    else:
-        logging.warning("조항 패턴 매치 실패. 전체 문서를 단일 청크로 처리합니다.")
-        return [("전체본문", text)]
+client = build_vector_client(QDRANT_URL)  # RAG_VECTOR_BACKEND=numpy 이면 내장 저장소
+embeddings = OpenAIEmbeddings(
+    openai_api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL,
+    max_retries=0  # 재시도/백오프는 embedding_pipeline이 배치 단위로 처리
+)
+
+# 토큰 예산 배치 + 동시 요청 + 속도 제한 적응형 백오프 (embeddings는 호출 시점에 참조)
+embedding_pipeline = EmbeddingPipeline(
+    lambda batch: embeddings.embed_documents(batch),
+    max_batch_tokens=EMBED_BATCH_MAX_TOKENS,
+    max_batch_items=EMBED_BATCH_MAX_ITEMS,
+    concurrency=EMBED_CONCURRENCY,
+    max_retries=EMBED_MAX_RETRIES,
+    backoff_base=EMBED_BACKOFF_BASE,
+    max_rate_limit_wait=EMBED_MAX_RATE_LIMIT_WAIT
+)
+
+# (모델, 청크 본문 해시) → 벡터 디스크 저장소: 본문이 같은 청크는 재적재/컬렉션 재생성 때 API 호출 없음
+chunk_embedding_store = build_chunk_embedding_store(EMBEDDING_MODEL, VECTOR_SIZE)
+chunk_embedder = StoredEmbeddingPipeline(embedding_pipeline, chunk_embedding_store)
+
+# doc_filter 검색 / 문서 삭제 필터에 쓰는 payload 필드 인덱스
+PAYLOAD_INDEXES = {
+    "metadata.original_file_name": PayloadSchemaType.KEYWORD,
+    "metadata.source": PayloadSchemaType.KEYWORD,
+    "metadata.department_id": PayloadSchemaType.INTEGER,
+    "metadata.common_doc": PayloadSchemaType.BOOL,
+}
 
 
 def create_collection_if_not_exists(collection_name):
     collections = client.get_collections().collections
     if not any(c.name == collection_name for c in collections):
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(
-                size=VECTOR_SIZE,
-                distance=Distance.COSINE
+        try:
+            client.create_collection(
+                collection_name=collection_name,
+                # 기본 dense 벡터 (RAG_MRL_DIM 설정 시 축소 named vector 추가)
+                vectors_config=dense_vectors_config(VECTOR_SIZE),
+                # 키워드(조항 번호 등) 검색용 희소 벡터, IDF는 Qdrant가 컬렉션 단위로 계산
+                sparse_vectors_config={
+                    SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)
+                },
+                quantization_config=quantization_config()
             )
-        )
+        except Exception:
+            # 동시에 적재 중인 다른 작업자(적재 큐, bulk_ingest 업로드 단계)가 먼저 만든 경우
+            if not client.collection_exists(collection_name):
+                raise
+    else:
+        ensure_quantization(collection_name)
+    ensure_payload_indexes(collection_name)
+
+
+def ensure_quantization(collection_name):
+    """기존 컬렉션에 양자화 설정이 없으면 추가 (RAG_VECTOR_QUANTIZATION, 양자화 사본은 Qdrant가 백그라운드로 생성)"""
+    config = quantization_config()
+    if config is None:
+        return
+    if client.get_collection(collection_name).config.quantization_config is None:
+        client.update_collection(collection_name=collection_name, quantization_config=config)
+        logging.info(f"🗜️ 양자화 설정 추가: {collection_name} ({VECTOR_QUANTIZATION})")
+
+
+def ensure_payload_indexes(collection_name):
+    """필터용 payload 인덱스 생성 (기존 컬렉션은 빠진 인덱스만 추가)"""
+    existing = client.get_collection(collection_name).payload_schema or {}
+    indexes = dict(PAYLOAD_INDEXES)
+    if collection_name == SHARED_COLLECTION:
+        # 멀티테넌트 컬렉션: tenant 값별로 저장 위치를 모아 필터 검색 최적화
+        indexes[TENANT_KEY] = KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True)
+    for field_name, field_schema in indexes.items():
+        if field_name not in existing:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=True
+            )
+            logging.info(f"🗂️ payload 인덱스 생성: {collection_name}.{field_name} ({field_schema})")
+
 
+def collection_has_sparse_vector(collection_name) -> bool:
+    """희소 벡터 설정 이전에 만들어진 컬렉션은 dense 벡터만 저장"""
+    sparse_vectors = client.get_collection(collection_name).config.params.sparse_vectors or {}
+    return SPARSE_VECTOR_NAME in sparse_vectors
 
 
-def get_flexible_sections(text, fallback_chunk_size=700):
-    # 1. 조항 패턴 시도
-    sections = extract_sections_with_titles(text)
-    if sections and len(sections) >= 3 and sections[0][0] != "전체본문":
-        return sections
+def build_point_vector(dense_vector, text, with_sparse=True, mrl_dim=0):
+    """포인트 벡터 구성: 기본(dense) 벡터 + 희소 벡터 + MRL 축소 벡터(컬렉션에 설정된 경우)"""
+    if not with_sparse and not mrl_dim:
+        return dense_vector
+    vector = {"": dense_vector}
+    if with_sparse:
+        indices, values = encode_document(text)
+        vector[SPARSE_VECTOR_NAME] = SparseVector(indices=indices, values=values)
+    if mrl_dim:
+        vector[MRL_VECTOR_NAME] = truncate_vector(dense_vector, mrl_dim)
+    return vector
 
-    logging.warning("⚠ 조항 패턴 실패 → 문단 기반으로 재시도")
 
-    # 2. 문단 기반 시도
-    paragraphs = [p.strip() for p in text.split("\n\n") if len(p.strip()) > 50]
-    if len(paragraphs) >= 3:
-        return [(f"문단 {i+1}", para) for i, para in enumerate(paragraphs)]
 
-    logging.warning("⚠ 문단 패턴 실패 → 고정 길이 청크로 재시도")
+class IngestResult(NamedTuple):
+    """문서 적재 결과 (청크 수)"""
+    added: int  # 새로 임베딩해 업로드
+    unchanged: int  # 이미 같은 ID로 저장돼 임베딩 생략
+    removed: int  # 수정본에서 사라져 삭제
 
-    # 3. 고정 길이 fallback
-    chunks = [text[i:i+fallback_chunk_size] for i in range(0, len(text), fallback_chunk_size)]
-    return [(f"청크 {i+1}", chunk) for i, chunk in enumerate(chunks)]
+    def __str__(self):
+        return f"신규 {self.added}개, 변경 없음 {self.unchanged}개, 삭제 {self.removed}개"
 
 
+def docs_key(docs_id):
+    """core_docs 행의 문서 식별 키 (document_source의 doc_key, docs_id가 없으면 None → 저장 파일 이름 기준)"""
+    return f"docs_id:{docs_id}" if docs_id is not None else None
 
-def get_existing_point_ids(collection_name):
+
+def document_source(file_path, doc_key=None) -> str:
+    """
+    payload metadata.source 값 (문서 삭제/재적재 필터 기준, 부서 ID와 함께 문서를 구분)
+    doc_key: 문서 고유 키 (docs_key(docs_id), bulk_ingest는 --root 기준 상대 경로)
+             같은 키로 다시 적재하면 바뀐 청크만 반영됨, 없으면 저장된 파일 이름 (업로드마다 시각 접두어로 구분)
+    """
+    return f"documents/{doc_key or os.path.basename(file_path)}"
+
+
+def document_id(partition, department_id, source) -> str:
+    """청크 ID/적재 잠금 기준 문서 식별자 (공통 파티션은 여러 부서 문서가 섞이므로 부서 ID 포함)"""
+    return f"{partition}:{department_id}:{source}"
+
+
+def chunk_point_id(doc_id, section_path, text, occurrence=0) -> str:
+    """내용 기반 point ID (같은 섹션에 같은 본문이 반복되면 occurrence로 구분)"""
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, "\x1f".join([doc_id, section_path or "", text, str(occurrence)])))
+
+
+# 문서(doc_id)별 적재 잠금: 같은 문서를 동시에 비교/업로드하면 한쪽이 다른 쪽의 신규 청크를 '삭제된 청크'로 지움
+# (프로세스 안의 적재 큐 작업자 스레드 / bulk_ingest 업로드 단계 사이만 직렬화)
+_document_locks_guard = threading.Lock()
+_document_locks = {}  # doc_id → [Lock, 대기/사용 중인 수]
+
+
+@contextmanager
+def document_lock(doc_id):
+    with _document_locks_guard:
+        entry = _document_locks.setdefault(doc_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _document_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _document_locks[doc_id]
+
+
+def _document_filter(collection_name, source=None, partition=None, department_id=None):
+    must = []
+    if source is not None:
+        must.append(FieldCondition(key="metadata.source", match=MatchValue(value=source)))
+    if department_id is not None:
+        must.append(FieldCondition(key="metadata.department_id", match=MatchValue(value=int(department_id))))
+    if partition is not None and collection_name == SHARED_COLLECTION:
+        must.append(tenant_condition([partition]))
+    return Filter(must=must) if must else None
+
+
+def scroll_points(collection_name, scroll_filter=None, with_payload=False, with_vectors=False):
+    """조건에 맞는 포인트 전체 (next_page_offset으로 끝까지 페이지 조회)"""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=with_vectors
+        )
+        yield from points
+        if offset is None:
+            return
+
+
+def get_existing_point_ids(collection_name, source=None, partition=None) -> set:
+    """컬렉션(source 지정 시 해당 문서)에 저장된 point ID"""
     create_collection_if_not_exists(collection_name)
-    existing_ids = set()
-    
-    scroll = client.scroll(
-        collection_name=collection_name,
-        with_payload=True,
-        limit=10_000
-    )
+    return {point.id for point in scroll_points(collection_name, _document_filter(collection_name, source, partition))}
 
-    for point in scroll[0]:
-        payload = point.payload or {}
-        metadata = payload.get("metadata", {})
-        file = metadata.get("source")
-        chunk_id = metadata.get("chunk_id")
 
-        if file is not None and chunk_id is not None:
-            file = os.path.normpath(os.path.abspath(file))
-            existing_ids.add(f"{file}-{chunk_id}")
-    
-    return existing_ids
 
 
+def delete_document_chunks(file_path, department_id=None, common_doc=False, doc_key=None):
+    """문서의 기존 청크 삭제 (재적재 전 정리 / 문서 삭제, doc_key는 적재 때와 같은 값)"""
+    partition = partition_name(department_id, common_doc)
+    collection_name = physical_collection(partition)
+    if not client.collection_exists(collection_name):
+        return
+    source = document_source(file_path, doc_key)
+    client.delete(
+        collection_name=collection_name,
+        points_selector=_document_filter(collection_name, source, partition, department_id)
+    )
+    bump_versions([partition])
+    logging.info(f"🧹 기존 청크 삭제: {collection_name} / {source} (부서 {department_id})")
 
 
 # 문서 임베딩 및 Qdrant 업로드 (개선된 버전)
-def advanced_embed_and_upsert(file_path, department_id=None, common_doc=False, original_file_name=None) -> int:
+def advanced_embed_and_upsert(file_path, department_id=None, common_doc=False, original_file_name=None,
+                              doc_key=None) -> int:
     """
     개선된 임베딩 및 업로드 함수
     Args:
         file_path: 파일 경로
         department_id: 부서 ID (필터링용)
         common_doc: 공통 문서 여부
+        doc_key: 문서 고유 키 (document_source 참고)
     Returns:
-        업로드된 청크 수
+        업로드된 청크 수 (오류 시 0)
     """
     try:
-        file_path = os.path.abspath(file_path)
-        docs = load_documents(file_path)
-        joined_text = "\n".join([doc.page_content for doc in docs])
-        sections = get_flexible_sections(joined_text)
-
-        logging.info(f"문서 로드 개수: {len(docs)}")
-        logging.info(f"조항 추출 개수: {len(sections)}")
-
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=768,
-            chunk_overlap=100,
-            separators=["\n\n", "\n", ".", " ", ""],
-        )
-
-        split_docs = []
-        hierarchy_levels = [
-            ("장", re.compile(r'(제\s*\d+\s*장|\d+장|[IVXLCDM]+\.|[A-Za-z]+\s*Chapter)', re.UNICODE)),
-            ("절", re.compile(r'(제\s*\d+\s*절|\d+절|Section)', re.UNICODE)),
-            ("조", re.compile(r'(제\s*\d+\s*조|\d+조|Article|\d+\.\d+\.\d+|\d+-\d+|\d+\.\d+)', re.UNICODE)),
-            ("항", re.compile(r'(제\s*\d+\s*항|\d+항)', re.UNICODE)),
-            ("목", re.compile(r'(제\s*\d+\s*목|\d+목)', re.UNICODE)),
-        ]
-        hierarchy_state = {level: None for level, _ in hierarchy_levels}
-
-        for title, content in sections:
-            updated_level = None
-            for level, pattern in hierarchy_levels:
-                if pattern.search(title):
-                    hierarchy_state[level] = title.strip()
-                    found = False
-                    for l, _ in hierarchy_levels:
-                        if l == level:
-                            found = True
-                        elif found:
-                            hierarchy_state[l] = None
-                    updated_level = level
-                    break
-            # if not updated_level:
-            #     for l in reversed([lvl for lvl, _ in hierarchy_levels]):
-            #         if hierarchy_state[l] is None:
-            #             hierarchy_state[l] = title.strip()
-            #             break
-
-            # hierarchy_path = " > ".join([hierarchy_state[l] for l, _ in hierarchy_levels if hierarchy_state[l]])
-            # chunks = text_splitter.split_text(content)
-            # for chunk in chunks:
-            #     combined_text = f"이 내용은 '{title}'에 대한 설명입니다.\n\n{chunk}"
-            #     split_docs.append(Document(page_content=combined_text, metadata={"title": title, "hierarchy_path": hierarchy_path}))
-            if not updated_level:
-                # 계층 실패 시 모든 계층 초기화
-                for l in hierarchy_state:
-                    hierarchy_state[l] = None
-
-            has_valid_hierarchy = updated_level is not None
-            if has_valid_hierarchy:
-                hierarchy_path = " > ".join([
-                    hierarchy_state[l] for l, _ in hierarchy_levels if hierarchy_state[l]
-                ])
-
-            chunks = text_splitter.split_text(content)
-            for chunk in chunks:
-                combined_text = f"이 내용은 '{title}'에 대한 설명입니다.\n\n{chunk}"
-                meta = {"title": title}
-                if has_valid_hierarchy:
-                    meta["hierarchy_path"] = hierarchy_path
-                split_docs.append(Document(page_content=combined_text, metadata=meta))
-
-
-        logging.info(f"최종 청크 개수: {len(split_docs)}")
-
-        texts = [doc.page_content for doc in split_docs]
-        vectors = embeddings.embed_documents(texts)
-
-        # ✅ collection_name 결정
-        if common_doc:
-            collection_name = "rag_common"
-        elif department_id is not None:
-            collection_name = f"rag_{department_id}"
-        else:
-            collection_name = "rag_misc"
-
-        create_collection_if_not_exists(collection_name)
-        existing_ids = get_existing_point_ids(collection_name)
-
-        new_points = []
-        for i, (doc, vector) in enumerate(zip(split_docs, vectors)):
-            unique_key = f"{file_path}-{i}"
-            if unique_key in existing_ids:
-                continue
-
-            doc.metadata["source"] = f"documents/{os.path.basename(file_path)}"
-            doc.metadata["chunk_id"] = i
-            doc.metadata["department_id"] = int(department_id) if department_id is not None else None
-            doc.metadata["common_doc"] = common_doc
-            doc.metadata["file_name"] = os.path.basename(file_path)
-            doc.metadata["original_file_name"] = original_file_name
-
-            new_points.append(
-                PointStruct(
-                    id=uuid.uuid4().int >> 64,
-                    vector=vector,
-                    payload={
-                        "text": doc.page_content,
-                        "metadata": doc.metadata
-                    }
-                )
-            )
-
-        if new_points:
-            for point in new_points:
-                logging.debug(
-                    f"📌 업로드 청크: ID={point.id}, 벡터 길이={len(point.vector)}, 제목={point.payload['metadata'].get('title')}"
-                )
-            client.upsert(collection_name=collection_name, points=new_points)
-            logging.info(f"{file_path} → 신규 청크 {len(new_points)}개 업로드 완료")
-            return len(new_points)
-        else:
-            logging.info(f"{file_path} → 이미 저장된 청크만 존재 (업로드 생략)")
-            logging.info(f"{file_path} → 중복 청크 {len(split_docs)}개, 업로드 생략됨")
-            return 0
-
+        return ingest_document(file_path, department_id, common_doc, original_file_name, doc_key=doc_key).added
     except Exception as e:
         logging.error(f"{file_path} 처리 중 오류 발생: {e}")
         return 0
 
 
+def ingest_document(file_path, department_id=None, common_doc=False, original_file_name=None,
+                    progress=None, replace_existing=False, doc_key=None) -> IngestResult:
+    """
+    문서 로드 → 조항/청크 분리 → 신규/변경 청크만 배치 임베딩 → 배치 업로드 → 사라진 청크 삭제
+    (point ID가 내용 기반이라 같은 문서를 다시 적재하면 바뀐 청크만 임베딩, 오류는 호출자에게 전달)
+    Args:
+        progress: 진행률 콜백 progress(parsed=, embedded=, upserted=) - 단계별 누적 청크 수
+        replace_existing: 같은 문서의 기존 청크를 모두 지우고 전부 다시 임베딩
+        doc_key: 문서 고유 키 (document_source 참고, 같은 키의 저장된 청크와 비교)
+    Returns:
+        IngestResult(added, unchanged, removed)
+    """
+    file_path = os.path.abspath(file_path)
+    split_docs = split_document(file_path)
+    return upsert_document_chunks(
+        file_path, split_docs, department_id, common_doc, original_file_name, progress, replace_existing, doc_key
+    )
+
 
-# 다중 파일 자동 처리 엔트리포인트
-if __name__ == "__main__":
-    # 테스트용으로 부서 ID를 지정하거나 None
-    test_department_id = 1
-    test_common_doc = False
-
-    if test_common_doc:
-        collection_name = "rag_common"
-    elif test_department_id is not None:
-        collection_name = f"rag_{test_department_id}"
-    else:
-        collection_name = "rag_misc"
+def upsert_document_chunks(file_path, split_docs, department_id=None, common_doc=False, original_file_name=None,
+                           progress=None, replace_existing=False, doc_key=None) -> IngestResult:
+    """분할된 청크 → 저장된 청크와 비교 → 신규/변경 청크만 임베딩 후 업로드, 사라진 청크 삭제"""
+    report = progress or (lambda **counts: None)
+    report(parsed=len(split_docs))
+
+    # ✅ collection_name 결정 (shared 레이아웃이면 단일 컬렉션 + tenant payload)
+    partition = partition_name(department_id, common_doc)
+    collection_name = physical_collection(partition)
+    source = document_source(file_path, doc_key)
+    doc_id = document_id(partition, department_id, source)
+
+    point_ids, occurrences = [], Counter()
+    for i, doc in enumerate(split_docs):
+        section_path = doc.metadata.get("hierarchy_path") or doc.metadata["title"]
+        occurrence_key = (section_path, doc.page_content)
+        point_ids.append(chunk_point_id(doc_id, section_path, doc.page_content, occurrences[occurrence_key]))
+        occurrences[occurrence_key] += 1
+        doc.metadata["source"] = source
+        doc.metadata["doc_id"] = doc_id
+        doc.metadata["chunk_id"] = i
+        doc.metadata["department_id"] = int(department_id) if department_id is not None else None
+        doc.metadata["common_doc"] = common_doc
+        doc.metadata["file_name"] = os.path.basename(file_path)
+        doc.metadata["original_file_name"] = original_file_name
 
     create_collection_if_not_exists(collection_name)
-    existing_ids = get_existing_point_ids(collection_name)
+    with document_lock(doc_id):  # 비교 → 업로드 → 삭제가 같은 문서의 다른 적재와 겹치지 않게
+        if replace_existing:
+            delete_document_chunks(file_path, department_id, common_doc, doc_key)
+
+        # 저장된 청크와 비교: 없는 ID만 임베딩, 남는 ID(수정본에서 사라진 청크, 이전 랜덤 ID 청크)는 삭제
+        stored_chunk_ids = {
+            point.id: (point.payload or {}).get("metadata", {}).get("chunk_id")
+            for point in scroll_points(
+                collection_name, _document_filter(collection_name, source, partition, department_id),
+                with_payload=["metadata.chunk_id"]
+            )
+        }
+        pending = [(point_id, doc) for point_id, doc in zip(point_ids, split_docs) if point_id not in stored_chunk_ids]
+        removed_ids = list(stored_chunk_ids.keys() - set(point_ids))
+        # 앞쪽 청크가 추가/삭제되어 순서(chunk_id)만 바뀐 청크는 저장된 벡터 그대로 payload만 갱신
+        moved = {
+            point_id: doc for point_id, doc in zip(point_ids, split_docs)
+            if point_id in stored_chunk_ids and stored_chunk_ids[point_id] != doc.metadata["chunk_id"]
+        }
+        result = IngestResult(added=len(pending), unchanged=len(split_docs) - len(pending), removed=len(removed_ids))
+
+        vectors = chunk_embedder.embed(
+            [doc.page_content for _, doc in pending], progress=lambda done: report(embedded=done)
+        )
+        with_sparse = collection_has_sparse_vector(collection_name)
+        mrl_dim = collection_mrl_dim(client.get_collection(collection_name))
+        if not with_sparse:
+            logging.warning(f"⚠ {collection_name} 컬렉션에 희소 벡터 설정이 없어 dense 벡터만 저장합니다.")
+
+        def to_point(point_id, doc, vector):
+            return PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={
+                    "text": doc.page_content,
+                    "metadata": doc.metadata,
+                    TENANT_KEY: partition
+                }
+            )
+
+        new_points = [
+            to_point(point_id, doc, build_point_vector(vector, doc.page_content, with_sparse, mrl_dim))
+            for (point_id, doc), vector in zip(pending, vectors)
+        ]
+        if moved:
+            new_points.extend(
+                to_point(point.id, moved[point.id], point.vector)
+                for point in scroll_points(
+                    collection_name, Filter(must=[HasIdCondition(has_id=list(moved))]), with_vectors=True
+                )
+            )
+
+        # 신규 청크를 먼저 올린 뒤 옛 청크를 지움 (재적재 중에도 문서가 검색에서 빠지지 않음)
+        for start in range(0, len(new_points), UPSERT_BATCH_SIZE):
+            client.upsert(collection_name=collection_name, points=new_points[start:start + UPSERT_BATCH_SIZE])
+            report(upserted=min(start + UPSERT_BATCH_SIZE, len(new_points)))
+        if removed_ids:
+            client.delete(collection_name=collection_name, points_selector=PointIdsList(points=removed_ids))
 
-    logging.info(f"existing_ids 개수: {len(existing_ids)}")
+        if new_points or removed_ids:
+            bump_versions([partition])  # 해당 파티션 기반 답변 캐시 무효화
+            logging.info(f"{file_path} → {result} (순서만 바뀐 청크 {len(moved)}개 갱신)")
+        else:
+            logging.info(f"{file_path} → 변경 없음, 청크 {len(split_docs)}개 업로드 생략")
+        return result
 
-    extensions = ["pdf", "docx", "csv", "txt", "md", "html", "pptx"]
-    files = []
-    for ext in extensions:
-        files.extend(glob.glob(f"data/*.{ext}"))
 
-    if not files:
-        logging.warning("폴더에 문서가 없습니다.")
-    else:
-        total_chunks = 0
-        total_files = 0
-        for file_path in files:
-            logging.info(f"\n처리 중: {file_path}")
-            added = advanced_embed_and_upsert(
-                file_path=file_path,
-                department_id=test_department_id,
-                common_doc=test_common_doc,
-                original_file_name=os.path.basename(file_path)
-            )
-            if added > 0:
-                total_files += 1
-                total_chunks += added
-
-        logging.info("\n업로드 요약")
-        logging.info(f"신규 문서 수: {total_files}")
-        logging.info(f"총 신규 청크 수: {total_chunks}")
-        logging.info("모든 처리가 완료되었습니다.")
\ No newline at end of file
+# 다중 파일 일괄 적재는 bulk_ingest.py (프로세스 풀 파싱, 진행 매니페스트, --dry-run)
+if __name__ == "__main__":
+    import bulk_ingest
+    bulk_ingest.main()
@@ -0,0 +1,268 @@
+# 질의 임베딩 캐시 (프로세스 내 LRU + 워커 공유 SQLite 디스크 캐시)
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+import re
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("RAG_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "2048"))
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """캐시 키용 텍스트 정규화 (유니코드 NFKC, 공백 축약, 소문자화)"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def to_storage_dtype(vector) -> np.ndarray:
+    """캐시 저장 정밀도(float16)로 반올림 - 메모리/디스크 어느 쪽에서 읽어도 같은 벡터"""
+    return np.asarray(vector, dtype=np.float16)
+
+
+class EmbeddingCache:
+    """
+    임베딩 벡터 캐시
+    - 1단계: 프로세스 내 LRU (OrderedDict), float16으로 반올림한 값을 튜플로 보관
+    - 2단계: SQLite(WAL) 디스크 캐시, float16 BLOB 저장 → gunicorn 워커 간 공유
+    - 디스크 용량이 max_bytes를 넘으면 오래 사용되지 않은 항목부터 제거
+    - get/put은 매번 새 리스트를 반환 (호출자가 수정해도 캐시는 그대로)
+    """
+
+    EVICT_CHECK_INTERVAL = 100  # put 몇 번마다 용량 검사할지
+
+    def __init__(self, db_path: str, memory_items: int = 2048, max_bytes: int = 512 * 1024 * 1024):
+        self.db_path = db_path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts_since_check = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    nbytes INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embedding_cache_access ON embedding_cache (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """스레드별 SQLite 연결 (WAL 모드로 다중 프로세스 동시 읽기/쓰기)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = self.make_key(model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return list(vector)
+
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT vector FROM embedding_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE embedding_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 임베딩 디스크 캐시 조회 실패: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        vector = tuple(np.frombuffer(row[0], dtype=np.float16).astype(np.float32).tolist())
+        self._remember(key, vector)
+        return list(vector)
+
+    def put(self, model: str, text: str, vector: List[float]) -> List[float]:
+        """저장 후 저장 정밀도로 반올림된 벡터 반환 (이후 캐시 적중과 같은 값)"""
+        key = self.make_key(model, text)
+        stored = to_storage_dtype(vector)
+        rounded = tuple(stored.astype(np.float32).tolist())
+        self._remember(key, rounded)
+        blob = stored.tobytes()
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO embedding_cache (key, model, dim, vector, nbytes, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, len(vector), blob, len(blob), time.time())
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 임베딩 디스크 캐시 저장 실패: {e}")
+            return list(rounded)
+
+        with self._lock:
+            self._puts_since_check += 1
+            should_check = self._puts_since_check >= self.EVICT_CHECK_INTERVAL
+            if should_check:
+                self._puts_since_check = 0
+        if should_check:
+            self.evict()
+        return list(rounded)
+
+    def _remember(self, key: str, vector: Tuple[float, ...]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def evict(self) -> int:
+        """디스크 캐시가 max_bytes를 넘으면 last_access가 오래된 항목부터 90% 수준까지 제거"""
+        try:
+            conn = self._connect()
+            total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embedding_cache").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            rows = conn.execute("SELECT key, nbytes FROM embedding_cache ORDER BY last_access ASC").fetchall()
+            stale_keys = []
+            for key, nbytes in rows:
+                if total <= target:
+                    break
+                stale_keys.append((key,))
+                total -= nbytes
+                removed += 1
+            conn.executemany("DELETE FROM embedding_cache WHERE key = ?", stale_keys)
+            logger.info(f"🧹 임베딩 디스크 캐시 정리: {removed}개 제거")
+            return removed
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 임베딩 디스크 캐시 정리 실패: {e}")
+            return 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            memory_items = len(self._memory)
+            result = {
+                "lookups": lookups,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_items": memory_items,
+            }
+        try:
+            count, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM embedding_cache"
+            ).fetchone()
+            result.update({"disk_items": count, "disk_bytes": size, "disk_max_bytes": self.max_bytes})
+        except sqlite3.Error:
+            pass
+        return result
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    기존 임베딩 모델 앞단에 EmbeddingCache를 붙인 래퍼 (LangChain Embeddings 호환)
+    같은 질의를 동시에 임베딩하면(라우터 centroid 단계 + 선행 검색 등) API 호출 하나의 Future를 공유
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+        self._inflight: Dict[str, Future] = {}  # 질의 → 진행 중인 임베딩
+        self._inflight_lock = threading.Lock()
+        self.coalesced = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.cache is not None:
+            vector = self.cache.get(self.model, text)
+            if vector is not None:
+                return vector
+
+        with self._inflight_lock:
+            future = self._inflight.get(text)
+            owner = future is None
+            if owner:
+                future = self._inflight[text] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return list(future.result())  # 대기한 호출마다 별도 리스트
+
+        try:
+            vector = self.embeddings.embed_query(text)
+            if self.cache is not None:
+                vector = self.cache.put(self.model, text, vector)  # 첫 호출도 캐시 적중과 같은 정밀도
+            future.set_result(tuple(vector))
+            return vector
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[text]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.cache is None:
+            return self.embeddings.embed_documents(texts)
+        vectors = [self.cache.get(self.model, text) for text in texts]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            new_vectors = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = self.cache.put(self.model, texts[i], vector)
+        return vectors
+
+    def stats(self) -> dict:
+        stats = self.cache.stats() if self.cache is not None else {"enabled": False}
+        stats["coalesced"] = self.coalesced
+        return stats
+
+
+def build_cached_embeddings(embeddings: Embeddings, model: str) -> CachedEmbeddings:
+    """환경 변수 설정에 따라 캐시가 붙은 임베딩 객체 생성"""
+    cache = None
+    if EMBEDDING_CACHE_ENABLED:
+        try:
+            cache = EmbeddingCache(
+                db_path=os.path.join(CACHE_DIR, "query_embeddings.sqlite3"),
+                memory_items=EMBEDDING_CACHE_MEMORY_ITEMS,
+                max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ 임베딩 캐시 초기화 실패, 캐시 없이 진행: {e}")
+    return CachedEmbeddings(embeddings, model=model, cache=cache)
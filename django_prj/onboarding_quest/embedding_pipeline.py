@@ -0,0 +1,281 @@
+# 문서 임베딩 파이프라인 (적재 경로 전용)
+#
+# - 청크를 토큰 예산(EMBED_BATCH_MAX_TOKENS)과 개수(EMBED_BATCH_MAX_ITEMS) 안에서 배치로 묶어
+#   최대 EMBED_CONCURRENCY개 요청을 동시에 보냄
+# - 속도 제한(429): 동시 요청 수와 배치 토큰 예산을 절반으로 줄이고 지수 백오프(Retry-After 우선) 후
+#   실패한 배치만 다시 보냄. 연속 성공 시 동시 요청 수/예산을 다시 늘림 (AIMD)
+#   한 번의 embed 호출에서 누적 대기가 EMBED_MAX_RATE_LIMIT_WAIT초를 넘으면 실패 (할당량 소진은 즉시 실패)
+# - 입력 토큰 초과(400): 배치를 둘로 나눠 재시도
+# - 그 밖의 오류: 해당 배치만 EMBED_MAX_RETRIES회까지 재시도, 이미 받은 벡터는 유지
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, List, Optional
+
+from context_packing import count_tokens
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_MAX_TOKENS = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "16000"))
+EMBED_BATCH_MAX_ITEMS = int(os.getenv("EMBED_BATCH_MAX_ITEMS", "64"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", "1.0"))  # 초
+EMBED_MAX_RATE_LIMIT_WAIT = float(os.getenv("EMBED_MAX_RATE_LIMIT_WAIT", "600"))  # 초
+EMBED_BACKOFF_MAX = 60.0
+MIN_BATCH_TOKENS = 1000  # 속도 제한으로 줄일 수 있는 배치 예산 하한
+RECOVERY_SUCCESSES = 4  # 연속 성공 몇 번마다 동시 요청 수/예산을 한 단계 복구할지
+
+RATE_LIMIT_MARKERS = ("rate limit", "rate_limit", "too many requests")
+QUOTA_MARKERS = ("insufficient_quota", "exceeded your current quota")
+TOO_LARGE_MARKERS = ("maximum context length", "too many tokens", "max_tokens_per_request", "maximum request size")
+
+
+class EmbeddingPipelineError(RuntimeError):
+    """재시도 한도를 넘겨 일부 배치를 임베딩하지 못함"""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_rate_limit(error: Exception) -> bool:
+    message = str(error).lower()
+    if any(marker in message for marker in QUOTA_MARKERS):
+        return False  # 429지만 기다려도 풀리지 않음
+    return _status_code(error) == 429 or any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+def is_too_large(error: Exception) -> bool:
+    return _status_code(error) in (400, 413) and any(marker in str(error).lower() for marker in TOO_LARGE_MARKERS)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """응답 헤더의 Retry-After (초)"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Batch:
+    __slots__ = ("indices", "tokens")
+
+    def __init__(self, indices, tokens):
+        self.indices = indices
+        self.tokens = tokens
+
+
+class EmbeddingPipeline:
+    """토큰 예산 배치 + 동시 요청 제한 + 적응형 백오프 임베딩"""
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]], max_batch_tokens: int = 16000,
+                 max_batch_items: int = 64, concurrency: int = 4, max_retries: int = 5, backoff_base: float = 1.0,
+                 max_rate_limit_wait: float = 600):
+        """
+        Args:
+            embed_fn: 텍스트 리스트 → 벡터 리스트 (예: embeddings.embed_documents)
+        """
+        self.embed_fn = embed_fn
+        self.max_batch_tokens = max(MIN_BATCH_TOKENS, max_batch_tokens)
+        self.max_batch_items = max(1, max_batch_items)
+        self.max_concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed")
+        self._lock = threading.Lock()
+        # 적응 상태 (프로세스 공용: 동시에 적재 중인 작업들이 같은 API 한도를 나눠 씀)
+        self._concurrency = self.max_concurrency
+        self._batch_tokens = self.max_batch_tokens
+        self._successes = 0
+        self._resume_at = 0.0
+        self._rate_limit_streak = 0
+        self.counters = {
+            "runs": 0, "batches": 0, "chunks": 0, "tokens": 0, "retries": 0,
+            "rate_limited": 0, "split_batches": 0, "failed_runs": 0, "busy_seconds": 0.0,
+        }
+        self._last_run = {}
+
+    def _form_batch(self, pending: deque, token_counts: List[int]) -> _Batch:
+        """대기 중인 청크를 현재 예산 안에서 하나의 배치로 (예산보다 큰 청크는 단독 배치)"""
+        with self._lock:
+            budget = self._batch_tokens
+        indices, tokens = [], 0
+        while pending and len(indices) < self.max_batch_items:
+            size = token_counts[pending[0]]
+            if indices and tokens + size > budget:
+                break
+            indices.append(pending.popleft())
+            tokens += size
+        return _Batch(indices, tokens)
+
+    def _on_success(self):
+        with self._lock:
+            self._rate_limit_streak = 0
+            self._successes += 1
+            if self._successes >= RECOVERY_SUCCESSES:
+                self._successes = 0
+                self._concurrency = min(self.max_concurrency, self._concurrency + 1)
+                self._batch_tokens = min(self.max_batch_tokens, int(self._batch_tokens * 1.5))
+
+    def _on_rate_limit(self, error: Exception) -> float:
+        with self._lock:
+            self._successes = 0
+            self._rate_limit_streak += 1
+            self._concurrency = max(1, self._concurrency // 2)
+            self._batch_tokens = max(MIN_BATCH_TOKENS, self._batch_tokens // 2)
+            delay = retry_after(error)
+            if delay is None:
+                delay = min(EMBED_BACKOFF_MAX, self.backoff_base * 2 ** (self._rate_limit_streak - 1))
+                delay *= random.uniform(0.8, 1.2)
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+            self.counters["rate_limited"] += 1
+        return delay
+
+    def embed(self, texts: List[str], progress: Optional[Callable[[int], None]] = None) -> List[List[float]]:
+        """
+        texts 순서대로 벡터 반환
+        Args:
+            progress: progress(완료된 청크 수) - 배치가 끝날 때마다 호출
+        Raises:
+            EmbeddingPipelineError: 어떤 배치가 재시도 한도를 넘김
+        """
+        if not texts:
+            return []
+        start = time.perf_counter()
+        token_counts = [count_tokens(text) for text in texts]
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        attempts = [0] * len(texts)
+        pending = deque(range(len(texts)))
+        in_flight = {}  # {future: _Batch}
+        done_count = retries = 0
+        waited = [0.0]  # 이번 호출에서 속도 제한으로 대기한 누적 시간
+
+        try:
+            while pending or in_flight:
+                with self._lock:
+                    limit = self._concurrency
+                    wait_for = self._resume_at - time.monotonic()
+                if pending and len(in_flight) < limit and wait_for <= 0:
+                    batch = self._form_batch(pending, token_counts)
+                    future = self._executor.submit(self.embed_fn, [texts[i] for i in batch.indices])
+                    in_flight[future] = batch
+                    continue
+                if not in_flight:
+                    time.sleep(max(0.0, wait_for))  # 속도 제한 백오프 대기
+                    continue
+
+                finished, _ = wait(list(in_flight), timeout=max(0.05, wait_for) if wait_for > 0 else None,
+                                   return_when=FIRST_COMPLETED)
+                requeue = []
+                for future in finished:
+                    batch = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        requeue.extend(self._handle_failure(batch, e, attempts, waited))
+                        retries += 1
+                        continue
+                    if len(result) != len(batch.indices):
+                        raise EmbeddingPipelineError(f"임베딩 개수 불일치: 요청 {len(batch.indices)}개, 응답 {len(result)}개")
+                    for i, vector in zip(batch.indices, result):
+                        vectors[i] = vector
+                    done_count += len(batch.indices)
+                    self._on_success()
+                    with self._lock:
+                        self.counters["batches"] += 1
+                    if progress:
+                        progress(done_count)
+                # 실패한 배치는 다음 배치로 먼저 (원래 순서 유지)
+                for index in sorted(requeue, reverse=True):
+                    pending.appendleft(index)
+        except Exception:
+            for future in in_flight:
+                future.cancel()
+            with self._lock:
+                self.counters["failed_runs"] += 1
+                self.counters["retries"] += retries
+            raise
+
+        elapsed = time.perf_counter() - start
+        total_tokens = sum(token_counts)
+        with self._lock:
+            self.counters["runs"] += 1
+            self.counters["chunks"] += len(texts)
+            self.counters["tokens"] += total_tokens
+            self.counters["retries"] += retries
+            self.counters["busy_seconds"] += elapsed
+            self._last_run = {
+                "chunks": len(texts),
+                "tokens": total_tokens,
+                "seconds": round(elapsed, 3),
+                "chunks_per_sec": round(len(texts) / elapsed, 1) if elapsed else 0.0,
+                "tokens_per_sec": round(total_tokens / elapsed, 1) if elapsed else 0.0,
+                "retries": retries,
+            }
+        logger.info(
+            f"🧮 임베딩 {len(texts)}청크 / {total_tokens}토큰 | {elapsed:.1f}초 "
+            f"({self._last_run['chunks_per_sec']}청크/초, {self._last_run['tokens_per_sec']}토큰/초, 재시도 {retries}회)"
+        )
+        return vectors
+
+    def _handle_failure(self, batch: _Batch, error: Exception, attempts: List[int], waited: List[float]) -> List[int]:
+        """실패한 배치 처리 → 다시 보낼 청크 인덱스 (한도 초과 시 예외)"""
+        if is_too_large(error):
+            if len(batch.indices) == 1:
+                raise EmbeddingPipelineError(f"청크 하나가 임베딩 입력 한도를 넘음 ({batch.tokens}토큰): {error}") from error
+            with self._lock:
+                self.counters["split_batches"] += 1
+                self._batch_tokens = max(MIN_BATCH_TOKENS, min(self._batch_tokens, batch.tokens // 2))
+            logger.warning(f"✂️ 임베딩 배치 입력 초과 → 분할 재시도 ({len(batch.indices)}개, {batch.tokens}토큰)")
+            return batch.indices
+
+        if is_rate_limit(error):
+            # 속도 제한은 재시도 횟수 대신 누적 대기 시간으로 제한
+            delay = self._on_rate_limit(error)
+            waited[0] += delay
+            if waited[0] > self.max_rate_limit_wait:
+                raise EmbeddingPipelineError(
+                    f"임베딩 속도 제한 대기 한도 초과 ({self.max_rate_limit_wait:.0f}초): {error}"
+                ) from error
+            logger.warning(
+                f"⏳ 임베딩 속도 제한 → {delay:.1f}초 대기, 동시 요청 {self._concurrency}개 / 배치 {self._batch_tokens}토큰"
+            )
+            return batch.indices
+
+        for i in batch.indices:
+            attempts[i] += 1
+        if max(attempts[i] for i in batch.indices) > self.max_retries:
+            raise EmbeddingPipelineError(
+                f"임베딩 배치 재시도 한도 초과 ({self.max_retries}회, 청크 {len(batch.indices)}개): {error}"
+            ) from error
+        delay = min(EMBED_BACKOFF_MAX, self.backoff_base * 2 ** (max(attempts[i] for i in batch.indices) - 1))
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        logger.warning(f"⚠️ 임베딩 배치 실패 → {delay:.1f}초 후 재시도: {error}")
+        return batch.indices
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            busy = counters["busy_seconds"]
+            return {
+                **counters,
+                "busy_seconds": round(busy, 3),
+                "chunks_per_sec": round(counters["chunks"] / busy, 1) if busy else 0.0,
+                "tokens_per_sec": round(counters["tokens"] / busy, 1) if busy else 0.0,
+                "last_run": dict(self._last_run),
+                "concurrency": self._concurrency,
+                "max_concurrency": self.max_concurrency,
+                "batch_tokens": self._batch_tokens,
+                "max_batch_tokens": self.max_batch_tokens,
+            }
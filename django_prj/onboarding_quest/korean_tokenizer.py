@@ -0,0 +1,51 @@
+# 한국어 규정 문서용 경량 토크나이저 (형태소 분석기 없이 BM25/희소 벡터에 사용)
+import re
+import unicodedata
+from typing import List
+
+# "제12조", "제 3 장" 같은 조항 표기는 하나의 토큰으로 유지
+ARTICLE_PATTERN = re.compile(r"제\s*(\d+)\s*(조의\s*\d+|조|항|장|절|목|호)")
+WHITESPACE = re.compile(r"\s+")
+TOKEN_PATTERN = re.compile(r"[가-힣]+|[a-z]+|\d+(?:\.\d+)*")
+
+# 검색에 도움이 되지 않는 조사/어미 (단어 끝에서 제거)
+JOSA_SUFFIXES = (
+    "에서는", "으로는", "에게는", "이라는", "에서", "으로", "에게", "까지", "부터", "이나", "이란", "라는",
+    "은", "는", "이", "가", "을", "를", "의", "에", "와", "과", "도", "로", "만",
+)
+STOPWORDS = {"및", "등", "또는", "그", "이", "저", "것", "수", "때", "대한", "대해", "관련", "어떻게", "무엇", "뭐야", "알려줘"}
+
+
+def _strip_josa(word: str) -> str:
+    for suffix in JOSA_SUFFIXES:
+        if len(word) > len(suffix) + 1 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    텍스트를 검색용 토큰으로 분리
+    - 조항 표기(제12조) → 단일 토큰 "제12조"
+    - 한글 단어 → 조사 제거한 어간 + 음절 bigram (복합어/띄어쓰기 차이 보정)
+    - 영문/숫자 → 소문자 단어 그대로
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    for match in ARTICLE_PATTERN.finditer(text):
+        tokens.append("제" + match.group(1) + WHITESPACE.sub("", match.group(2)))
+    text = ARTICLE_PATTERN.sub(" ", text)
+
+    for word in TOKEN_PATTERN.findall(text):
+        if word in STOPWORDS:
+            continue
+        if "가" <= word[0] <= "힣":
+            stem = _strip_josa(word)
+            if stem in STOPWORDS:
+                continue
+            tokens.append(stem)
+            if len(stem) > 2:
+                tokens.extend(stem[i:i + 2] for i in range(len(stem) - 1))
+        else:
+            tokens.append(word)
+    return tokens
@@ -0,0 +1,131 @@
+# 부서별 rag_* 컬렉션 → 단일 멀티테넌트 컬렉션(RAG_SHARED_COLLECTION) 복사 도구
+#
+# 저장된 벡터를 그대로 복사하므로 재임베딩(OpenAI 호출)이 없다.
+# 희소 벡터가 없는 예전 컬렉션은 payload text로 희소 벡터만 계산해 채운다.
+# 포인트 ID는 (원본 컬렉션, 원본 ID)로 고정 생성하므로 여러 번 실행해도 중복되지 않는다.
+#
+# 사용법 (django_prj/onboarding_quest 에서):
+#   python migrate_to_shared_collection.py --dry-run
+#   python migrate_to_shared_collection.py                       # rag_{부서ID}, rag_common, rag_misc 전체
+#   python migrate_to_shared_collection.py --collections rag_3 rag_common
+# 복사 후 RAG_STORAGE_LAYOUT=shared 로 전환하고, 검증이 끝나면 기존 컬렉션은 직접 삭제한다.
+import re
+import uuid
+import logging
+import argparse
+
+from qdrant_client.models import PointStruct, SparseVector, Filter
+
+from embed_and_upsert import client, create_collection_if_not_exists
+from cache_versions import bump_versions
+from sparse_encoder import SPARSE_VECTOR_NAME, encode_document
+from storage_layout import SHARED_COLLECTION, TENANT_KEY, tenant_condition
+from vector_compression import MRL_VECTOR_NAME, truncate_vector, collection_mrl_dim
+
+PARTITION_PATTERN = re.compile(r"^rag_(\d+|common|misc)$")
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2a52-3f0e-4a8e-9a59-2d5b8f0c7e11")
+
+
+def find_partition_collections():
+    names = [c.name for c in client.get_collections().collections]
+    return sorted(name for name in names if PARTITION_PATTERN.match(name))
+
+
+def shared_point_id(collection_name: str, point_id) -> str:
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{collection_name}:{point_id}"))
+
+
+def to_shared_vector(vector, text: str, mrl_dim: int = 0):
+    """원본 벡터 → 공용 컬렉션 벡터 (dense는 그대로, 희소/MRL 벡터가 없으면 계산)"""
+    if isinstance(vector, dict):
+        dense = vector.get("")
+        sparse = vector.get(SPARSE_VECTOR_NAME)
+    else:
+        dense, sparse = vector, None
+    if sparse is None:
+        indices, values = encode_document(text)
+        sparse = SparseVector(indices=indices, values=values)
+    shared = {"": dense, SPARSE_VECTOR_NAME: sparse}
+    if mrl_dim:
+        shared[MRL_VECTOR_NAME] = truncate_vector(dense, mrl_dim)
+    return shared
+
+
+def copy_collection(collection_name: str, batch_size: int, dry_run: bool) -> int:
+    copied = 0
+    mrl_dim = 0 if dry_run else collection_mrl_dim(client.get_collection(SHARED_COLLECTION))
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        if not points:
+            break
+
+        batch = []
+        for point in points:
+            payload = dict(point.payload or {})
+            payload[TENANT_KEY] = collection_name
+            batch.append(PointStruct(
+                id=shared_point_id(collection_name, point.id),
+                vector=to_shared_vector(point.vector, payload.get("text", ""), mrl_dim),
+                payload=payload
+            ))
+        if not dry_run:
+            client.upsert(collection_name=SHARED_COLLECTION, points=batch, wait=True)
+        copied += len(batch)
+        logging.info(f"  {collection_name} → {SHARED_COLLECTION}: {copied}개")
+
+        if offset is None:
+            break
+    return copied
+
+
+def verify(collection_name: str) -> bool:
+    source = client.count(collection_name=collection_name, exact=True).count
+    target = client.count(
+        collection_name=SHARED_COLLECTION,
+        count_filter=Filter(must=[tenant_condition([collection_name])]),
+        exact=True
+    ).count
+    ok = source == target
+    logging.info(f"{'✅' if ok else '❌'} 검증 {collection_name}: 원본 {source}개 / 공용 컬렉션 {target}개")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rag_* 컬렉션을 단일 멀티테넌트 컬렉션으로 복사 (재임베딩 없음)")
+    parser.add_argument("--collections", nargs="*", help="복사할 컬렉션 (기본: rag_{부서ID}, rag_common, rag_misc 전체)")
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--dry-run", action="store_true", help="복사 없이 대상/개수만 확인")
+    args = parser.parse_args()
+
+    collections = args.collections or find_partition_collections()
+    if not collections:
+        logging.warning("복사할 rag_* 컬렉션이 없습니다.")
+        return
+    logging.info(f"대상 컬렉션: {collections} → {SHARED_COLLECTION}{' (dry-run)' if args.dry_run else ''}")
+
+    if not args.dry_run:
+        create_collection_if_not_exists(SHARED_COLLECTION)
+
+    total = 0
+    failed = []
+    for collection_name in collections:
+        total += copy_collection(collection_name, args.batch, args.dry_run)
+        if not args.dry_run and not verify(collection_name):
+            failed.append(collection_name)
+
+    if not args.dry_run:
+        bump_versions(collections)  # 레이아웃 전환 후 이전 답변 캐시가 재사용되지 않도록
+    logging.info(f"총 {total}개 포인트 {'확인' if args.dry_run else '복사'} 완료")
+    if failed:
+        logging.error(f"개수가 일치하지 않는 컬렉션: {failed}")
+
+
+if __name__ == "__main__":
+    main()
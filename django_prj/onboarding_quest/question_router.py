@@ -0,0 +1,185 @@
+# RAG 사용 여부 라우터 (키워드 → 임베딩 centroid → LLM 순으로 단계적 판단)
+import os
+import re
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from korean_tokenizer import ARTICLE_PATTERN
+
+logger = logging.getLogger(__name__)
+
+ROUTER_CENTROID_MARGIN = float(os.getenv("ROUTER_CENTROID_MARGIN", "0.05"))  # 두 centroid 유사도 차이 기준
+
+USE_RAG = "use_rag"
+SKIP_RAG = "skip_rag"
+
+# 질문 유형 키워드 중 단독으로는 사내 문서 질문이라고 보기 어려운 단어
+WEAK_KEYWORDS = {"제", "조", "어떻게", "언제", "누구", "시간", "방법", "처리"}
+
+# 사내 문서 검색이 필요한 주제어 (LLM 판단 프롬프트의 기준과 동일한 범위)
+DOMAIN_KEYWORDS = [
+    "정책", "매뉴얼", "메뉴얼", "제출", "기한", "마감", "휴가", "연차", "반차", "병가", "복지", "급여", "수당",
+    "출장", "경비", "정산", "법인카드", "결재", "보안", "비밀번호", "계정", "온보딩", "교육", "평가", "인사",
+    "근무", "출근", "퇴근", "재택", "사내", "회사", "가이드", "양식", "서류",
+]
+
+# 잡담/인사 패턴 (사내 주제어가 없을 때만 skip_rag)
+SMALL_TALK_PATTERN = re.compile(
+    r"^\s*(안녕|하이|헬로|hello|hi\b|hey\b|반가|고마|감사|땡큐|thank|ㅋ|ㅎ|ㅠ|ㅜ|잘\s*자|좋은\s*(아침|하루|밤)|수고|"
+    r"심심|배고|졸려|피곤|날씨|오늘\s*기분|너\s*(는|누구)|넌\s*누구|이름이\s*뭐)",
+    re.IGNORECASE,
+)
+
+# 임베딩 centroid 초기 예시 질문
+SEED_QUESTIONS = {
+    USE_RAG: [
+        "연차 신청 방법 알려줘",
+        "휴가 규정이 어떻게 되나요?",
+        "출장비 정산은 어떻게 하나요?",
+        "보안 서약서는 언제까지 제출해야 하나요?",
+        "신입사원 교육 일정이 궁금해요",
+        "법인카드 사용 규정",
+        "재택근무 신청 절차",
+        "경조사 휴가는 며칠인가요?",
+        "비밀번호 변경 주기가 어떻게 되나요?",
+        "인사평가 기준이 뭐야?",
+    ],
+    SKIP_RAG: [
+        "안녕하세요",
+        "고마워",
+        "오늘 날씨 어때?",
+        "점심 메뉴 추천해줘",
+        "너는 누구야?",
+        "심심한데 재밌는 얘기 해줘",
+        "파이썬에서 리스트 정렬하는 방법",
+        "지구에서 가장 높은 산은?",
+        "오늘 기분이 좀 안 좋아",
+        "영어로 감사합니다가 뭐야?",
+    ],
+}
+
+LLM_ROUTER_PROMPT = """
+너는 사용자의 질문이 '회사 내부 문서 검색이 필요한 질문'인지 판단하는 심사관이야.
+
+다음의 기준에 따라 판단해:
+- 회사 정책, 규정, 메뉴얼, 제출 기한, 휴가 제도, 신청 절차, 업무 처리 방식 등과 관련된 질문이면 "use_rag"
+- 일반적인 잡담, 일상 대화, 개인적인 감정 또는 널리 알려진 상식 기반 질문이면 "skip_rag"
+
+질문: "{question}"
+
+반드시 딱 하나의 단어만 출력해: "use_rag" 또는 "skip_rag".
+다른 말은 절대 하지 마.
+"""
+
+
+class TieredQuestionRouter:
+    """
+    use_rag / skip_rag 판단
+    - 1단계: 키워드/정규식 (질문 유형 분류 어휘 + 사내 주제어 + 잡담 패턴)
+    - 2단계: 질의 임베딩과 use_rag / skip_rag centroid 간 코사인 유사도 비교
+    - 3단계: 위 단계의 확신도가 낮을 때만 LLM 호출 (LLM 판단 결과는 centroid에 반영)
+    """
+
+    def __init__(self, embeddings, llm, keyword_vocab: Dict[str, List[str]], centroid_margin: float = 0.05):
+        self.embeddings = embeddings
+        self.llm = llm
+        self.centroid_margin = centroid_margin
+        self.rag_keywords = sorted(
+            {kw for words in keyword_vocab.values() for kw in words if kw not in WEAK_KEYWORDS} | set(DOMAIN_KEYWORDS)
+        )
+        self._centroid_sums: Optional[Dict[str, np.ndarray]] = None
+        self._centroid_counts: Dict[str, int] = {USE_RAG: 0, SKIP_RAG: 0}
+        self._lock = threading.Lock()
+        self.tier_counts = {"keyword": 0, "centroid": 0, "llm": 0}
+        self.route_counts = {USE_RAG: 0, SKIP_RAG: 0}
+
+    # 1단계
+    def _keyword_route(self, question: str) -> Optional[str]:
+        text = question.lower()
+        if ARTICLE_PATTERN.search(text) or any(kw in text for kw in self.rag_keywords):
+            return USE_RAG
+        if SMALL_TALK_PATTERN.search(text):
+            return SKIP_RAG
+        return None
+
+    # 2단계
+    def _ensure_centroids(self):
+        if self._centroid_sums is not None:
+            return
+        sums = {}
+        for route, questions in SEED_QUESTIONS.items():
+            vectors = np.asarray(self.embeddings.embed_documents(questions), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            sums[route] = vectors.sum(axis=0)
+            self._centroid_counts[route] = len(questions)
+        with self._lock:
+            if self._centroid_sums is None:
+                self._centroid_sums = sums
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _centroid_route(self, query_vec: np.ndarray) -> Tuple[str, float]:
+        self._ensure_centroids()
+        with self._lock:
+            scores = {route: float(np.dot(query_vec, self._unit(total))) for route, total in self._centroid_sums.items()}
+        best = max(scores, key=scores.get)
+        other = SKIP_RAG if best == USE_RAG else USE_RAG
+        return best, scores[best] - scores[other]
+
+    def _learn(self, route: str, query_vec: np.ndarray):
+        """LLM이 판단한 질의를 해당 centroid에 누적해 다음 판단부터 2단계에서 처리되도록 함"""
+        with self._lock:
+            if self._centroid_sums is not None:
+                self._centroid_sums[route] = self._centroid_sums[route] + query_vec
+                self._centroid_counts[route] += 1
+
+    # 3단계
+    def _llm_route(self, question: str) -> str:
+        result = self.llm.invoke(LLM_ROUTER_PROMPT.format(question=question)).content.strip().lower()
+        logger.info(f"[RAG 판단] LLM 응답: {result}")
+        return USE_RAG if USE_RAG in result else SKIP_RAG
+
+    def route(self, question: str) -> str:
+        route = self._keyword_route(question)
+        tier = "keyword"
+
+        query_vec = None
+        if route is None:
+            try:
+                query_vec = self._unit(self.embeddings.embed_query(question))
+                candidate, margin = self._centroid_route(query_vec)
+                logger.info(f"[RAG 판단] centroid 결과: {candidate} (margin={margin:.3f})")
+                if margin >= self.centroid_margin:
+                    route, tier = candidate, "centroid"
+            except Exception as e:
+                logger.warning(f"⚠️ centroid 라우팅 실패, LLM으로 판단: {e}")
+
+        if route is None:
+            route, tier = self._llm_route(question), "llm"
+            if query_vec is not None:
+                self._learn(route, query_vec)
+
+        with self._lock:
+            self.tier_counts[tier] += 1
+            self.route_counts[route] += 1
+        logger.info(f"[RAG 판단] 질문: {question} → {route} ({tier} 단계)")
+        return route
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.tier_counts.values())
+            return {
+                "total": total,
+                "tier_counts": dict(self.tier_counts),
+                "route_counts": dict(self.route_counts),
+                "llm_calls_saved": total - self.tier_counts["llm"],
+                "llm_call_rate": round(self.tier_counts["llm"] / total, 4) if total else 0.0,
+                "centroid_examples": dict(self._centroid_counts),
+            }
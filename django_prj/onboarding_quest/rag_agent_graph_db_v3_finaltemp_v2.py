@@ -1,24 +1,46 @@
 # 필수 라이브러리
 import os
+import math
 import uuid
 import time
-import psycopg2
 from psycopg2.extras import RealDictCursor
 import logging
 import re
+from collections import defaultdict
 import numpy as np
 from datetime import datetime
 from typing import TypedDict, List
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from qdrant_client import QdrantClient
 from qdrant_client.models import Filter, FieldCondition, MatchValue
 from langchain_core.messages import SystemMessage, HumanMessage
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from qdrant_client.http.models import Filter, FieldCondition, MatchValue 
-from qdrant_client.models import MatchText
+from qdrant_client.models import MatchAny, Prefetch, FusionQuery, Fusion, SparseVector
+from embedding_cache import build_cached_embeddings
+from answer_cache import (
+    SemanticAnswerCache, ANSWER_CACHE_ENABLED, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES
+)
+from cache_versions import get_versions
+from rerankers import build_reranker
+from sparse_encoder import SPARSE_VECTOR_NAME, encode_query, is_keyword_query
+from question_router import TieredQuestionRouter, ROUTER_CENTROID_MARGIN
+from db_pool import build_connection_pool
+from vector_store import build_vector_client
+from context_packing import ContextPacker, CONTEXT_PACKING, CONTEXT_TOKEN_BUDGET, CONTEXT_CHUNKS_PER_DOC
+from retrieval_types import RetrievedChunk, render_contexts
+from storage_layout import SHARED_COLLECTION, is_shared_layout, with_tenant_filter
+from doc_index import DocCollectionIndex, DOC_INDEX_MAX_AGE
+from session_summarizer import SessionSummarizer, SUMMARY_EVERY_N_TURNS, SUMMARY_MAX_WORKERS
+from chat_history import (
+    ChatHistoryCache, connection_loader, connection_id_loader, CHAT_HISTORY_TURNS, CHAT_HISTORY_CACHED_SESSIONS
+)
+from vector_compression import (
+    MRL_VECTOR_NAME, MRL_OVERSAMPLING, mrl_enabled, search_params, truncate_vector, collection_mrl_dim
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
@@ -39,40 +61,75 @@ DB_CONFIG = {
     'password': os.getenv("DB_PASSWORD", "")
 }
 
+# 프로세스 공용 커넥션 풀 (모든 그래프 노드가 공유, 첫 사용 시 연결 생성)
+db_pool = build_connection_pool(DB_CONFIG, cursor_factory=RealDictCursor)
+
 @contextmanager
 def get_db_connection():
-    """안전한 PostgreSQL 연결 관리"""
-    conn = None
+    """안전한 PostgreSQL 연결 관리 (풀에서 대여 → commit/rollback → 반납)"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
-        conn.autocommit = False
-        yield conn
-        conn.commit()
+        with db_pool.connection() as conn:
+            yield conn
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database error: {e}")
         raise e
-    finally:
-        if conn:
-            conn.close()
+
+# doc_filter(파일명) → 컬렉션 인덱스 (시작 시 로드, 문서 변경 시 버전 카운터로 무효화)
+doc_index = DocCollectionIndex(connection_factory=get_db_connection, max_age=DOC_INDEX_MAX_AGE)
+try:
+    doc_index.load()
+except Exception as e:
+    logger.warning(f"⚠️ 문서 인덱스 초기 로드 실패 (첫 검색 시 재시도): {e}")
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 
 # LangChain 구성
-client = QdrantClient(url=QDRANT_URL)
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model="text-embedding-3-large")
+client = build_vector_client(QDRANT_URL)  # RAG_VECTOR_BACKEND=numpy 이면 내장 저장소
+EMBEDDING_MODEL = "text-embedding-3-large"
+# 질의 임베딩은 정규화 텍스트 + 모델명 기준으로 캐시 (워커 간 디스크 캐시 공유)
+embeddings = build_cached_embeddings(
+    OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL),
+    model=EMBEDDING_MODEL
+)
 # llm = ChatOpenAI(openai_api_key=OPENAI_API_KEY, model_name="gpt-4o-mini")
 llm_fast = ChatOpenAI(openai_api_key=OPENAI_API_KEY, model_name="gpt-3.5-turbo")
 llm_smart = ChatOpenAI(openai_api_key=OPENAI_API_KEY, model_name="gpt-4o-mini")
 
+# 문서 리랭커 (RAG_RERANKER=hybrid|llm)
+reranker = build_reranker(llm=llm_smart)
+
+# 답변 context 조립 (조항 단위 병합 + 겹침 제거 + 토큰 예산)
+context_packer = ContextPacker(token_budget=CONTEXT_TOKEN_BUDGET, enabled=CONTEXT_PACKING)
+
 
 WINDOW_SIZE = 10
 
+# 컬렉션 병렬 검색 설정
+SEARCH_LIMIT = 10
+SEARCH_MAX_WORKERS = int(os.getenv("RAG_SEARCH_MAX_WORKERS", "8"))
+SEARCH_TIMEOUT = float(os.getenv("RAG_SEARCH_TIMEOUT", "3"))  # 컬렉션별 타임아웃(초)
+# dense + sparse(키워드) 하이브리드 검색 (RRF 결합)
+HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "true").lower() in ("1", "true", "yes", "on")
+HYBRID_PREFETCH_LIMIT = int(os.getenv("RAG_HYBRID_PREFETCH_LIMIT", "30"))
+SPARSE_SUPPORT_TTL = 300  # 컬렉션 희소 벡터 지원 여부 캐시 시간(초)
+
+# 모든 요청이 공유하는 검색 전용 스레드 풀 (동시 Qdrant 호출 수 상한)
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="qdrant-search")
+# 검색 전용 클라이언트: query_points의 timeout은 Qdrant 서버 측 제한이라, HTTP 요청 자체도 컬렉션별 타임아웃에서
+# 끊기도록 클라이언트 타임아웃을 맞춤 (타임아웃으로 제외된 검색이 검색 풀 스레드를 계속 잡고 있지 않게)
+search_client = build_vector_client(QDRANT_URL, timeout=math.ceil(SEARCH_TIMEOUT))
+
+# 선행(speculative) 검색: RAG 사용 여부 판단과 임베딩/검색을 동시에 실행
+SPECULATIVE_RETRIEVAL = os.getenv("RAG_SPECULATIVE_RETRIEVAL", "true").lower() in ("1", "true", "yes", "on")
+# 검색 풀과 분리해야 선행 작업이 검색 풀 작업을 기다리며 교착되지 않음
+speculation_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RAG_SPECULATION_MAX_WORKERS", "8")), thread_name_prefix="rag-speculative"
+)
+
 class AgentState(TypedDict, total=False):
     question: str
-    contexts: List[str]
+    contexts: List[RetrievedChunk]  # 검색/조립된 context 레코드 (프롬프트 문자열은 render_contexts로 생성)
     answer: str
     reflection: str
     rewritten_question: str
@@ -86,6 +143,12 @@ class AgentState(TypedDict, total=False):
     question_type: str
     user_department_id: int  # 부서 ID 추가
     doc_filter: List[str]  # ✅ 이 줄 추가
+    skipped_collections: List[str]  # 타임아웃/오류로 검색에서 제외된 컬렉션
+    retrieval_mode: str  # "hybrid" (dense+sparse) 또는 "dense"
+    route: str  # decide 노드의 판단 결과 (use_rag / skip_rag)
+    speculation: Future  # decide 노드에서 시작한 선행 검색 Future[(검색 결과, 제외 컬렉션, retrieval_mode)]
+    references: str  # 답변 하단 참고 문서 표시
+    context_report: dict  # context 조립 토큰 수 (raw_tokens / packed_tokens / saved_tokens 등)
 
 # 품질 평가 관리 클래스
 class QualityMetrics:
@@ -115,7 +178,6 @@ class QualityMetrics:
 
 # 전역 품질 메트릭 인스턴스
 quality_metrics = QualityMetrics()
-
 # 세션 및 메시지 DB 함수 (PostgreSQL 버전)
 def create_chat_session(user_id: str) -> str:
     """PostgreSQL을 사용하는 세션 생성"""
@@ -133,57 +195,57 @@ def create_chat_session(user_id: str) -> str:
     return str(session_id)
 
 
+# 세션별 최근 N턴 롤링 윈도우 (메시지 저장 시 record_message로 갱신, 재사용 전 DB의 새 메시지 ID 확인)
+chat_history = ChatHistoryCache(
+    loader=connection_loader(get_db_connection),
+    id_loader=connection_id_loader(get_db_connection),
+    window=CHAT_HISTORY_TURNS,
+    max_sessions=CHAT_HISTORY_CACHED_SESSIONS
+)
+
+
 def save_message(session_id: str, text: str, message_type: str):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO core_chatmessage (session_id, create_time, message_text, message_type, is_active) VALUES (%s, %s, %s, %s, %s)",
+            "INSERT INTO core_chatmessage (session_id, create_time, message_text, message_type, is_active) VALUES (%s, %s, %s, %s, %s) RETURNING message_id",
             (int(session_id), datetime.now(), text, message_type, True)
         )
+        message_id = cursor.fetchone()['message_id']
+    chat_history.record_message(session_id, message_id, message_type, text)
 
 
 def load_session_history(session_id: str, limit: int = 10) -> List[str]:
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT message_text, message_type
-            FROM core_chatmessage
-            WHERE session_id = %s
-            ORDER BY create_time ASC
-        """, (int(session_id),))
-        
-        messages = cursor.fetchall()
+    return chat_history.recent_turns(session_id)[-limit:]
 
-    history = []
-    buffer = {}
-    for row in messages:
-        text, mtype = row['message_text'], row['message_type']
-        if mtype == "user":
-            buffer["user"] = text
-        elif mtype in ["bot", "chatbot"]:
-            buffer["bot"] = text
-        if "user" in buffer and "bot" in buffer:
-            history.append(f"Q: {buffer['user']}\nA: {buffer['bot']}")
-            buffer = {}
 
-    return history[-limit:]
+# 질문 유형별 키워드 (유형 분류 + RAG 라우터 1단계에서 공용)
+QUESTION_TYPE_KEYWORDS = {
+    "regulation": ['조항', '규정', '조례', '법률', '제', '조'],
+    "procedure": ['절차', '방법', '어떻게', '신청', '처리'],
+    "schedule": ['일정', '기간', '언제', '시간'],
+    "contact": ['담당자', '연락처', '부서', '누구'],
+}
 
 
 # 질문 유형 분류 함수
 def classify_question_type(question: str) -> str:
     """질문 유형을 분류하여 맞춤형 평가 기준 적용"""
     question_lower = question.lower()
-    
-    if any(keyword in question_lower for keyword in ['조항', '규정', '조례', '법률', '제', '조']):
-        return "regulation"
-    elif any(keyword in question_lower for keyword in ['절차', '방법', '어떻게', '신청', '처리']):
-        return "procedure"
-    elif any(keyword in question_lower for keyword in ['일정', '기간', '언제', '시간']):
-        return "schedule"
-    elif any(keyword in question_lower for keyword in ['담당자', '연락처', '부서', '누구']):
-        return "contact"
-    else:
-        return "general"
+
+    for question_type, keywords in QUESTION_TYPE_KEYWORDS.items():
+        if any(keyword in question_lower for keyword in keywords):
+            return question_type
+    return "general"
+
+
+# RAG 사용 여부 라우터 (키워드 → 임베딩 centroid → LLM)
+question_router = TieredQuestionRouter(
+    embeddings=embeddings,
+    llm=llm_fast,
+    keyword_vocab=QUESTION_TYPE_KEYWORDS,
+    centroid_margin=ROUTER_CENTROID_MARGIN
+)
 
 # 개선된 답변 품질 평가 함수
 def judge_answer_improved(state: AgentState) -> AgentState:
@@ -191,7 +253,7 @@ def judge_answer_improved(state: AgentState) -> AgentState:
     logger.info("🟢 judge_answer_improved 시작")
     logger.info("📊 judge_answer_improved 실행")
     """구체적인 평가 기준으로 답변 품질을 평가"""
-    context = "\n---\n".join(state.get("contexts", []))
+    context = render_contexts(state.get("contexts", []))
     question = state['question']
     answer = state['answer']
     question_type = classify_question_type(question)
@@ -285,12 +347,8 @@ def reformulate_question_improved(state: AgentState) -> AgentState:
     improvement_direction = state.get('evaluation_details', '더 구체적인 정보가 필요합니다.')
     question_type = state.get('question_type', 'general')
     
-    # 사용 가능한 Context 키워드 추출
-    context_keywords = []
-    for context in contexts:
-        if '[' in context and ']' in context:
-            keyword = context.split('[')[1].split(']')[0]
-            context_keywords.append(keyword)
+    # 사용 가능한 Context 키워드 (조항 계층/제목)
+    context_keywords = [context.label() for context in contexts if not context.is_notice]
     
     # 질문 유형별 재작성 가이드
     if question_type == "regulation":
@@ -357,421 +415,407 @@ def decide_to_reflect_improved(state: AgentState) -> str:
         return "summarize"  # 점수 높으면 바로 종료
     if state.get("rewrite_count", 0) >= 1:
         return "summarize"  # 이미 한 번 재작성 했으면 그만
+    if state.get("retrieval_mode") == "hybrid" and is_keyword_query(state.get("question")):
+        return "summarize"  # 키워드 질의는 희소 벡터로 이미 정확 매칭 → 재작성 생략
     elapsed = time.time() - start
     logger.info(f"🟢 decide_to_reflect_improved 완료 - ⏱️ {elapsed:.2f}초")
     return "rewrite"  # 그 외에만 재작성
 
+def resolve_search_collections(user_department_id, doc_filter) -> List[str]:
+    """검색 대상 컬렉션 결정 (doc_filter가 있으면 해당 문서가 저장된 컬렉션만)"""
+    collections_to_search = []
 
-def search_documents_with_rerank(state: AgentState) -> AgentState:
-    import re
-    import collections
-    start = time.time()
-    logger.info("● search_documents_with_rerank 시작")
+    if doc_filter:
+        # 프로세스 로컬 인덱스 조회 (core_docs 버전이 바뀐 경우에만 DB 재조회)
+        collections_to_search.extend(doc_index.collections_for(doc_filter))
+    else:
+        if user_department_id:
+            collections_to_search.append(f"rag_{user_department_id}")
+        collections_to_search.append("rag_common")
 
-    query = state.get("rewritten_question") or state["question"]
-    user_department_id = state.get("user_department_id")
-    query_vec = embeddings.embed_query(query)
+    return list(dict.fromkeys(collections_to_search))  # 순서 유지 중복 제거
+
+
+
+_collection_features = {}  # {컬렉션명: (희소 벡터 지원 여부, MRL 차원, 확인 시각)}
+_collection_features_lock = threading.Lock()
 
-    doc_filter = state.get("doc_filter")
 
-    # ✅ 조건에 따라 컬렉션 + 필터 설정
+def _get_collection_features(collection_name: str):
+    """컬렉션의 희소 벡터 / MRL named vector 설정 (SPARSE_SUPPORT_TTL 동안 캐시)"""
+    now = time.time()
+    with _collection_features_lock:
+        cached = _collection_features.get(collection_name)
+    if cached and now - cached[2] < SPARSE_SUPPORT_TTL:
+        return cached[0], cached[1]
+    try:
+        info = client.get_collection(collection_name)
+        sparse_vectors = info.config.params.sparse_vectors or {}
+        features = (SPARSE_VECTOR_NAME in sparse_vectors, collection_mrl_dim(info))
+    except Exception as e:
+        logger.warning(f"⚠️ 컬렉션 정보 조회 실패: {collection_name} | 이유: {e}")
+        features = (False, 0)
+    with _collection_features_lock:
+        _collection_features[collection_name] = (*features, now)
+    return features
+
+
+def collection_supports_sparse(collection_name: str) -> bool:
+    """컬렉션에 희소 벡터가 설정되어 있는지"""
+    return _get_collection_features(collection_name)[0]
+
+
+def collection_search_mrl_dim(collection_name: str) -> int:
+    """2단계(MRL) 검색에 쓸 축소 차원 (RAG_MRL_DIM 미설정 또는 컬렉션에 없으면 0)"""
+    return _get_collection_features(collection_name)[1] if mrl_enabled() else 0
+
+
+def _dense_prefetch(collection_name: str, query_vec: List[float], query_filter, limit: int) -> Prefetch:
+    """dense 후보 검색 단계 (MRL 컬렉션이면 축소 벡터로 후보 확장 → 전체 벡터로 재정렬)"""
+    mrl_dim = collection_search_mrl_dim(collection_name)
+    if not mrl_dim:
+        return Prefetch(query=query_vec, filter=query_filter, limit=limit, params=search_params())
+    return Prefetch(
+        prefetch=[Prefetch(
+            query=truncate_vector(query_vec, mrl_dim),
+            using=MRL_VECTOR_NAME,
+            filter=query_filter,
+            limit=int(limit * MRL_OVERSAMPLING),
+            params=search_params()
+        )],
+        query=query_vec,
+        limit=limit
+    )
+
+
+def _search_collection(collection_name: str, query_vec: List[float], query_filter=None, sparse_query=None,
+                       deadline: float = None):
+    """deadline: time.monotonic() 기준 검색 마감 시각 (검색 풀에서 대기한 시간만큼 서버 측 timeout을 줄임)"""
+    remaining = SEARCH_TIMEOUT if deadline is None else deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(f"검색 풀 대기 중 마감 시각 초과 ({SEARCH_TIMEOUT}초)")
+    timeout = max(1, math.ceil(remaining))
+    if sparse_query is not None and collection_supports_sparse(collection_name):
+        logger.info(f"📁 하이브리드 검색: {collection_name} | 필터: {query_filter is not None}")
+        indices, values = sparse_query
+        response = search_client.query_points(
+            collection_name=collection_name,
+            prefetch=[
+                _dense_prefetch(collection_name, query_vec, query_filter, HYBRID_PREFETCH_LIMIT),
+                Prefetch(
+                    query=SparseVector(indices=indices, values=values),
+                    using=SPARSE_VECTOR_NAME,
+                    filter=query_filter,
+                    limit=HYBRID_PREFETCH_LIMIT
+                ),
+            ],
+            query=FusionQuery(fusion=Fusion.RRF),
+            limit=SEARCH_LIMIT,
+            with_payload=True,
+            timeout=timeout
+        )
+        return response.points
+
+    if collection_search_mrl_dim(collection_name):
+        logger.info(f"📁 2단계(MRL) 검색: {collection_name} | 필터: {query_filter is not None}")
+        stage = _dense_prefetch(collection_name, query_vec, query_filter, SEARCH_LIMIT)
+        response = search_client.query_points(
+            collection_name=collection_name,
+            prefetch=stage.prefetch,
+            query=query_vec,
+            limit=SEARCH_LIMIT,
+            with_payload=True,
+            timeout=timeout
+        )
+        return response.points
+
+    logger.info(f"📁 검색: {collection_name} | 필터: {query_filter is not None}")
+    return search_client.search(
+        collection_name=collection_name,
+        query_vector=query_vec,
+        query_filter=query_filter,
+        search_params=search_params(),
+        limit=SEARCH_LIMIT,
+        with_payload=True,
+        timeout=timeout
+    )
+
+
+def search_collections_parallel(collections_to_search: List[str], query_vec: List[float], query_filter=None,
+                                sparse_query=None):
+    """
+    여러 컬렉션을 검색 풀에서 동시에 검색
+    - 전체 지연 시간은 컬렉션별 지연의 합이 아닌 최댓값
+    - SEARCH_TIMEOUT 안에 끝나지 않거나 실패한 컬렉션은 제외하고 나머지 결과만 사용 (부분 결과 정책)
+    - sparse_query (indices, values)가 주어지면 희소 벡터를 지원하는 컬렉션은 dense+sparse RRF 검색
+    Returns:
+        (검색 결과 리스트, 제외된 컬렉션 리스트)
+    """
+    if not collections_to_search:
+        return [], []
+
+    deadline = time.monotonic() + SEARCH_TIMEOUT
+    futures = [
+        (col, search_executor.submit(_search_collection, col, query_vec, query_filter, sparse_query, deadline))
+        for col in collections_to_search
+    ]
+    wait([future for _, future in futures], timeout=SEARCH_TIMEOUT)
+
     combined_results = []
+    skipped_collections = []
+    # 컬렉션 순서대로 결과를 합쳐 문서 후보 순서를 일정하게 유지
+    for col, future in futures:
+        if not future.done():
+            future.cancel()  # 시작 전이면 취소, 실행 중이면 search_client 타임아웃으로 끝남
+            skipped_collections.append(col)
+            logger.warning(f"⏱️ Qdrant 검색 타임아웃 - 컬렉션: {col} ({SEARCH_TIMEOUT}초 초과, 결과 제외)")
+            continue
+        try:
+            result = future.result()
+        except Exception as e:
+            skipped_collections.append(col)
+            logger.warning(f"⚠️ Qdrant 검색 실패 - 컬렉션: {col} | 이유: {e}")
+            continue
+        for r in result:
+            logger.info(f"📌 검색된 청크: {r.payload.get('metadata', {}).get('original_file_name')} / "
+                        f"{r.payload.get('metadata', {}).get('hierarchy_path')}")
+        combined_results.extend(result)
 
-    # ✅ 항상 부서 + 공통 컬렉션 순회 (필터 여부는 내부에서 분기)
-    collections_to_search = []
-    if user_department_id:
-        collections_to_search.append(f"rag_{user_department_id}")
-    collections_to_search.append("rag_common")
+    if skipped_collections:
+        logger.warning(f"📉 부분 결과로 진행 - 제외된 컬렉션: {skipped_collections}")
+    return combined_results, skipped_collections
 
-    # 컬렉션 대상 결정
-    collections_to_search = []
+
+def retrieve_candidates(query: str, user_department_id, doc_filter):
+    """
+    질의 임베딩 + 대상 컬렉션 결정 + 병렬 검색 (리랭크 이전 단계)
+    Returns:
+        (검색 결과 RetrievedChunk 리스트, 제외된 컬렉션 리스트, retrieval_mode)
+    """
+    query_vec = embeddings.embed_query(query)
+    collections_to_search = resolve_search_collections(user_department_id, doc_filter)
 
     if doc_filter:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT DISTINCT original_file_name, department_id, common_doc
-                FROM core_docs
-                WHERE original_file_name = ANY(%s)
-                """,
-                (doc_filter,)
-            )
-            for row in cursor.fetchall():
-                if row["common_doc"]:
-                    collections_to_search.append("rag_common")
-                elif row["department_id"] is not None:
-                    collections_to_search.append(f"rag_{row['department_id']}")
+        logger.info(f"📎 필터 대상 파일명 목록: {doc_filter}")
+        # metadata.original_file_name keyword 인덱스를 타는 정확 일치 (파일 중 하나라도 일치)
+        query_filter = Filter(
+            must=[
+                FieldCondition(
+                    key="metadata.original_file_name",
+                    match=MatchAny(any=list(doc_filter))
+                )
+            ]
+        )
     else:
-        if user_department_id:
-            collections_to_search.append(f"rag_{user_department_id}")
-        collections_to_search.append("rag_common")
+        query_filter = None
 
-    collections_to_search = list(set(collections_to_search))  # 중복 제거
+    # shared 레이아웃: 논리 파티션들을 tenant 필터로 묶어 단일 컬렉션 1회 검색
+    if is_shared_layout():
+        query_filter = with_tenant_filter(query_filter, collections_to_search)
+        collections_to_search = [SHARED_COLLECTION]
 
-    # Qdrant 검색
-    combined_results = []
+    sparse_query = encode_query(query) if HYBRID_SEARCH else None
+    if sparse_query is not None and not sparse_query[0]:
+        sparse_query = None
+    retrieval_mode = "hybrid" if sparse_query is not None and all(
+        collection_supports_sparse(col) for col in collections_to_search
+    ) else "dense"
 
-    for col in collections_to_search:
-        try:
-            if doc_filter:
-                logger.info(f"📎 필터 대상 파일명 목록: {doc_filter}")
-                logger.info(f"📎 컬렉션: {col}")
-                query_filter = Filter(
-                    must=[
-                        FieldCondition(
-                            key="metadata.original_file_name",
-                            # match=MatchValue(value=filename)
-                            match=MatchText(text=filename)  # 변경
-                        ) for filename in doc_filter
-                    ]
-                )
-            else:
-                query_filter = None
-
-            logger.info(f"📁 검색: {col} | 필터: {doc_filter}")
-            result = client.search(
-                collection_name=col,
-                query_vector=query_vec,
-                query_filter=query_filter,
-                limit=10,
-                with_payload=True
-            )
-            for r in result:
-                logger.info(f"📌 검색된 청크: {r.payload.get('metadata', {}).get('original_file_name')} / "
-                            f"{r.payload.get('metadata', {}).get('hierarchy_path')}")
-            combined_results.extend(result)
+    # Qdrant 병렬 검색 (느린 컬렉션은 타임아웃 후 제외)
+    combined_results, skipped_collections = search_collections_parallel(
+        collections_to_search, query_vec, query_filter, sparse_query
+    )
+    return [RetrievedChunk.from_point(r) for r in combined_results], skipped_collections, retrieval_mode
 
-        except Exception as e:
-            logger.warning(f"⚠️ Qdrant 검색 실패 - 컬렉션: {col} | 이유: {e}")
 
+def search_documents_with_rerank(state: AgentState) -> AgentState:
+    start = time.time()
+    logger.info("● search_documents_with_rerank 시작")
 
-            logger.info(f"📁 정확 검색 - 컬렉션: {col} | 필터: {doc_filter}")
-            result = client.search(
-                collection_name=col,
-                query_vector=query_vec,
-                query_filter=query_filter,
-                limit=10,
-                with_payload=True
-            )
-            combined_results.extend(result)
+    query = state.get("rewritten_question") or state["question"]
+    user_department_id = state.get("user_department_id")
+    doc_filter = state.get("doc_filter")
 
+    # decide 단계에서 미리 시작한 검색이 있으면 재사용 (재작성된 질문은 새로 검색, 한 번 쓰면 state에서 제거)
+    speculation = state.get("speculation")
+    state = {**state, "speculation": None}
+    if speculation is not None and not state.get("rewritten_question"):
+        try:
+            combined_results, skipped_collections, retrieval_mode = speculation.result()
+            logger.info("⚡ 선행(speculative) 검색 결과 재사용")
         except Exception as e:
-            logger.warning(f"⚠️ 컬렉션 '{col}' 검색 중 오류: {e}")
-
-
-
-
-    # if not combined_results:
-    #     return {**state, "contexts": []}
-        if not combined_results:
-            return {**state, "contexts": []}
-
-        # response = llm_smart.invoke(doc_prompt).content.strip()
-        # logger.warning(f"📤 GPT rerank 응답: {response}")
-
-        # selected_idxs = [int(x.strip()) for x in re.findall(r'\d+', response)]
-        # valid_idxs = [i for i in selected_idxs if 1 <= i <= len(document_candidates)]
-
-        # if not valid_idxs:
-        #     logger.warning(f"⚠️ GPT rerank가 문서 선택 안 함 → selected_idxs = {selected_idxs}")
-        #     logger.warning(f"📉 검색된 문서 수: {len(document_candidates)} / 검색된 청크 수: {len(combined_results)}")
-        #     fallback_contexts = []
-        #     combined_top = sorted(combined_results, key=lambda x: x.score, reverse=True)[:3]
-        #     for r in combined_top:
-        #         meta = r.payload.get("metadata", {})
-        #         title = meta.get("title", "무제")
-        #         text = r.payload.get("text", "")
-        #         file_name = meta.get("original_file_name", "unknown")
-        #         hierarchy_path = meta.get("hierarchy_path")
-        #         if hierarchy_path:
-        #             fallback_contexts.append(f"[{hierarchy_path} | {title}] (출처: {file_name})\n{text}")
-        #         else:
-        #             fallback_contexts.append(f"[{title}] (출처: {file_name})\n{text}")
-        #     return {**state, "contexts": fallback_contexts}
-
-        # contexts = []
-        # for idx in valid_idxs:
-        #     chunk = document_candidates[idx - 1]
-        #     meta = chunk["metadata"]
-        #     title = meta.get("title", "무제")
-        #     text = chunk["text"]
-        #     file_name = meta.get("original_file_name", "unknown")
-        #     hierarchy_path = meta.get("hierarchy_path")
-        #     if hierarchy_path:
-        #         contexts.append(f"[{hierarchy_path} | {title}] (출처: {file_name})\n{text}")
-        #     else:
-        #         contexts.append(f"[{title}] (출처: {file_name})\n{text}")
-
-        # return {**state, "contexts": contexts}
-
-
-
-    # 환경 설정: 문서 별 무료
-    docs_map = collections.defaultdict(list)
+            logger.warning(f"⚠️ 선행 검색 실패, 다시 검색: {e}")
+            speculation = None
+    else:
+        speculation = None
+    if speculation is None:
+        combined_results, skipped_collections, retrieval_mode = retrieve_candidates(
+            query, user_department_id, doc_filter
+        )
+
+    if not combined_results:
+        return {**state, "contexts": [], "skipped_collections": skipped_collections, "retrieval_mode": retrieval_mode}
+
+    # 문서(파일)별로 청크 묶기
+    docs_map = defaultdict(list)
     for r in combined_results:
-        file_name = r.payload.get("metadata", {}).get("original_file_name") or r.payload.get("metadata", {}).get("file_name") or "unknown"
-        docs_map[file_name].append(r)
+        docs_map[r.file_name].append(r)
 
-    # 문서 단위로 representative chunk를 2~3개로 발체
+    # 문서마다 대표 청크 최대 3개로 리랭크 후보 구성
     document_candidates = []
     for i, (file_name, results) in enumerate(docs_map.items(), 1):
         chunks_text = ""
-        for j, r in enumerate(results[:3], 1):
-            meta = r.payload.get("metadata", {})
-            title = meta.get("title", f"chunk {j}")
-            chunk = r.payload.get("text", "")
-            hierarchy_path = meta.get("hierarchy_path")
-            if hierarchy_path:
-                chunks_text += f"- {hierarchy_path} | {title}: {chunk[:200]}...\n"
+        for r in results[:3]:
+            if r.hierarchy_path:
+                chunks_text += f"- {r.hierarchy_path} | {r.title}: {r.text[:200]}...\n"
             else:
-                chunks_text += f"- {title}: {chunk[:200]}...\n"
+                chunks_text += f"- {r.title}: {r.text[:200]}...\n"
         document_candidates.append((i, file_name, chunks_text.strip(), results))
 
-    doc_prompt = f"""
-    아래는 사용자의 질문에 관련될 수 있는 여러 문서입니다.
-    각 문서는 대표 청크 일부를 요약한 것이며, 관련된 문서를 고르세요.
-
-    질문:
-    {query}
-
-    문서 후보:
-    """
-    for idx, file_name, chunks, _ in document_candidates:
-        doc_prompt += f"\n문서 {idx} ({file_name}):\n{chunks}\n"
-
-    doc_prompt += """
-    가장 관련 있는 문서 번호를 1개 또는 2개 선택하세요.
-    문서 번호만 쉼표로 구분해 출력하세요. (예: 1 또는 1,2)
-    다른 텍스트는 출력하지 마세요.
-    """
-
-    response = llm_smart.invoke(doc_prompt).content.strip()
-    logger.warning(f"📤 GPT rerank 응답: {response}")
-
-    selected_idxs = [int(x.strip()) for x in re.findall(r'\d+', response)]
-    valid_idxs = [i for i in selected_idxs if 1 <= i <= len(document_candidates)]
+    # 문서 선택 (기본: 로컬 hybrid BM25 리랭커, RAG_RERANKER=llm 설정 시 LLM 리랭커)
+    valid_idxs = reranker.select(query, document_candidates)
 
     if not valid_idxs:
-        logger.warning(f"⚠️ GPT rerank가 문서 선택 안 함 → selected_idxs = {selected_idxs}")
+        logger.warning(f"⚠️ {reranker.name} rerank가 문서 선택 안 함")
         logger.warning(f"📉 검색된 문서 수: {len(document_candidates)} / 검색된 청크 수: {len(combined_results)}")
-        # return {**state, "contexts": []}  # fallback 제거
         return {
             **state,
-            "contexts": ["[안내] 선택한 문서에서 관련 정보를 찾지 못했습니다."]
+            "contexts": [RetrievedChunk.notice(FALLBACK_NOTICE_CONTEXT)],
+            "skipped_collections": skipped_collections,
+            "retrieval_mode": retrieval_mode
         }
 
-
-    # if not valid_idxs:
-    #     logger.warning(f"⚠️ GPT rerank가 문서 선택 안 함 → selected_idxs = {selected_idxs}")
-    #     logger.warning(f"📉 검색된 문서 수: {len(document_candidates)} / 검색된 청크 수: {len(combined_results)}")
-    #     fallback_contexts = []
-    #     combined_top = sorted(combined_results, key=lambda x: x.score, reverse=True)[:3]
-    #     for r in combined_top:
-    #         meta = r.payload.get("metadata", {})
-    #         title = meta.get("title", "무제")
-    #         text = r.payload.get("text", "")
-    #         file_name = meta.get("original_file_name", "unknown")
-    #         hierarchy_path = meta.get("hierarchy_path")
-    #         if hierarchy_path:
-    #             fallback_contexts.append(f"[{hierarchy_path} | {title}] (출처: {file_name})\n{text}")
-    #         else:
-    #             fallback_contexts.append(f"[{title}] (출처: {file_name})\n{text}")
-    #     return {**state, "contexts": fallback_contexts}
-
-    contexts = []
+    # 선택된 문서의 상위 청크를 조항 단위로 합치고(겹친 구간/머리말 제거) 토큰 예산 안에서 context 구성
+    chunks = []
     for idx in valid_idxs:
         _, file_name, _, results = document_candidates[idx - 1]
-        for r in results[:3]:
-            meta = r.payload.get("metadata", {})
-            title = meta.get("title", "무제")
-            text = r.payload.get("text", "")
-            hierarchy_path = meta.get("hierarchy_path")
-            if hierarchy_path:
-                last_level = hierarchy_path.split('>')[-1].strip()
-                if last_level == title:
-                    contexts.append(f"[{hierarchy_path}] (출처: {file_name})\n{text}")
-                else:
-                    contexts.append(f"[{hierarchy_path} | {title}] (출처: {file_name})\n{text}")
-            else:
-                contexts.append(f"[{title}] (출처: {file_name})\n{text}")
+        chunks.extend(results[:CONTEXT_CHUNKS_PER_DOC])
+    contexts, context_report = context_packer.pack(chunks)
+    logger.info(f"🧩 context 조립: 청크 {context_report['chunks']}개 → {context_report['sections']}개 | "
+                f"토큰 {context_report['raw_tokens']} → {context_report['packed_tokens']} "
+                f"(절감 {context_report['saved_tokens']}, 예산 초과 제외 청크 {context_report['dropped_chunks']}개)")
 
     elapsed = time.time() - start
     logger.info(f"● search_documents_with_rerank 완료 - ⏱ {elapsed:.2f}초")
-    return {**state, "contexts": contexts}
-
-    # response = llm_smart.invoke(doc_prompt).content.strip()
-    # selected_idxs = [int(x.strip()) for x in re.findall(r'\d+', response)]
-
-    # logger.warning(f"⚠️ GPT rerank가 문서 선택 안 함 → selected_idxs = {selected_idxs}")
-    # logger.warning(f"📉 검색된 문서 수: {len(document_candidates)} / 검색된 청크 수: {len(combined_results)}")
-
-    # contexts = []
-    # for idx in selected_idxs:
-    #     if 1 <= idx <= len(document_candidates):
-    #         _, file_name, _, results = document_candidates[idx - 1]
-    #         for r in results[:3]:
-    #             meta = r.payload.get("metadata", {})
-    #             title = meta.get("title", "무제")
-    #             text = r.payload.get("text", "")
-    #             hierarchy_path = meta.get("hierarchy_path")
-    #             if hierarchy_path:
-    #                 last_level = hierarchy_path.split('>')[-1].strip()
-    #                 if last_level == title:
-    #                     contexts.append(f"[{hierarchy_path}] (출처: {file_name})\n{text}")
-    #                 else:
-    #                     contexts.append(f"[{hierarchy_path} | {title}] (출처: {file_name})\n{text}")
-    #             else:
-    #                 contexts.append(f"[{title}] (출처: {file_name})\n{text}")
-
-    # elapsed = time.time() - start
-    # logger.info(f"\u25cf search_documents_with_rerank 완료 - \u231a {elapsed:.2f}초")
-    # return {**state, "contexts": contexts}
-
-
-# 세션 요약 함수 (PostgreSQL 버전)
+    return {**state, "contexts": contexts, "context_report": context_report,
+            "skipped_collections": skipped_collections, "retrieval_mode": retrieval_mode}
+
+
+# 세션 요약 (백그라운드 작업으로 예약만 하고 즉시 반환)
+session_summarizer = SessionSummarizer(
+    llm=llm_fast,
+    connection_factory=get_db_connection,
+    every_n_turns=SUMMARY_EVERY_N_TURNS,
+    max_workers=SUMMARY_MAX_WORKERS
+)
+
+
 def summarize_session(state: AgentState) -> AgentState:
-    start = time.time()
-    logger.info("🟢 summarize_session 시작")
-    logger.info("📝 summarize_session 실행")
-    """단일 연결에서 모든 작업 처리"""
+    """
+    세션 요약 작업 예약
+    세션별 대기 작업은 1개로 병합되고, N턴마다 이전 요약 + 새 턴으로 증분 갱신
+    응답의 summary는 마지막으로 완료된 요약 (이번 턴 요약은 백그라운드에서 DB에 직접 기록)
+    """
     session_id = state.get("session_id")
     if not session_id:
         return state
-    
-    # 하나의 연결에서 모든 작업 처리
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # 메시지 조회
-        cursor.execute("""
-            SELECT message_text, message_type
-            FROM core_chatmessage
-            WHERE session_id = %s
-            ORDER BY create_time ASC
-        """, (session_id,))
-        
-        messages = cursor.fetchall()
-        
-        # 히스토리 처리
-        history = []
-        buffer = {}
-        for row in messages:
-            text, mtype = row['message_text'], row['message_type']
-            if mtype == "user":
-                buffer["user"] = text
-            elif mtype == "bot":
-                buffer["bot"] = text
-            if "user" in buffer and "bot" in buffer:
-                history.append(f"Q: {buffer['user']}\nA: {buffer['bot']}")
-                buffer = {}
-        
-        combined = "\n".join(history[-10:])
-        
-        # LLM으로 요약 생성
-        messages_for_llm = [
-            SystemMessage(content="당신은 기업 내부 상담용 챗봇입니다. 다음 대화 내용은 한 사용자의 상담 기록입니다. 핵심 질문과 답변이 무엇이었는지 중심으로 20글자 내로 요약해 주세요."),
-            HumanMessage(content=f"대화 내용:\n{combined}\n\n요약:")
-        ]
-        
-        summary = llm_fast.invoke(messages_for_llm).content.strip()
-        
-        # 같은 연결에서 요약 업데이트
-        cursor.execute(
-            "UPDATE core_chatsession SET summary = %s WHERE session_id = %s",
-            (summary, session_id)
-        )
-    elapsed = time.time() - start
-    logger.info(f"🟢 summarize_session 완료 - ⏱️ {elapsed:.2f}초")
-    return {**state, "summary": summary}
+    if session_summarizer.record_turn(session_id):
+        logger.info(f"📝 세션 요약 예약: {session_id}")
+    summary = session_summarizer.last_summary(session_id)
+    return {**state, "summary": summary} if summary else state
 
 # 기존 함수들 (필터링으로 변경)
 def decide_use_rag(state: AgentState) -> AgentState:
-    return state
+    """
+    RAG 사용 여부 판단
+    SPECULATIVE_RETRIEVAL 설정 시 판단과 동시에 임베딩/컬렉션 검색을 시작하고,
+    skip_rag로 판단되면 결과를 버리고 use_rag면 search 노드에서 재사용
+    (Future는 state에 실려 그래프 실행과 함께 사라짐, 질의 임베딩은 라우터 centroid 단계와 한 번만 계산)
+    """
+    if not SPECULATIVE_RETRIEVAL:
+        return state
 
+    speculation = speculation_executor.submit(
+        retrieve_candidates, state["question"], state.get("user_department_id"), state.get("doc_filter")
+    )
+    try:
+        route = get_use_rag_condition(state)
+    except Exception:
+        speculation.cancel()
+        raise
 
-def get_use_rag_condition(state: AgentState) -> str:
-    question = state["question"]
-    start = time.time()
-    logger.info("🟢 get_use_rag_condition 시작")
-    logger.info("🔥 get_use_rag_condition() 함수 호출됨!")
+    if route != "use_rag":
+        speculation.cancel()  # 이미 실행 중이면 결과만 버려짐
+        return {**state, "route": route}
 
-    prompt = f"""
-너는 사용자의 질문이 '회사 내부 문서 검색이 필요한 질문'인지 판단하는 심사관이야.
+    return {**state, "route": route, "speculation": speculation}
 
-다음의 기준에 따라 판단해:
-- 회사 정책, 규정, 메뉴얼, 제출 기한, 휴가 제도, 신청 절차, 업무 처리 방식 등과 관련된 질문이면 "use_rag"
-- 일반적인 잡담, 일상 대화, 개인적인 감정 또는 널리 알려진 상식 기반 질문이면 "skip_rag"
 
-질문: "{question}"
+def route_after_decide(state: AgentState) -> str:
+    """decide 노드에서 이미 판단했으면 그 결과를 사용"""
+    return state.get("route") or get_use_rag_condition(state)
 
-반드시 딱 하나의 단어만 출력해: "use_rag" 또는 "skip_rag".
-다른 말은 절대 하지 마.
-"""
 
-    result = llm_fast.invoke(prompt).content.strip().lower()
-    # ✅ 로그 찍기
-    logger.info(f"[RAG 판단] 질문: {question}")
-    logger.info(f"[RAG 판단] LLM 응답: {result}")
-    logger.info(f"[RAG 판단] 결과: {'✅ use_rag' if 'use_rag' in result else '❌ skip_rag'}")
+def get_use_rag_condition(state: AgentState) -> str:
+    question = state["question"]
+    start = time.time()
+    logger.info("🟢 get_use_rag_condition 시작")
+
+    # 키워드 → 임베딩 centroid → LLM 순으로 판단 (LLM은 확신도가 낮을 때만 호출)
+    result = question_router.route(question)
+    logger.info(f"[RAG 판단] 결과: {'✅ use_rag' if result == 'use_rag' else '❌ skip_rag'}")
     elapsed = time.time() - start
     logger.info(f"🟢 get_use_rag_condition 완료 - ⏱️ {elapsed:.2f}초")
-    return "use_rag" if "use_rag" in result else "skip_rag"
+    return result
 
 
 
-def generate_answer(state: AgentState) -> AgentState:
-    start = time.time()
-    logger.info("🟢 generate_answer 시작")
-    logger.info("💬 generate_answer 실행")
-    # context = "\n---\n".join(state.get("contexts", []))
-    # question = state.get("rewritten_question") or state["question"]
-    # full_history = state.get("chat_history", [])
-    # recent_history = full_history[-WINDOW_SIZE:]
-    # history_text = "\n".join(recent_history)
-    context_list = state.get("contexts", [])
-    context = "\n---\n".join(context_list)
-    question = state.get("rewritten_question") or state["question"]
-    full_history = state.get("chat_history", [])
-    recent_history = full_history[-WINDOW_SIZE:]
-    history_text = "\n".join(recent_history)
+FALLBACK_NOTICE_CONTEXT = "[안내] 선택한 문서에서 관련 정보를 찾지 못했습니다."
+FALLBACK_NOTICE_ANSWER = (
+    "선택하신 문서에는 질문과 관련된 정보가 없습니다.\n"
+    "📌 다른 문서를 선택하거나, 더 관련성 높은 문서를 추가로 선택해 주세요."
+)
 
-    # ✅ 안내 context만 있는 경우 fallback 안내 리턴
-    if (
-        len(context_list) == 1 and 
-        "[안내] 선택한 문서에서 관련 정보를 찾지 못했습니다." in context_list[0]
-    ):
-        answer_text = (
-            "선택하신 문서에는 질문과 관련된 정보가 없습니다.\n"
-            "📌 다른 문서를 선택하거나, 더 관련성 높은 문서를 추가로 선택해 주세요."
-        )
-        updated_history = full_history + [f"Q: {question}\nA: {answer_text}"]
-        elapsed = time.time() - start
-        logger.info(f"🟢 generate_answer (fallback 안내) 완료 - ⏱️ {elapsed:.2f}초")
-        return {**state, "answer": answer_text, "chat_history": updated_history}
 
-    
-    # 출처 정보: 파일명별로 (hierarchy_path, title) 튜플을 set으로 집계 (완전 중복 제거)
+def is_fallback_notice(context_list: List[RetrievedChunk]) -> bool:
+    """안내 context만 있는 경우 (선택 문서에 관련 정보 없음)"""
+    return len(context_list) == 1 and context_list[0].is_notice
+
+
+def extract_references(context_list: List[RetrievedChunk]) -> dict:
+    """출처 정보: 파일명별로 (hierarchy_path, title) 튜플을 set으로 집계 (완전 중복 제거)"""
     ref_map = {}  # {file_name: set((hierarchy_path, title))}
-    # for c in state.get("contexts", []):
     for c in context_list:
-        if c.startswith("["):
-            first_line = c.split("\n")[0]
-            if "(출처: " in first_line:
-                file_name = first_line.split("(출처: ")[-1].split(")")[0].strip()
-                left = first_line.split("]")[0].strip("[")
-                # hierarchy_path와 title 분리
-                if "|" in left:
-                    hierarchy_path, title = left.split("|", 1)
-                    hierarchy_path = hierarchy_path.strip()
-                    title = title.strip()
+        if not c.is_notice:
+            ref_map.setdefault(c.file_name, set()).add(c.reference_key())
+    return ref_map
+
+
+def format_references(ref_map: dict) -> str:
+    """참고 문서 표시 (파일명별로 계층+제목 리스트, 완전 중복 제거)"""
+    ref_lines = []
+    for file_name, hier_set in ref_map.items():
+        ref_lines.append(f"📄 참고 문서: {file_name}")
+        for hierarchy_path, title in sorted(hier_set, key=lambda x: (x[0], x[1])):
+            # hierarchy_path의 마지막 계층이 title과 같으면 title만 표기
+            if hierarchy_path:
+                # 마지막 계층 추출 (맨 뒤 > 기준으로 분리, 없으면 전체)
+                last_level = hierarchy_path.split('>')[-1].strip()
+                if last_level == title:
+                    ref_lines.append(f" - {title}")
                 else:
-                    hierarchy_path = ""
-                    title = left.strip()
-                ref_map.setdefault(file_name, set()).add((hierarchy_path, title))
+                    ref_lines.append(f" - {hierarchy_path} | {title}")
+            else:
+                ref_lines.append(f" - {title}")
+    return "\n".join(ref_lines)
+
 
-    # 답변 프롬프트(출처 정보 없음)
-    prompt = f"""
+def build_answer_prompt(state: AgentState) -> str:
+    """답변 프롬프트(출처 정보 없음)"""
+    context = render_contexts(state.get("contexts", []))
+    question = state.get("rewritten_question") or state["question"]
+    history_text = "\n".join(state.get("chat_history", [])[-WINDOW_SIZE:])
+    return f"""
 지금까지의 대화 기록:
 {history_text}
 
@@ -787,54 +831,158 @@ Context:
 정확하고 친절한 답변:
 """
 
-    # response = llm_smart.invoke(prompt)
-    response = llm_smart.invoke(prompt)
+
+def build_direct_prompt(state: AgentState) -> str:
+    history_text = "\n".join(state.get("chat_history", [])[-WINDOW_SIZE:])
+    return f"""
+지금까지의 대화 내용:
+{history_text}
+
+Question: {state["question"]}
+
+Answer:"""
+
+
+def generate_answer(state: AgentState) -> AgentState:
+    start = time.time()
+    logger.info("🟢 generate_answer 시작")
+    logger.info("💬 generate_answer 실행")
+    context_list = state.get("contexts", [])
+    question = state.get("rewritten_question") or state["question"]
+    full_history = state.get("chat_history", [])
+
+    # ✅ 안내 context만 있는 경우 fallback 안내 리턴
+    if is_fallback_notice(context_list):
+        answer_text = FALLBACK_NOTICE_ANSWER
+        updated_history = full_history + [f"Q: {question}\nA: {answer_text}"]
+        elapsed = time.time() - start
+        logger.info(f"🟢 generate_answer (fallback 안내) 완료 - ⏱️ {elapsed:.2f}초")
+        return {**state, "answer": answer_text, "chat_history": updated_history}
+
+    response = llm_smart.invoke(build_answer_prompt(state))
     answer_text = response.content.strip()
 
-    # 참고 문서 표시 추가 (파일명별로 계층+제목 리스트, 완전 중복 제거)
-    if ref_map:
-        ref_lines = []
-        for file_name, hier_set in ref_map.items():
-            ref_lines.append(f"📄 참고 문서: {file_name}")
-            for hierarchy_path, title in sorted(hier_set, key=lambda x: (x[0], x[1])):
-                # hierarchy_path의 마지막 계층이 title과 같으면 title만 표기
-                if hierarchy_path:
-                    # 마지막 계층 추출 (맨 뒤 > 기준으로 분리, 없으면 전체)
-                    last_level = hierarchy_path.split('>')[-1].strip()
-                    if last_level == title:
-                        ref_lines.append(f" - {title}")
-                    else:
-                        ref_lines.append(f" - {hierarchy_path} | {title}")
-                else:
-                    ref_lines.append(f" - {title}")
-        answer_text += "\n\n" + "\n".join(ref_lines)
+    references = format_references(extract_references(context_list))
+    if references:
+        answer_text += "\n\n" + references
 
     updated_history = full_history + [f"Q: {question}\nA: {answer_text}"]
     elapsed = time.time() - start
     logger.info(f"🟢 generate_answer 완료 - ⏱️ {elapsed:.2f}초")
 
-    return {**state, "answer": answer_text, "chat_history": updated_history}
-
-
+    return {**state, "answer": answer_text, "chat_history": updated_history, "references": references}
 
 
 def direct_answer(state: AgentState) -> AgentState:
     question = state["question"]
-    history_text = "\n".join(state.get("chat_history", [])[-WINDOW_SIZE:])
-    
-    prompt = f"""
-지금까지의 대화 내용:
-{history_text}
-
-Question: {question}
-
-Answer:"""
-    
-    response = llm_fast.invoke(prompt)
+    response = llm_fast.invoke(build_direct_prompt(state))
     updated_history = state.get("chat_history", []) + [f"Q: {question}\nA: {response.content}"]
     
     return {**state, "answer": response.content, "chat_history": updated_history}
 
+
+def _stream_llm(llm, prompt: str):
+    """LLM 토큰을 ("token", 조각)으로 전달하고 전체 텍스트를 반환"""
+    chunks = []
+    for chunk in llm.stream(prompt):
+        if chunk.content:
+            chunks.append(chunk.content)
+            yield "token", chunk.content
+    return "".join(chunks)
+
+
+def stream_answer(state: AgentState):
+    """
+    스트리밍 응답용 실행 경로: decide → (search) → 답변 토큰 스트리밍
+    ("token", 텍스트 조각)을 순서대로 생성하고 마지막에 ("final", 상태)를 생성
+    judge / summarize는 스트림 종료 후 finalize_streamed_answer()에서 실행
+    (이미 전송된 답변은 되돌릴 수 없으므로 rewrite 루프는 적용하지 않음)
+    """
+    start = time.time()
+    state = decide_use_rag(state)
+    question = state["question"]
+
+    if route_after_decide(state) == "use_rag":
+        state = search_documents_with_rerank(state)
+        context_list = state.get("contexts", [])
+        references = ""
+        if is_fallback_notice(context_list):
+            answer_text = FALLBACK_NOTICE_ANSWER
+            yield "token", answer_text
+        else:
+            answer_text = (yield from _stream_llm(llm_smart, build_answer_prompt(state))).strip()
+            references = format_references(extract_references(context_list))
+            if references:
+                answer_text += "\n\n" + references
+        state = {**state, "references": references}
+    else:
+        answer_text = yield from _stream_llm(llm_fast, build_direct_prompt(state))
+
+    updated_history = state.get("chat_history", []) + [f"Q: {question}\nA: {answer_text}"]
+    elapsed = time.time() - start
+    logger.info(f"🟢 stream_answer 완료 - ⏱️ {elapsed:.2f}초")
+    yield "final", {**state, "answer": answer_text, "chat_history": updated_history}
+
+
+def finalize_streamed_answer(state: AgentState) -> AgentState:
+    """스트림 종료 후 답변 평가(RAG 사용 시)와 세션 요약 예약"""
+    if state.get("contexts"):
+        state = judge_answer_improved(state)
+    return summarize_session(state)
+
+# 의미 기반 답변 캐시 (graph.invoke 앞단에서 사용)
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl=ANSWER_CACHE_TTL,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES
+) if ANSWER_CACHE_ENABLED else None
+
+
+def lookup_cached_answer(state: AgentState):
+    """
+    그래프 실행 전에 같은 부서/필터의 유사 질문 답변이 있는지 확인
+    대화 히스토리가 있는 후속 질문("그럼 신청은?")은 이전 대화에 따라 답이 달라지므로 캐시를 쓰지 않음
+    Returns:
+        (캐시 적중 결과 dict 또는 None, store_cached_answer에 넘길 캐시 티켓)
+    """
+    if answer_cache is None:
+        return None, None
+    if state.get("chat_history"):
+        answer_cache.skip()
+        return None, None  # 티켓이 없으므로 store_cached_answer도 저장하지 않음
+    try:
+        query_vec = embeddings.embed_query(state["question"])  # 캐시된 벡터는 검색 노드에서도 재사용
+        collections = resolve_search_collections(state.get("user_department_id"), state.get("doc_filter"))
+        versions = get_versions(collections)
+    except Exception as e:
+        logger.warning(f"⚠️ 답변 캐시 조회 생략: {e}")
+        return None, None
+
+    ticket = {"query_vec": query_vec, "versions": versions}
+    hit = answer_cache.lookup(state.get("user_department_id"), state.get("doc_filter"), query_vec, versions)
+    return hit, ticket
+
+
+def store_cached_answer(state: AgentState, result: AgentState, ticket):
+    """RAG 검색을 거쳐 품질 기준을 통과한 답변만 캐시에 저장"""
+    if answer_cache is None or ticket is None:
+        return
+    contexts = result.get("contexts") or []
+    if not contexts or contexts[0].is_notice:
+        return  # RAG 미사용 / 안내 응답은 저장하지 않음
+    if quality_metrics.should_rewrite(result.get("evaluation_score", 0)):
+        return
+    answer_cache.store(
+        state.get("user_department_id"),
+        state.get("doc_filter"),
+        ticket["query_vec"],
+        ticket["versions"],
+        question=state["question"],
+        answer=result["answer"],
+        contexts=contexts
+    )
+
+
 # LangGraph 정의 (개선된 노드 사용)
 builder = StateGraph(AgentState)
 builder.add_node("decide", decide_use_rag)
@@ -850,7 +998,7 @@ builder.add_node("summarize", summarize_session)
 
 builder.set_entry_point("decide")
 
-builder.add_conditional_edges("decide", get_use_rag_condition, {
+builder.add_conditional_edges("decide", route_after_decide, {
     "use_rag": "search", "skip_rag": "direct_answer"
 })
 
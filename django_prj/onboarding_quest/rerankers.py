@@ -0,0 +1,164 @@
+# 문서 단위 리랭커 (검색 결과를 파일별로 묶은 후보 중 답변에 사용할 문서 선택)
+import os
+import re
+import math
+import logging
+from collections import Counter
+from typing import List, Sequence, Tuple
+
+from korean_tokenizer import tokenize
+from retrieval_types import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+RAG_RERANKER = os.getenv("RAG_RERANKER", "hybrid").lower()  # hybrid | llm
+RERANK_DENSE_WEIGHT = float(os.getenv("RERANK_DENSE_WEIGHT", "0.5"))
+RERANK_SECOND_DOC_RATIO = float(os.getenv("RERANK_SECOND_DOC_RATIO", "0.8"))
+
+# (문서 번호, 파일명, 대표 청크 요약 텍스트, 해당 파일의 검색 결과 RetrievedChunk 리스트)
+DocumentCandidate = Tuple[int, str, str, List[RetrievedChunk]]
+
+
+class BaseReranker:
+    """리랭커 인터페이스: 선택한 문서 번호(1부터 시작) 리스트를 관련도 순으로 반환"""
+
+    name = "base"
+
+    def select(self, query: str, document_candidates: Sequence[DocumentCandidate]) -> List[int]:
+        raise NotImplementedError
+
+
+class LLMReranker(BaseReranker):
+    """LLM에게 문서 후보 요약을 보여주고 관련 문서 번호를 고르게 하는 방식 (옵트인)"""
+
+    name = "llm"
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    @staticmethod
+    def build_prompt(query: str, document_candidates: Sequence[DocumentCandidate]) -> str:
+        doc_prompt = f"""
+    아래는 사용자의 질문에 관련될 수 있는 여러 문서입니다.
+    각 문서는 대표 청크 일부를 요약한 것이며, 관련된 문서를 고르세요.
+
+    질문:
+    {query}
+
+    문서 후보:
+    """
+        for idx, file_name, chunks, _ in document_candidates:
+            doc_prompt += f"\n문서 {idx} ({file_name}):\n{chunks}\n"
+
+        doc_prompt += """
+    가장 관련 있는 문서 번호를 1개 또는 2개 선택하세요.
+    문서 번호만 쉼표로 구분해 출력하세요. (예: 1 또는 1,2)
+    다른 텍스트는 출력하지 마세요.
+    """
+        return doc_prompt
+
+    def select(self, query: str, document_candidates: Sequence[DocumentCandidate]) -> List[int]:
+        response = self.llm.invoke(self.build_prompt(query, document_candidates)).content.strip()
+        logger.warning(f"📤 GPT rerank 응답: {response}")
+
+        selected_idxs = [int(x.strip()) for x in re.findall(r'\d+', response)]
+        return [i for i in selected_idxs if 1 <= i <= len(document_candidates)]
+
+
+class HybridBM25Reranker(BaseReranker):
+    """
+    LLM 호출 없이 CPU에서 동작하는 리랭커
+    - 문서(파일)별 dense 점수: Qdrant 검색 점수 중 최댓값
+    - 문서별 lexical 점수: 후보 청크 전체를 코퍼스로 한 BM25 점수 중 최댓값
+    - 두 점수를 후보 내에서 min-max 정규화 후 가중합
+    - 1위 문서는 항상 선택, 2위 문서는 1위 대비 second_doc_ratio 이상일 때만 함께 선택
+    """
+
+    name = "hybrid"
+
+    def __init__(self, dense_weight: float = 0.5, second_doc_ratio: float = 0.8,
+                 k1: float = 1.5, b: float = 0.75, chunks_per_doc: int = 3):
+        self.dense_weight = dense_weight
+        self.second_doc_ratio = second_doc_ratio
+        self.k1 = k1
+        self.b = b
+        self.chunks_per_doc = chunks_per_doc
+
+    def _bm25_scores(self, query_tokens: List[str], chunk_tokens: List[List[str]]) -> List[float]:
+        n_chunks = len(chunk_tokens)
+        if not n_chunks or not query_tokens:
+            return [0.0] * n_chunks
+        avg_len = sum(len(tokens) for tokens in chunk_tokens) / n_chunks or 1.0
+        doc_freq = Counter()
+        for tokens in chunk_tokens:
+            doc_freq.update(set(tokens))
+
+        query_terms = Counter(query_tokens)
+        scores = []
+        for tokens in chunk_tokens:
+            term_freq = Counter(tokens)
+            length_norm = self.k1 * (1 - self.b + self.b * len(tokens) / avg_len)
+            score = 0.0
+            for term, query_count in query_terms.items():
+                tf = term_freq.get(term)
+                if not tf:
+                    continue
+                idf = math.log(1 + (n_chunks - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                score += query_count * idf * tf * (self.k1 + 1) / (tf + length_norm)
+            scores.append(score)
+        return scores
+
+    @staticmethod
+    def _min_max(values: List[float]) -> List[float]:
+        if not values:
+            return []
+        low, high = min(values), max(values)
+        if high - low < 1e-9:
+            return [1.0 if high > 0 else 0.0] * len(values)
+        return [(v - low) / (high - low) for v in values]
+
+    def score_documents(self, query: str, document_candidates: Sequence[DocumentCandidate]) -> List[Tuple[int, float]]:
+        """문서 번호별 결합 점수 (내림차순)"""
+        query_tokens = tokenize(query)
+        chunk_tokens, chunk_owner = [], []
+        dense_scores = []
+        for position, (_, _, _, results) in enumerate(document_candidates):
+            top_results = sorted(results, key=lambda r: r.score, reverse=True)[:self.chunks_per_doc]
+            dense_scores.append(top_results[0].score if top_results else 0.0)
+            for r in top_results:
+                chunk_tokens.append(tokenize(r.text))
+                chunk_owner.append(position)
+
+        lexical_scores = [0.0] * len(document_candidates)
+        for owner, score in zip(chunk_owner, self._bm25_scores(query_tokens, chunk_tokens)):
+            lexical_scores[owner] = max(lexical_scores[owner], score)
+
+        dense_norm = self._min_max(dense_scores)
+        lexical_norm = self._min_max(lexical_scores)
+        combined = [
+            (candidate[0], self.dense_weight * d + (1 - self.dense_weight) * l)
+            for candidate, d, l in zip(document_candidates, dense_norm, lexical_norm)
+        ]
+        return sorted(combined, key=lambda item: item[1], reverse=True)
+
+    def select(self, query: str, document_candidates: Sequence[DocumentCandidate]) -> List[int]:
+        ranked = self.score_documents(query, document_candidates)
+        if not ranked:
+            return []
+        selected = [ranked[0][0]]
+        if len(ranked) > 1 and ranked[0][1] > 0 and ranked[1][1] >= ranked[0][1] * self.second_doc_ratio:
+            selected.append(ranked[1][0])
+        logger.info(f"📊 hybrid rerank 점수: {[(idx, round(score, 3)) for idx, score in ranked]} → 선택 {selected}")
+        return selected
+
+
+def build_reranker(mode: str = None, llm=None) -> BaseReranker:
+    """RAG_RERANKER 설정에 따라 리랭커 생성 (llm 모드는 llm 인스턴스 필요)"""
+    mode = (mode or RAG_RERANKER).lower()
+    if mode == "llm":
+        if llm is None:
+            raise ValueError("llm 리랭커에는 llm 인스턴스가 필요합니다.")
+        return LLMReranker(llm)
+    if mode != "hybrid":
+        logger.warning(f"⚠️ 알 수 없는 리랭커 모드 '{mode}' → hybrid 사용")
+    return HybridBM25Reranker(dense_weight=RERANK_DENSE_WEIGHT, second_doc_ratio=RERANK_SECOND_DOC_RATIO)
@@ -0,0 +1,69 @@
+# 검색 결과 레코드
+#
+# 검색 → 리랭크 → context 조립 → 답변/평가/답변 캐시가 같은 레코드(RetrievedChunk)를 AgentState로 주고받고,
+# "[계층 | 제목] (출처: 파일명)\n본문" 형식의 문자열은 LLM 프롬프트와 API 응답을 만들 때만 render()로 생성한다.
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+CONTEXT_SEPARATOR = "\n---\n"
+
+
+class RetrievedChunk(NamedTuple):
+    file_name: str
+    title: str
+    hierarchy_path: Optional[str]
+    text: str
+    score: float = 0.0
+    chunk_id: Optional[int] = None
+    kind: str = "chunk"  # chunk | notice (선택 문서에 관련 정보가 없다는 안내)
+
+    @classmethod
+    def from_point(cls, point) -> "RetrievedChunk":
+        """Qdrant 검색 결과(ScoredPoint) → 레코드"""
+        payload = point.payload or {}
+        meta = payload.get("metadata", {})
+        return cls(
+            file_name=meta.get("original_file_name") or meta.get("file_name") or "unknown",
+            title=meta.get("title", "무제"),
+            hierarchy_path=meta.get("hierarchy_path"),
+            text=payload.get("text", ""),
+            score=float(getattr(point, "score", 0.0) or 0.0),
+            chunk_id=meta.get("chunk_id")
+        )
+
+    @classmethod
+    def notice(cls, text: str) -> "RetrievedChunk":
+        return cls(file_name="", title="", hierarchy_path=None, text=text, kind="notice")
+
+    @property
+    def is_notice(self) -> bool:
+        return self.kind == "notice"
+
+    def label(self) -> str:
+        """헤더 [ ] 안의 표시 (마지막 계층이 제목과 같으면 계층만)"""
+        if self.hierarchy_path:
+            last_level = self.hierarchy_path.split('>')[-1].strip()
+            if last_level == self.title:
+                return self.hierarchy_path
+            return f"{self.hierarchy_path} | {self.title}"
+        return self.title
+
+    def reference_key(self) -> Tuple[str, str]:
+        """참고 문서 표시용 (계층, 제목) - 헤더에 계층만 표시되는 경우 계층 전체를 제목으로 취급"""
+        if self.hierarchy_path and self.label() != self.hierarchy_path:
+            return self.hierarchy_path, self.title
+        return "", self.label()
+
+    def render(self) -> str:
+        if self.is_notice:
+            return self.text
+        return f"[{self.label()}] (출처: {self.file_name})\n{self.text}"
+
+
+def render_contexts(chunks: Iterable[RetrievedChunk]) -> str:
+    """프롬프트에 넣을 context 텍스트"""
+    return CONTEXT_SEPARATOR.join(chunk.render() for chunk in chunks)
+
+
+def render_context_list(chunks: Iterable[RetrievedChunk]) -> List[str]:
+    """API 응답용 context 문자열 리스트"""
+    return [chunk.render() for chunk in chunks or []]
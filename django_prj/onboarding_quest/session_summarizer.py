@@ -0,0 +1,164 @@
+# 채팅 세션 요약 백그라운드 작업 (응답 경로에서 분리)
+#
+# - 세션별 대기 중인 요약 작업은 최대 1개 (실행 전까지 들어온 턴은 같은 작업에 합쳐짐)
+# - 첫 턴 이후에는 대화가 N턴 늘어났을 때만 다시 요약
+# - 이전 요약 + 마지막 요약 이후의 새 턴만 읽어 요약을 갱신 (전체 히스토리 재조회 없음)
+# - 요약은 core_chatsession에 직접 기록하고, 응답에는 마지막으로 완료된 요약(last_summary)을 실음
+import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_EVERY_N_TURNS = int(os.getenv("SUMMARY_EVERY_N_TURNS", "3"))
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "2"))
+SUMMARY_MAX_NEW_TURNS = 10  # 한 번에 반영할 최대 턴 수 (진행 상태를 모르는 세션의 첫 요약 포함)
+SUMMARY_TRACKED_SESSIONS = 10000  # 진행 상태를 기억할 최대 세션 수 (오래된 세션부터 제거)
+
+DEFAULT_SUMMARIES = {"", "새 대화", "새 채팅"}
+BOT_MESSAGE_TYPES = ("bot", "chatbot")
+
+
+class _SessionProgress:
+    __slots__ = ("turns", "last_message_id", "pending", "summarized", "summary")
+
+    def __init__(self):
+        self.turns = 0  # 마지막 요약 이후 늘어난 턴 수
+        self.last_message_id = 0  # 마지막 요약에 반영된 메시지 ID
+        self.pending = False
+        self.summarized = False
+        self.summary = None  # 마지막으로 읽거나 갱신한 요약
+
+
+class SessionSummarizer:
+    """세션 요약을 백그라운드 스레드에서 병합(coalescing)해 증분 갱신"""
+
+    def __init__(self, llm, connection_factory, every_n_turns: int = 3, max_workers: int = 2):
+        self.llm = llm
+        self.connection_factory = connection_factory  # get_db_connection (RealDictCursor 컨텍스트 매니저)
+        self.every_n_turns = max(1, every_n_turns)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session-summary")
+        self._sessions = OrderedDict()  # {session_id: _SessionProgress}
+        self._lock = threading.Lock()
+        self.counters = {"turns": 0, "scheduled": 0, "coalesced": 0, "completed": 0, "failed": 0}
+
+    def record_turn(self, session_id) -> bool:
+        """
+        답변 1턴 완료를 기록하고 필요하면 요약 작업 예약 (즉시 반환)
+        Returns:
+            요약 작업이 예약(또는 대기 중인 작업에 병합)되었는지 여부
+        """
+        if not session_id:
+            return False
+        session_id = str(session_id)
+        with self._lock:
+            progress = self._sessions.pop(session_id, None) or _SessionProgress()
+            self._sessions[session_id] = progress
+            while len(self._sessions) > SUMMARY_TRACKED_SESSIONS:
+                self._sessions.popitem(last=False)
+
+            progress.turns += 1
+            self.counters["turns"] += 1
+            if progress.pending:
+                self.counters["coalesced"] += 1
+                return True
+            if progress.summarized and progress.turns < self.every_n_turns:
+                return False
+            progress.pending = True
+            self.counters["scheduled"] += 1
+
+        self._executor.submit(self._run, session_id, progress)
+        return True
+
+    def last_summary(self, session_id) -> Optional[str]:
+        """마지막으로 완료된 요약 (이 프로세스에서 아직 요약한 적 없는 세션은 None)"""
+        with self._lock:
+            progress = self._sessions.get(str(session_id))
+            return progress.summary if progress is not None else None
+
+    def _fetch(self, cursor, session_id, last_message_id):
+        cursor.execute("SELECT summary FROM core_chatsession WHERE session_id = %s", (session_id,))
+        row = cursor.fetchone()
+        previous = (row["summary"] or "").strip() if row else ""
+
+        cursor.execute("""
+            SELECT message_id, message_text, message_type
+            FROM core_chatmessage
+            WHERE session_id = %s AND message_id > %s
+            ORDER BY message_id DESC
+            LIMIT %s
+        """, (session_id, last_message_id, SUMMARY_MAX_NEW_TURNS * 2))
+        return previous, list(reversed(cursor.fetchall()))
+
+    @staticmethod
+    def _pair_turns(messages):
+        """(Q/A 턴 리스트, 마지막으로 완성된 턴의 메시지 ID) - 답변이 아직 저장되지 않은 질문은 다음 요약으로 넘김"""
+        turns, buffer, last_paired_id = [], {}, None
+        for row in messages:
+            if row["message_type"] == "user":
+                buffer["user"] = row["message_text"]
+            elif row["message_type"] in BOT_MESSAGE_TYPES:
+                buffer["bot"] = row["message_text"]
+            if "user" in buffer and "bot" in buffer:
+                turns.append(f"Q: {buffer['user']}\nA: {buffer['bot']}")
+                buffer = {}
+                last_paired_id = row["message_id"]
+        return turns, last_paired_id
+
+    def _build_messages(self, previous: str, turns):
+        new_turns = "\n".join(turns)
+        if previous in DEFAULT_SUMMARIES:
+            return [
+                SystemMessage(content="당신은 기업 내부 상담용 챗봇입니다. 다음 대화 내용은 한 사용자의 상담 기록입니다. 핵심 질문과 답변이 무엇이었는지 중심으로 20글자 내로 요약해 주세요."),
+                HumanMessage(content=f"대화 내용:\n{new_turns}\n\n요약:")
+            ]
+        return [
+            SystemMessage(content="당신은 기업 내부 상담용 챗봇입니다. 기존 요약과 이후 새로 추가된 대화를 보고, 전체 상담의 핵심 질문과 답변이 무엇이었는지 중심으로 20글자 내로 요약을 갱신해 주세요."),
+            HumanMessage(content=f"기존 요약:\n{previous}\n\n새 대화 내용:\n{new_turns}\n\n갱신된 요약:")
+        ]
+
+    def _run(self, session_id, progress: _SessionProgress):
+        with self._lock:
+            progress.turns = 0  # 실행 중 들어오는 턴은 다음 요약 대상으로 집계
+            last_message_id = progress.last_message_id
+        try:
+            with self.connection_factory() as conn:
+                cursor = conn.cursor()
+                previous, messages = self._fetch(cursor, session_id, last_message_id)
+                turns, last_paired_id = self._pair_turns(messages)
+                summary = previous
+                if turns:
+                    summary = self.llm.invoke(self._build_messages(previous, turns)).content.strip()[:255]
+                    cursor.execute(
+                        "UPDATE core_chatsession SET summary = %s WHERE session_id = %s",
+                        (summary, session_id)
+                    )
+                    logger.info(f"📝 세션 요약 갱신 ({session_id}): {summary}")
+            with self._lock:
+                if summary not in DEFAULT_SUMMARIES:
+                    progress.summary = summary
+                if last_paired_id is not None:
+                    progress.last_message_id = last_paired_id
+                    progress.summarized = True  # 완성된 턴이 없으면 다음 턴에서 다시 시도
+                self.counters["completed"] += 1
+        except Exception as e:
+            with self._lock:
+                self.counters["failed"] += 1
+            logger.warning(f"⚠️ 세션 요약 실패 ({session_id}): {e}")
+        finally:
+            with self._lock:
+                progress.pending = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "tracked_sessions": len(self._sessions),
+                "pending": sum(1 for p in self._sessions.values() if p.pending),
+                "every_n_turns": self.every_n_turns,
+            }
@@ -0,0 +1,44 @@
+# 희소(lexical) 벡터 인코더 - Qdrant named sparse vector 용
+#
+# 어휘 사전을 따로 관리하지 않도록 토큰을 crc32 해시로 인덱스화하고,
+# 문서 쪽에는 BM25 방식의 TF 포화 가중치만 저장한다.
+# IDF는 컬렉션 단위로 Qdrant가 계산 (SparseVectorParams(modifier=Modifier.IDF)).
+import zlib
+from collections import Counter
+from typing import List, Tuple
+
+from korean_tokenizer import tokenize, ARTICLE_PATTERN
+
+SPARSE_VECTOR_NAME = "text-sparse"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+AVG_DOC_TOKENS = 200  # 768자 청크 기준 평균 토큰 수 근사값
+
+
+def _term_index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def encode_document(text: str) -> Tuple[List[int], List[float]]:
+    """문서 청크 → (indices, values), BM25 TF 포화 가중치"""
+    tokens = tokenize(text)
+    if not tokens:
+        return [], []
+    term_freq = Counter(_term_index(token) for token in tokens)
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / AVG_DOC_TOKENS)
+    indices = sorted(term_freq)
+    values = [term_freq[i] * (BM25_K1 + 1) / (term_freq[i] + length_norm) for i in indices]
+    return indices, values
+
+
+def encode_query(text: str) -> Tuple[List[int], List[float]]:
+    """질의 → (indices, values), 질의 토큰은 등장 여부만 사용"""
+    indices = sorted({_term_index(token) for token in tokenize(text)})
+    return indices, [1.0] * len(indices)
+
+
+def is_keyword_query(question: str) -> bool:
+    """조항 번호 질의(제12조)나 2단어 이하의 짧은 키워드 질의인지 판단"""
+    question = (question or "").strip()
+    return bool(ARTICLE_PATTERN.search(question)) or len(question.split()) <= 2
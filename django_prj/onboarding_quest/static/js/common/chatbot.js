@@ -677,47 +677,41 @@ class ChatBot {
 
             // const response = await fetch(`${window.API_URLS.FASTAPI_BASE_URL}/api/chat/rag`, {
             // const response = await fetch(`${window.api_base_url}/chat/rag`, {
-            const response = await fetch(`${window.api_base_url}/chat/rag`, {
-
-
+            // ✅ Django 프록시를 통해 RAG 답변을 SSE로 스트리밍 수신
+            const response = await fetch(window.chatbot_stream_url || '/common/chatbot/api/stream/', {
                 method: 'POST',
                 headers: {
-                    'Content-Type': 'application/json'
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCsrfToken()
                 },
                 body: JSON.stringify({
                     question: question,
-                    // question: htmlMessage,  // ✅ 토큰 포함된 HTML 메시지 저장
-                    html_message: htmlMessage,  // 추가
+                    html_message: htmlMessage,
                     doc_filter: tokens,
-                    session_id: sessionId ? parseInt(sessionId) : null,
-                    user_id: parseInt(user_id),
-                    department_id: parseInt(department_id)
+                    session_id: sessionId ? parseInt(sessionId) : null
                 })
-
             });
 
-            const data = await response.json();
-            if (data.success) {
-                this.selectedSessionInput.value = data.session_id;
-
-                if (this.loadingMessageElement) {
-                    await this.typeText(this.loadingMessageElement, data.answer);
-                    this.loadingMessageElement.parentElement.classList.remove('loading');
-                    this.loadingMessageElement = null;
-                }
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!response.ok || !contentType.includes('text/event-stream')) {
+                const data = await response.json().catch(() => ({}));
+                showError('오류: ' + (data.error || data.detail || '알 수 없는 오류'));
+            } else {
+                const data = await this.consumeRagStream(response);
+                if (data && data.success) {
+                    this.selectedSessionInput.value = data.session_id;
+
+                    if (data.contexts && data.contexts.length > 0 && data.messageElement) {
+                        const sourcesText = `\n\n📚 참고 문서: ${data.contexts.length}개 문서 참조`;
+                        const sourcesSpan = document.createElement('span');
+                        sourcesSpan.style.fontSize = '12px';
+                        sourcesSpan.style.color = '#666';
+                        sourcesSpan.textContent = sourcesText;
+                        data.messageElement.parentElement.appendChild(sourcesSpan);
+                    }
 
-                if (data.contexts && data.contexts.length > 0) {
-                    const sourcesText = `\n\n📚 참고 문서: ${data.contexts.length}개 문서 참조`;
-                    const sourcesSpan = document.createElement('span');
-                    sourcesSpan.style.fontSize = '12px';
-                    sourcesSpan.style.color = '#666';
-                    sourcesSpan.textContent = sourcesText;
-                    this.loadingMessageElement?.parentElement.appendChild(sourcesSpan);
+                    this.updateSessionMessagesInDOM('chatbot', data.answer);
                 }
-
-                this.updateSessionMessagesInDOM('chatbot', data.answer);
-            } else {
-                showError('오류: ' + (data.error || data.detail || '알 수 없는 오류'));
             }
         } catch (err) {
             console.error('에러 발생:', err);
@@ -738,6 +732,79 @@ class ChatBot {
         this.isSubmitting = false;
     }
 
+    // SSE 응답 읽기: token 이벤트는 바로 화면에 출력, done 이벤트의 전체 답변(참고 문서 포함)으로 마무리
+    async consumeRagStream(response) {
+        const converter = new showdown.Converter({
+            simpleLineBreaks: true,
+            tables: true
+        });
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        const element = this.loadingMessageElement;
+
+        let buffer = '';
+        let answerText = '';
+        let renderScheduled = false;
+
+        const render = (text) => {
+            if (!element) return;
+            element.parentElement.classList.remove('loading');
+            element.classList.remove('loading');
+            element.innerHTML = converter.makeHtml(text);
+            if (!this.userScrolling) {
+                this.chatArea.scrollTop = this.chatArea.scrollHeight;
+            }
+        };
+
+        const scheduleRender = () => {
+            if (renderScheduled) return;
+            renderScheduled = true;
+            requestAnimationFrame(() => {
+                renderScheduled = false;
+                render(answerText);
+            });
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let dataText = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+                });
+                if (!dataText) continue;
+                const data = JSON.parse(dataText);
+
+                if (eventName === 'token') {
+                    answerText += data.text;
+                    scheduleRender();
+                } else if (eventName === 'done') {
+                    render(data.answer);
+                    this.loadingMessageElement = null;
+                    return { ...data, messageElement: element };
+                } else if (eventName === 'error') {
+                    if (element) element.parentElement.remove();
+                    this.loadingMessageElement = null;
+                    showError('오류: ' + (data.detail || '알 수 없는 오류'));
+                    return null;
+                }
+            }
+        }
+
+        this.loadingMessageElement = null;
+        showError('응답 스트림이 중간에 종료되었습니다.');
+        return null;
+    }
+
     showLoadingAnimation() {
         const oldLoading = document.querySelector('.chatbot-msg-row.bot.loading');
         if (oldLoading) oldLoading.remove();
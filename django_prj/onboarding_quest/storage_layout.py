@@ -0,0 +1,47 @@
+# Qdrant 저장 레이아웃
+#
+# - per_department (기본): 부서별 컬렉션 rag_{부서ID} + rag_common + rag_misc
+# - shared: 모든 청크를 한 컬렉션(RAG_SHARED_COLLECTION)에 저장하고,
+#   payload "tenant"(= 기존 컬렉션명, 예: rag_3 / rag_common)로 구분해 필터 검색 1회로 처리
+#
+# 캐시 버전 키, doc_filter 인덱스 등 나머지 코드는 레이아웃과 관계없이 논리 파티션명(rag_*)을 사용한다.
+import os
+from typing import List, Optional
+
+from qdrant_client.models import Filter, FieldCondition, MatchAny
+
+STORAGE_LAYOUT = os.getenv("RAG_STORAGE_LAYOUT", "per_department").lower()  # per_department | shared
+SHARED_COLLECTION = os.getenv("RAG_SHARED_COLLECTION", "rag_shared")
+TENANT_KEY = "tenant"
+
+
+def is_shared_layout() -> bool:
+    return STORAGE_LAYOUT == "shared"
+
+
+def partition_name(department_id=None, common_doc: bool = False) -> str:
+    """문서가 속한 논리 파티션 (per_department 레이아웃의 컬렉션명과 동일)"""
+    if common_doc:
+        return "rag_common"
+    if department_id is not None:
+        return f"rag_{department_id}"
+    return "rag_misc"
+
+
+def physical_collection(partition: str) -> str:
+    """논리 파티션이 실제로 저장되는 Qdrant 컬렉션"""
+    return SHARED_COLLECTION if is_shared_layout() else partition
+
+
+def tenant_condition(partitions: List[str]) -> FieldCondition:
+    return FieldCondition(key=TENANT_KEY, match=MatchAny(any=list(dict.fromkeys(partitions))))
+
+
+def with_tenant_filter(query_filter: Optional[Filter], partitions: List[str]) -> Filter:
+    """기존 필터에 tenant 조건(파티션 중 하나) 추가"""
+    must = list(query_filter.must or []) if query_filter else []
+    return Filter(
+        must=[tenant_condition(partitions)] + must,
+        should=query_filter.should if query_filter else None,
+        must_not=query_filter.must_not if query_filter else None
+    )
@@ -0,0 +1,77 @@
+# Qdrant 벡터 메모리 절감 설정
+#
+# - 양자화 (RAG_VECTOR_QUANTIZATION=scalar|binary): 원본 float32 벡터 대신 int8(1/4) 또는 1bit(1/32) 사본을 RAM에 두고
+#   후보를 oversampling 배수만큼 더 뽑은 뒤 원본 벡터로 재채점(rescore)한다.
+# - Matryoshka 2단계 검색 (RAG_MRL_DIM=256|512): text-embedding-3 임베딩 앞부분을 잘라 정규화한
+#   named vector("mrl")로 후보를 먼저 찾고, 전체 3072차원 벡터로 다시 정렬한다.
+#   named vector는 컬렉션 생성 시에만 추가할 수 있으므로 새로 만든 컬렉션에만 적용된다 (기존 컬렉션은 1단계 검색).
+#
+# 배포 규모별 설정 선택은 benchmarks/bench_vector_compression.py 결과를 참고한다.
+import os
+from typing import List, Optional
+
+import numpy as np
+from qdrant_client.models import (
+    VectorParams, Distance, ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig, SearchParams, QuantizationSearchParams
+)
+
+VECTOR_QUANTIZATION = os.getenv("RAG_VECTOR_QUANTIZATION", "none").lower()  # none | scalar | binary
+QUANTIZATION_OVERSAMPLING = float(os.getenv("RAG_QUANTIZATION_OVERSAMPLING", "2.0"))
+QUANTIZATION_RESCORE = os.getenv("RAG_QUANTIZATION_RESCORE", "true").lower() in ("1", "true", "yes", "on")
+# 양자화 사용 시 원본 벡터를 디스크(mmap)에 두고 재채점할 때만 읽음
+FULL_VECTOR_ON_DISK = os.getenv("RAG_FULL_VECTOR_ON_DISK", "false").lower() in ("1", "true", "yes", "on")
+
+MRL_DIM = int(os.getenv("RAG_MRL_DIM", "0"))  # 0이면 사용 안 함, 256 / 512 권장
+MRL_VECTOR_NAME = "mrl"
+MRL_OVERSAMPLING = float(os.getenv("RAG_MRL_OVERSAMPLING", "4.0"))  # 1단계 후보 수 = 최종 limit × 배수
+
+
+def quantization_config(mode: str = None):
+    mode = (mode or VECTOR_QUANTIZATION).lower()
+    if mode == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def search_params(mode: str = None) -> Optional[SearchParams]:
+    """양자화 컬렉션 검색 파라미터 (양자화하지 않으면 None)"""
+    if (mode or VECTOR_QUANTIZATION).lower() not in ("scalar", "binary"):
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(
+        rescore=QUANTIZATION_RESCORE,
+        oversampling=QUANTIZATION_OVERSAMPLING
+    ))
+
+
+def mrl_enabled() -> bool:
+    return MRL_DIM > 0
+
+
+def dense_vectors_config(vector_size: int, mrl_dim: int = None):
+    """create_collection의 vectors_config (MRL 사용 시 기본 벡터 + 축소 named vector)"""
+    mrl_dim = MRL_DIM if mrl_dim is None else mrl_dim
+    full = VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=FULL_VECTOR_ON_DISK or None)
+    if mrl_dim <= 0:
+        return full
+    return {
+        "": full,
+        MRL_VECTOR_NAME: VectorParams(size=mrl_dim, distance=Distance.COSINE)
+    }
+
+
+def truncate_vector(vector, dim: int = None) -> List[float]:
+    """Matryoshka 축소: 앞 dim차원만 남기고 다시 L2 정규화"""
+    head = np.asarray(vector[:dim or MRL_DIM], dtype=np.float32)
+    norm = float(np.linalg.norm(head))
+    return (head / norm if norm > 0 else head).tolist()
+
+
+def collection_mrl_dim(collection_info) -> int:
+    """컬렉션에 설정된 MRL named vector 차원 (없으면 0)"""
+    vectors = collection_info.config.params.vectors
+    if isinstance(vectors, dict) and MRL_VECTOR_NAME in vectors:
+        return vectors[MRL_VECTOR_NAME].size
+    return 0
@@ -0,0 +1,678 @@
+# 벡터 저장소 백엔드
+#
+# - qdrant (기본): QdrantClient(url=QDRANT_URL)
+# - numpy: Qdrant 없이 프로세스 안에서 동작하는 내장 저장소 (소규모 부서 배포, 오프라인 부하 테스트용)
+#   컬렉션마다 dense 벡터는 float16 행렬 파일(mmap), payload/희소 벡터는 추가 전용 로그(points.jsonl)로
+#   RAG_VECTOR_STORE_DIR에 저장하고, NumPy 행렬 연산으로 정확(exact) 검색 또는 IVF 검색을 수행한다.
+#
+# NumpyVectorStore는 이 저장소가 사용하는 QdrantClient 메서드(create_collection, upsert, search, query_points,
+# scroll, count, delete 등)를 같은 이름/인자(qdrant_client.models)로 제공하므로 호출하는 코드는 그대로 쓴다.
+# 다른 프로세스(gunicorn 워커, Django)가 쓴 내용은 로그 파일 변경을 감지해 다시 읽는다.
+import os
+import json
+import math
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+from qdrant_client.models import (
+    Filter, FieldCondition, MatchValue, MatchAny, MatchText, MatchExcept, HasIdCondition, FilterSelector,
+    PointIdsList, SparseVector, FusionQuery, NearestQuery, Prefetch, ScoredPoint, Record, VectorParams,
+    SparseVectorParams, Distance, Modifier, CountResult, UpdateResult, UpdateStatus, CollectionStatus
+)
+
+try:
+    import fcntl  # 프로세스 간 쓰기 잠금 (Windows는 단일 프로세스 사용 가정)
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "qdrant").lower()  # qdrant | numpy
+VECTOR_STORE_DIR = os.getenv("RAG_VECTOR_STORE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "vector_data"
+)
+NUMPY_SEARCH_MODE = os.getenv("RAG_NUMPY_SEARCH", "exact").lower()  # exact | ivf
+IVF_MIN_POINTS = int(os.getenv("RAG_IVF_MIN_POINTS", "20000"))  # 이보다 작은 컬렉션은 ivf 설정이어도 정확 검색
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "8"))  # 질의당 탐색할 클러스터 수
+
+SCORE_CHUNK_ELEMENTS = 1 << 22  # 한 번에 float32로 변환해 점수를 계산할 원소 수 (임시 메모리 약 16MB)
+COMPACT_DEAD_RATIO = 0.3  # 삭제된 행 비율이 이보다 크면 파일 재작성
+IVF_REBUILD_RATIO = 0.2  # IVF 생성 이후 추가된 행 비율이 이보다 크면 재생성
+RRF_K = 60
+FILTER_CACHE_SIZE = 64
+
+_stores: Dict[str, "NumpyVectorStore"] = {}
+_stores_lock = threading.Lock()
+
+
+def build_vector_client(url: str = None, timeout: Optional[int] = None):
+    """
+    RAG_VECTOR_BACKEND에 따른 벡터 저장소 클라이언트 (numpy는 디렉터리별로 프로세스 내 1개 공유)
+    timeout: Qdrant HTTP 요청 타임아웃(초, 클라이언트 측) - numpy 백엔드는 무시
+    """
+    if VECTOR_BACKEND == "numpy":
+        with _stores_lock:
+            store = _stores.get(VECTOR_STORE_DIR)
+            if store is None:
+                store = _stores[VECTOR_STORE_DIR] = NumpyVectorStore(VECTOR_STORE_DIR)
+                logger.info(f"🗃️ 내장 벡터 저장소 사용: {VECTOR_STORE_DIR} (검색: {NUMPY_SEARCH_MODE})")
+        return store
+    return QdrantClient(url=url, timeout=timeout)
+
+
+def _completed() -> UpdateResult:
+    return UpdateResult(operation_id=0, status=UpdateStatus.COMPLETED)
+
+
+def _normalize_id(point_id):
+    return str(point_id) if isinstance(point_id, uuid.UUID) else point_id
+
+
+def _id_sort_key(point_id):
+    return (0, point_id, "") if isinstance(point_id, int) else (1, 0, str(point_id))
+
+
+def _chunk_rows(matrix) -> int:
+    return max(1, SCORE_CHUNK_ELEMENTS // max(1, matrix.shape[1]))
+
+
+def _top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+    """점수 내림차순 상위 limit개 위치"""
+    if len(scores) <= limit:
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, limit - 1)[:limit]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+# ---------------------------------------------------------------- 필터 평가
+
+def _payload_values(payload, key: str) -> list:
+    """'metadata.original_file_name' 같은 경로의 값 목록 (리스트 값은 펼침)"""
+    values = [payload]
+    for part in key.replace("[]", "").split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                item = value[part]
+                next_values.extend(item if isinstance(item, list) else [item])
+        values = next_values
+    return values
+
+
+def _check_condition(condition, point_id, payload) -> bool:
+    if isinstance(condition, Filter):
+        return _matches_filter(condition, point_id, payload)
+    if isinstance(condition, HasIdCondition):
+        return point_id in {_normalize_id(i) for i in condition.has_id}
+    if not isinstance(condition, FieldCondition):
+        raise NotImplementedError(f"내장 벡터 저장소에서 지원하지 않는 필터 조건: {type(condition).__name__}")
+
+    values = _payload_values(payload, condition.key)
+    match, value_range = condition.match, condition.range
+    if isinstance(match, MatchValue):
+        return match.value in values
+    if isinstance(match, MatchAny):
+        return any(value in match.any for value in values)
+    if isinstance(match, MatchExcept):
+        return bool(values) and all(value not in match.except_ for value in values)
+    if isinstance(match, MatchText):
+        return any(isinstance(value, str) and match.text in value for value in values)
+    if value_range is not None:
+        return any(
+            isinstance(value, (int, float))
+            and (value_range.gt is None or value > value_range.gt)
+            and (value_range.gte is None or value >= value_range.gte)
+            and (value_range.lt is None or value < value_range.lt)
+            and (value_range.lte is None or value <= value_range.lte)
+            for value in values
+        )
+    raise NotImplementedError(f"내장 벡터 저장소에서 지원하지 않는 필드 조건: {condition.key}")
+
+
+def _as_list(conditions) -> list:
+    if conditions is None:
+        return []
+    return conditions if isinstance(conditions, list) else [conditions]
+
+
+def _matches_filter(query_filter: Filter, point_id, payload) -> bool:
+    if not all(_check_condition(c, point_id, payload) for c in _as_list(query_filter.must)):
+        return False
+    should = _as_list(query_filter.should)
+    if should and not any(_check_condition(c, point_id, payload) for c in should):
+        return False
+    return not any(_check_condition(c, point_id, payload) for c in _as_list(query_filter.must_not))
+
+
+# ---------------------------------------------------------------- 컬렉션
+
+class _Snapshot:
+    """검색 중에 바뀌지 않는 컬렉션 상태 (쓰기 시 새 객체로 교체)"""
+
+    def __init__(self, ids, payloads, sparse, alive, matrices, generation):
+        self.ids = ids  # 행 → 포인트 ID
+        self.payloads = payloads  # 행 → payload
+        self.sparse = sparse  # 행 → {희소 벡터명: (indices, values)}
+        self.alive = alive  # 행 → 유효 여부 (np.bool_)
+        self.matrices = matrices  # dense 벡터명 → (행 수, 차원) float16 mmap
+        self.generation = generation
+        self.id_to_row = {point_id: row for row, point_id in enumerate(ids) if alive[row]}
+
+
+class _Collection:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.config = None
+        self.state: Optional[_Snapshot] = None
+        self._signature = None
+        self._log_offset = 0
+        self._filter_cache = {}  # (세대, 필터) → 행 마스크
+        self._scroll_order = (None, None)  # (세대, ID 순 행 목록)
+        self._inverted = {}  # 희소 벡터명 → {term: (rows, values)}
+        self._ivf = {}  # dense 벡터명 → (centroids, lists, built_rows)
+
+    # --- 파일 ---
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _dense_file(self, vector_name: str) -> str:
+        return self._file(f"dense_{vector_name or 'default'}.f16")
+
+    @contextmanager
+    def file_lock(self):
+        with open(self._file(".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stat_signature(self):
+        log = os.stat(self._file("points.jsonl"))
+        return log.st_ino, log.st_size, log.st_mtime_ns, os.stat(self._file("config.json")).st_mtime_ns
+
+    def refresh(self):
+        """다른 프로세스가 변경했으면 다시 읽음"""
+        with self.lock:
+            signature = self._stat_signature()
+            if signature != self._signature:
+                self._load(signature)
+
+    def _load(self, signature):
+        """로그 읽기 (같은 파일에 추가만 된 경우 이어서 읽음, 정리/설정 변경 시 전체 재생)"""
+        previous = self._signature
+        incremental = (
+            self.state is not None and previous is not None
+            and previous[0] == signature[0] and previous[3] == signature[3] and signature[1] >= self._log_offset
+        )
+        if incremental:
+            state = self.state
+            ids, payloads, sparse = list(state.ids), list(state.payloads), list(state.sparse)
+            alive, offset = state.alive.tolist(), self._log_offset
+        else:
+            with open(self._file("config.json"), encoding="utf-8") as f:
+                self.config = json.load(f)
+            ids, payloads, sparse, alive, offset = [], [], [], [], 0
+            self._ivf = {}  # 행 번호가 바뀌었을 수 있음
+
+        with open(self._file("points.jsonl"), "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 쓰는 중인 마지막 줄
+                offset += len(raw)
+                entry = json.loads(raw)
+                if entry["op"] == "delete":
+                    for row in entry["rows"]:
+                        alive[row] = False
+                    continue
+                ids.append(entry["id"])
+                payloads.append(entry.get("payload") or {})
+                sparse.append({name: tuple(pair) for name, pair in (entry.get("sparse") or {}).items()})
+                alive.append(True)
+
+        matrices = {name: self._open_matrix(name, params["size"], len(ids))
+                    for name, params in self.config["vectors"].items()}
+        generation = (self.state.generation + 1) if self.state else 0
+        self.state = _Snapshot(ids, payloads, sparse, np.array(alive, dtype=bool), matrices, generation)
+        self._signature, self._log_offset = signature, offset
+
+    def _open_matrix(self, vector_name: str, dim: int, rows: int):
+        if rows == 0:
+            return np.zeros((0, dim), dtype=np.float16)
+        return np.memmap(self._dense_file(vector_name), dtype=np.float16, mode="r", shape=(rows, dim))
+
+    # --- 설정 ---
+    def vector_params(self):
+        vectors = {
+            name: VectorParams(size=params["size"], distance=Distance(params["distance"]))
+            for name, params in self.config["vectors"].items()
+        }
+        return vectors[""] if list(vectors) == [""] else vectors
+
+    def sparse_params(self):
+        if not self.config["sparse"]:
+            return None
+        return {name: SparseVectorParams(modifier=Modifier(modifier) if modifier else None)
+                for name, modifier in self.config["sparse"].items()}
+
+    def save_config(self):
+        tmp_path = self._file("config.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.config, f, ensure_ascii=False)
+        os.replace(tmp_path, self._file("config.json"))
+
+    # --- 쓰기 (file_lock + refresh 후 호출) ---
+    def append(self, points):
+        state = self.state
+        rows = len(state.ids)
+        replaced_rows, duplicate_rows = [], []  # 기존 행 / 같은 배치 안에서 다시 나온 ID의 앞쪽 행
+        entries = []
+        dense_blocks = {name: [] for name in self.config["vectors"]}
+        seen = {}
+        for point in points:
+            point_id = _normalize_id(point.id)
+            if point_id in state.id_to_row:
+                replaced_rows.append(state.id_to_row[point_id])
+            if point_id in seen:
+                duplicate_rows.append(seen[point_id])
+            vector = point.vector if isinstance(point.vector, dict) else {"": point.vector}
+            sparse_entry = {}
+            for name, params in self.config["vectors"].items():
+                dense = vector.get(name)
+                block = np.zeros(params["size"], dtype=np.float32) if dense is None else np.asarray(dense, np.float32)
+                if params["distance"] == Distance.COSINE.value:
+                    norm = float(np.linalg.norm(block))
+                    block = block / norm if norm > 0 else block
+                dense_blocks[name].append(block)
+            for name in self.config["sparse"]:
+                sparse_vector = vector.get(name)
+                if sparse_vector is not None:
+                    sparse_entry[name] = [list(sparse_vector.indices), list(sparse_vector.values)]
+            seen[point_id] = rows + len(entries)
+            entries.append({"op": "upsert", "id": point_id, "payload": point.payload or {}, "sparse": sparse_entry})
+
+        # dense 행렬 먼저 기록하고 로그를 나중에 써서, 로그에 있는 행은 항상 벡터가 존재
+        for name, blocks in dense_blocks.items():
+            matrix = np.vstack(blocks).astype(np.float16)
+            with open(self._dense_file(name), "r+b") as f:
+                f.seek(rows * matrix.shape[1] * 2)
+                f.write(matrix.tobytes())
+                f.truncate()
+        lines = [json.dumps(entry, ensure_ascii=False, default=str) for entry in entries]
+        if replaced_rows:
+            lines.insert(0, json.dumps({"op": "delete", "rows": sorted(set(replaced_rows))}))
+        if duplicate_rows:
+            lines.append(json.dumps({"op": "delete", "rows": sorted(duplicate_rows)}))
+        self._append_log(lines)
+
+    def delete_rows(self, rows: List[int]):
+        if rows:
+            self._append_log([json.dumps({"op": "delete", "rows": sorted(rows)})])
+
+    def _append_log(self, lines: List[str]):
+        with open(self._file("points.jsonl"), "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+        self._load(self._stat_signature())
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        """삭제된 행이 많으면 살아있는 행만 새 파일로 다시 기록"""
+        state = self.state
+        dead = int((~state.alive).sum())
+        if dead < 1000 or dead <= len(state.alive) * COMPACT_DEAD_RATIO:
+            return
+        keep = np.flatnonzero(state.alive)
+        for name, matrix in state.matrices.items():
+            tmp_path = self._dense_file(name) + ".tmp"
+            step = _chunk_rows(matrix)
+            with open(tmp_path, "wb") as f:
+                for start in range(0, len(keep), step):
+                    f.write(np.asarray(matrix[keep[start:start + step]]).tobytes())
+            os.replace(tmp_path, self._dense_file(name))
+        tmp_path = self._file("points.jsonl.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in keep:
+                sparse_entry = {name: [list(pair[0]), list(pair[1])] for name, pair in state.sparse[row].items()}
+                f.write(json.dumps({"op": "upsert", "id": state.ids[row], "payload": state.payloads[row],
+                                    "sparse": sparse_entry}, ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp_path, self._file("points.jsonl"))
+        self._load(self._stat_signature())
+        logger.info(f"🧹 내장 벡터 저장소 정리: {os.path.basename(self.path)} (삭제 행 {dead}개 제거)")
+
+    # --- 검색 ---
+    def filter_mask(self, state: _Snapshot, query_filter: Optional[Filter]) -> np.ndarray:
+        """유효 행 중 필터를 만족하는 행 (같은 필터는 세대가 바뀔 때까지 캐시)"""
+        if query_filter is None:
+            return state.alive
+        key = (state.generation, query_filter.model_dump_json())
+        mask = self._filter_cache.get(key)
+        if mask is None:
+            mask = state.alive.copy()
+            for row in np.flatnonzero(mask):
+                mask[row] = _matches_filter(query_filter, state.ids[row], state.payloads[row])
+            with self.lock:
+                if len(self._filter_cache) >= FILTER_CACHE_SIZE:
+                    self._filter_cache.pop(next(iter(self._filter_cache)))
+                self._filter_cache[key] = mask
+        return mask
+
+    def scroll_order(self, state: _Snapshot) -> np.ndarray:
+        """유효 행을 포인트 ID 순으로 정렬한 목록 (Qdrant scroll 순서)"""
+        generation, order = self._scroll_order
+        if generation != state.generation:
+            rows = np.flatnonzero(state.alive)
+            order = np.array(sorted(rows, key=lambda row: _id_sort_key(state.ids[row])), dtype=np.int64)
+            self._scroll_order = (state.generation, order)
+        return order
+
+    def dense_scores(self, state: _Snapshot, vector_name: str, query, rows: np.ndarray) -> np.ndarray:
+        params = self.config["vectors"][vector_name or ""]
+        q = np.asarray(query, dtype=np.float32)
+        if params["distance"] == Distance.COSINE.value:
+            norm = float(np.linalg.norm(q))
+            q = q / norm if norm > 0 else q
+        matrix = state.matrices[vector_name or ""]
+        step = _chunk_rows(matrix)
+        if len(rows) * 2 >= len(matrix):
+            # 후보가 대부분이면 연속 구간으로 전체를 계산하는 편이 행 단위 인덱싱(복사)보다 빠름
+            full = np.empty(len(matrix), dtype=np.float32)
+            for start in range(0, len(matrix), step):
+                full[start:start + step] = np.asarray(matrix[start:start + step], dtype=np.float32) @ q
+            return full[rows]
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), step):
+            chunk = rows[start:start + step]
+            scores[start:start + len(chunk)] = np.asarray(matrix[chunk], dtype=np.float32) @ q
+        return scores
+
+    def sparse_scores(self, state: _Snapshot, vector_name: str, query: SparseVector, rows: np.ndarray):
+        inverted = self._inverted.get(vector_name)
+        if inverted is None or inverted[0] != state.generation:
+            postings = {}
+            for row in np.flatnonzero(state.alive):
+                pair = state.sparse[row].get(vector_name)
+                if pair:
+                    for term, value in zip(*pair):
+                        postings.setdefault(term, ([], []))
+                        postings[term][0].append(row)
+                        postings[term][1].append(value)
+            inverted = (state.generation, {
+                term: (np.array(r, dtype=np.int64), np.array(v, dtype=np.float32)) for term, (r, v) in postings.items()
+            })
+            self._inverted[vector_name] = inverted
+        use_idf = self.config["sparse"].get(vector_name) == Modifier.IDF.value
+        total = int(state.alive.sum())
+        scores = np.zeros(len(state.alive), dtype=np.float32)
+        for term, weight in zip(query.indices, query.values):
+            posting = inverted[1].get(term)
+            if posting is None:
+                continue
+            if use_idf:
+                df = len(posting[0])
+                weight *= math.log(1 + (total - df + 0.5) / (df + 0.5))
+            scores[posting[0]] += weight * posting[1]
+        rows = rows[scores[rows] > 0]  # 희소 검색은 겹치는 term이 있는 행만
+        return rows, scores[rows]
+
+    def ivf_candidates(self, state: _Snapshot, vector_name: str, query, mask: np.ndarray, limit: int):
+        """IVF 후보 행 (컬렉션이 작거나, 필터 대상이 적거나, 후보가 부족하면 None → 정확 검색)"""
+        if NUMPY_SEARCH_MODE != "ivf" or int(state.alive.sum()) < IVF_MIN_POINTS:
+            return None
+        index = self._ivf.get(vector_name)
+        rows = len(state.alive)
+        if index is None or rows - index[2] > index[2] * IVF_REBUILD_RATIO:
+            index = self._ivf[vector_name] = self._build_ivf(state, vector_name)
+        centroids, lists, built_rows = index
+        q = np.asarray(query, dtype=np.float32)
+        probe = _top_k(centroids @ q, min(IVF_NPROBE, len(centroids)))
+        candidates = np.concatenate([lists[i] for i in probe] + [np.arange(built_rows, rows)])
+        if int(mask.sum()) <= len(candidates):
+            return None  # 필터로 이미 후보가 적으면 정확 검색이 더 싸고 정확함
+        candidates = candidates[mask[candidates]]
+        return candidates if len(candidates) >= limit else None
+
+    def _build_ivf(self, state: _Snapshot, vector_name: str):
+        """k-means(몇 회 반복)로 클러스터를 만들고 행을 가장 가까운 중심에 배정"""
+        matrix = state.matrices[vector_name]
+        rows = np.flatnonzero(state.alive)
+        nlist = int(min(4096, max(16, math.sqrt(len(rows)))))
+        rng = np.random.default_rng(0)
+        sample = np.asarray(matrix[np.sort(rng.choice(rows, min(len(rows), nlist * 64), replace=False))], np.float32)
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(5):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    center = members.mean(axis=0)
+                    centroids[c] = center / (np.linalg.norm(center) or 1.0)
+        labels = np.empty(len(rows), dtype=np.int64)
+        step = _chunk_rows(matrix)
+        for start in range(0, len(rows), step):
+            chunk = rows[start:start + step]
+            labels[start:start + len(chunk)] = np.argmax(np.asarray(matrix[chunk], np.float32) @ centroids.T, axis=1)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+        lists = [rows[order[bounds[c]:bounds[c + 1]]] for c in range(nlist)]
+        logger.info(f"🧭 IVF 인덱스 생성: {os.path.basename(self.path)}.{vector_name or 'default'} "
+                    f"(행 {len(rows)}개, 클러스터 {nlist}개)")
+        return centroids, lists, len(state.alive)
+
+
+class NumpyVectorStore:
+    """QdrantClient 호환 내장 벡터 저장소 (이 저장소에서 쓰는 메서드만 구현)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, collection_name: str) -> _Collection:
+        collection_path = os.path.join(self.path, collection_name)
+        if not os.path.exists(os.path.join(collection_path, "config.json")):
+            raise ValueError(f"Collection {collection_name} not found")
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                collection = self._collections[collection_name] = _Collection(collection_path)
+        collection.refresh()
+        return collection
+
+    # --- 컬렉션 관리 ---
+    def get_collections(self):
+        names = sorted(
+            name for name in os.listdir(self.path) if os.path.exists(os.path.join(self.path, name, "config.json"))
+        )
+        return rest.CollectionsResponse(collections=[rest.CollectionDescription(name=name) for name in names])
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return os.path.exists(os.path.join(self.path, collection_name, "config.json"))
+
+    def create_collection(self, collection_name: str, vectors_config, sparse_vectors_config=None,
+                          quantization_config=None, **kwargs) -> bool:
+        if self.collection_exists(collection_name):
+            raise ValueError(f"Collection {collection_name} already exists")
+        vectors = vectors_config if isinstance(vectors_config, dict) else {"": vectors_config}
+        for params in vectors.values():
+            if params.distance not in (Distance.COSINE, Distance.DOT):
+                raise ValueError(f"내장 벡터 저장소는 Cosine/Dot 거리만 지원합니다: {params.distance}")
+        collection_path = os.path.join(self.path, collection_name)
+        os.makedirs(collection_path, exist_ok=True)
+        for name in vectors:
+            open(os.path.join(collection_path, f"dense_{name or 'default'}.f16"), "wb").close()
+        open(os.path.join(collection_path, "points.jsonl"), "w").close()
+        config = {
+            "vectors": {name: {"size": params.size, "distance": params.distance.value} for name, params in vectors.items()},
+            "sparse": {
+                name: params.modifier.value if params.modifier else None
+                for name, params in (sparse_vectors_config or {}).items()
+            },
+            "payload_schema": {},
+            "quantization": quantization_config.model_dump(mode="json") if quantization_config else None,
+        }
+        with open(os.path.join(collection_path, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False)
+        return True
+
+    def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        with self._lock:
+            self._collections.pop(collection_name, None)
+        shutil.rmtree(os.path.join(self.path, collection_name), ignore_errors=True)
+        return True
+
+    def get_collection(self, collection_name: str):
+        collection = self._collection(collection_name)
+        return SimpleNamespace(
+            status=CollectionStatus.GREEN,
+            points_count=int(collection.state.alive.sum()),
+            config=SimpleNamespace(
+                params=SimpleNamespace(vectors=collection.vector_params(), sparse_vectors=collection.sparse_params()),
+                quantization_config=collection.config.get("quantization"),
+            ),
+            payload_schema=dict(collection.config["payload_schema"]),
+        )
+
+    def update_collection(self, collection_name: str, quantization_config=None, **kwargs) -> bool:
+        """양자화 설정은 기록만 함 (float16 행렬 그대로 검색)"""
+        collection = self._collection(collection_name)
+        with collection.lock, collection.file_lock():
+            if quantization_config is not None:
+                collection.config["quantization"] = quantization_config.model_dump(mode="json")
+                collection.save_config()
+        return True
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, **kwargs):
+        """필터는 행 단위로 평가하고 결과 마스크를 캐시하므로 스키마만 기록"""
+        collection = self._collection(collection_name)
+        with collection.lock, collection.file_lock():
+            collection.config["payload_schema"][field_name] = str(getattr(field_schema, "value", field_schema))
+            collection.save_config()
+        return _completed()
+
+    # --- 포인트 ---
+    def upsert(self, collection_name: str, points, wait: bool = True, **kwargs) -> UpdateResult:
+        collection = self._collection(collection_name)
+        points = list(points)
+        if points:
+            with collection.lock, collection.file_lock():
+                collection.refresh()
+                collection.append(points)
+        return _completed()
+
+    def delete(self, collection_name: str, points_selector, wait: bool = True, **kwargs) -> UpdateResult:
+        collection = self._collection(collection_name)
+        with collection.lock, collection.file_lock():
+            collection.refresh()
+            state = collection.state
+            if isinstance(points_selector, FilterSelector):
+                points_selector = points_selector.filter
+            if isinstance(points_selector, Filter):
+                rows = np.flatnonzero(collection.filter_mask(state, points_selector)).tolist()
+            else:
+                ids = points_selector.points if isinstance(points_selector, PointIdsList) else points_selector
+                rows = [state.id_to_row[i] for i in map(_normalize_id, ids) if i in state.id_to_row]
+            collection.delete_rows(rows)
+        return _completed()
+
+    def count(self, collection_name: str, count_filter: Filter = None, exact: bool = True, **kwargs) -> CountResult:
+        collection = self._collection(collection_name)
+        return CountResult(count=int(collection.filter_mask(collection.state, count_filter).sum()))
+
+    def scroll(self, collection_name: str, scroll_filter: Filter = None, limit: int = 10, offset=None,
+               with_payload=True, with_vectors=False, **kwargs):
+        collection = self._collection(collection_name)
+        state = collection.state
+        order = collection.scroll_order(state)
+        if offset is not None:
+            offset_row = state.id_to_row.get(_normalize_id(offset))
+            start = int(np.flatnonzero(order == offset_row)[0]) if offset_row is not None else 0
+            order = order[start:]
+        rows = order[collection.filter_mask(state, scroll_filter)[order]]
+        page, rest_rows = rows[:limit], rows[limit:]
+        records = [
+            Record(
+                id=state.ids[row],
+                payload=state.payloads[row] if with_payload else None,
+                vector=self._row_vector(collection, state, row) if with_vectors else None
+            )
+            for row in page
+        ]
+        return records, (state.ids[rest_rows[0]] if len(rest_rows) else None)
+
+    def _row_vector(self, collection: _Collection, state: _Snapshot, row: int):
+        dense = {name: np.asarray(matrix[row], dtype=np.float32).tolist() for name, matrix in state.matrices.items()}
+        if list(dense) == [""] and not collection.config["sparse"]:
+            return dense[""]
+        for name, (indices, values) in state.sparse[row].items():
+            dense[name] = SparseVector(indices=list(indices), values=list(values))
+        return dense
+
+    # --- 검색 ---
+    def search(self, collection_name: str, query_vector, query_filter: Filter = None, search_params=None,
+               limit: int = 10, with_payload=True, **kwargs) -> List[ScoredPoint]:
+        return self.query_points(
+            collection_name, query=query_vector, query_filter=query_filter, limit=limit, with_payload=with_payload
+        ).points
+
+    def query_points(self, collection_name: str, query=None, prefetch=None, using: str = None,
+                     query_filter: Filter = None, search_params=None, limit: int = 10, with_payload=True,
+                     **kwargs):
+        collection = self._collection(collection_name)
+        state = collection.state
+        stage = Prefetch(prefetch=prefetch, query=query, using=using, filter=query_filter, limit=limit)
+        rows, scores = self._run_stage(collection, state, stage)
+        points = [
+            ScoredPoint(
+                id=state.ids[row], version=0, score=float(score),
+                payload=state.payloads[row] if with_payload else None
+            )
+            for row, score in zip(rows, scores)
+        ]
+        return rest.QueryResponse(points=points)
+
+    def _run_stage(self, collection: _Collection, state: _Snapshot, stage: Prefetch):
+        """Prefetch 한 단계 실행: 하위 단계 후보(없으면 전체) 중 필터를 만족하는 행을 query로 채점"""
+        limit = stage.limit or 10
+        mask = collection.filter_mask(state, stage.filter)
+        query = stage.query.nearest if isinstance(stage.query, NearestQuery) else stage.query
+        children = [self._run_stage(collection, state, child) for child in _as_list(stage.prefetch)]
+
+        if isinstance(query, FusionQuery):
+            fused = {}
+            for child_rows, _ in children:
+                for rank, row in enumerate(child_rows):
+                    fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+            rows = np.array([row for row in fused if mask[row]], dtype=np.int64)
+            scores = np.array([fused[row] for row in rows], dtype=np.float32)
+        elif children:
+            rows = np.unique(np.concatenate([child_rows for child_rows, _ in children]))
+            rows = rows[mask[rows]]
+            rows, scores = self._score(collection, state, query, stage.using, rows)
+        else:
+            rows = None
+            if not isinstance(query, SparseVector):
+                rows = collection.ivf_candidates(state, stage.using or "", query, mask, limit)
+            rows = np.flatnonzero(mask) if rows is None else rows
+            rows, scores = self._score(collection, state, query, stage.using, rows)
+
+        top = _top_k(scores, limit)
+        return rows[top], scores[top]
+
+    @staticmethod
+    def _score(collection: _Collection, state: _Snapshot, query, using: str, rows: np.ndarray):
+        if isinstance(query, SparseVector):
+            return collection.sparse_scores(state, using, query, rows)
+        return rows, collection.dense_scores(state, using or "", query, rows)
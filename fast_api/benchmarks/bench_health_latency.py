@@ -0,0 +1,86 @@
+# 이벤트 루프 블로킹 점검: RAG 요청 N개가 처리 중일 때 /health 지연 시간 비교
+#
+# 사용법 (FastAPI 서버 실행 후, fast_api 에서):
+#   python benchmarks/bench_health_latency.py --user-id 1 --department-id 1 --concurrency 4
+#   python benchmarks/bench_health_latency.py --user-id 1 --department-id 1 --stream   # /api/chat/rag/stream
+#
+# RAG 실행이 이벤트 루프를 막지 않으면 부하 중 /health 지연이 기준값과 거의 같아야 함.
+# (서버 없이 검증하는 자동 테스트: tests/test_health_latency.py, fast_api 에서 python -m pytest -q tests)
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    return f"n={len(ordered)} p50={statistics.median(ordered):.1f}ms p95={p95:.1f}ms max={ordered[-1]:.1f}ms"
+
+
+async def probe_health(client, stop_event, interval):
+    latencies = []
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        response = await client.get("/health")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def send_rag(client, args, index):
+    payload = {
+        "question": args.question,
+        "user_id": args.user_id,
+        "department_id": args.department_id,
+        "doc_filter": [],
+    }
+    start = time.perf_counter()
+    if args.stream:
+        async with client.stream("POST", "/api/chat/rag/stream", json=payload) as response:
+            async for _ in response.aiter_bytes():
+                pass
+    else:
+        response = await client.post("/api/chat/rag", json=payload)
+    elapsed = time.perf_counter() - start
+    print(f"  RAG 요청 {index}: HTTP {response.status_code} ({elapsed:.2f}초)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="RAG 부하 중 /health 지연 측정")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--department-id", type=int, required=True)
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 보낼 RAG 요청 수")
+    parser.add_argument("--question", default="연차 신청 방법 알려줘")
+    parser.add_argument("--interval", type=float, default=0.05, help="/health 호출 간격(초)")
+    parser.add_argument("--baseline-seconds", type=float, default=2.0)
+    parser.add_argument("--stream", action="store_true", help="스트리밍 엔드포인트 사용")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120) as client:
+        # 1) 기준값: 부하 없이 /health 지연
+        stop_event = asyncio.Event()
+        probe = asyncio.create_task(probe_health(client, stop_event, args.interval))
+        await asyncio.sleep(args.baseline_seconds)
+        stop_event.set()
+        baseline = await probe
+
+        # 2) RAG 요청 N개 처리 중 /health 지연
+        stop_event = asyncio.Event()
+        probe = asyncio.create_task(probe_health(client, stop_event, args.interval))
+        await asyncio.gather(*(send_rag(client, args, i) for i in range(1, args.concurrency + 1)))
+        stop_event.set()
+        under_load = await probe
+
+    print(f"[기준]       /health {summarize(baseline)}")
+    print(f"[RAG x{args.concurrency}] /health {summarize(under_load)}")
+    ratio = statistics.median(under_load) / statistics.median(baseline)
+    print(f"p50 배율: {ratio:.2f}x {'✅ 이벤트 루프 블로킹 없음' if ratio < 3 else '❌ 이벤트 루프 블로킹 의심'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
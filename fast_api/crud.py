@@ -1273,6 +1273,28 @@ def get_chat_messages(db: Session, session_id: int, skip: int = 0, limit: int =
         )
     ).order_by(models.ChatMessage.create_time.asc()).offset(skip).limit(limit).all()
 
+def get_recent_chat_messages(db: Session, session_id: int, limit: int = 21):
+    """채팅 세션의 최근 메시지 limit개 조회 (활성 메시지만, 오래된 것 → 최신 순)
+    (session_id, create_time DESC, message_id DESC) 인덱스로 최신 메시지부터 limit개만 읽음"""
+    messages = db.query(models.ChatMessage).filter(
+        and_(
+            models.ChatMessage.session_id == session_id,
+            models.ChatMessage.is_active == True
+        )
+    ).order_by(models.ChatMessage.create_time.desc(), models.ChatMessage.message_id.desc()).limit(limit).all()
+    return list(reversed(messages))
+
+def get_chat_message_ids_after(db: Session, session_id: int, after_id: int):
+    """채팅 세션에서 after_id 이후 저장된 활성 메시지 ID (히스토리 윈도우 동기화 확인용)"""
+    rows = db.query(models.ChatMessage.message_id).filter(
+        and_(
+            models.ChatMessage.session_id == session_id,
+            models.ChatMessage.is_active == True,
+            models.ChatMessage.message_id > after_id
+        )
+    ).all()
+    return [row.message_id for row in rows]
+
 def create_document(db: Session, department_id: int, title: str, description: str, file_path: str, common_doc: bool = False, original_file_name: str = None):
     """문서 생성"""
     from datetime import datetime
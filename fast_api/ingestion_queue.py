@@ -0,0 +1,371 @@
+# 문서 임베딩(적재) 작업 큐
+#
+# - 업로드 요청은 core_ingestionjob에 작업을 넣고 즉시 job_id 반환
+# - 작업자 스레드(INGESTION_WORKERS개)가 SELECT ... FOR UPDATE SKIP LOCKED로 작업을 하나씩 가져감
+#   (여러 gunicorn 워커/서버가 같은 테이블을 폴링해도 한 작업은 한 곳에서만 실행)
+# - 진행률(분리/임베딩/업로드 청크 수)을 DB에 기록, 실패 시 지수 백오프로 재시도
+# - heartbeat는 작업마다 별도 스레드가 INGESTION_HEARTBEAT_INTERVAL초마다 기록 (임베딩 속도 제한 대기처럼
+#   진행 보고가 없는 구간에도 유지), INGESTION_STALE_AFTER초 이상 끊긴 running 작업(프로세스 종료 등)은 다시 큐로
+# - 실행 중 갱신/완료/실패 기록은 가져갈 때의 실행 횟수(attempts)와 running 상태가 그대로일 때만 반영
+#   → 정리 후 다른 작업자가 다시 가져간 작업을 이전 작업자가 덮어쓰지 않음
+# - 실행 중 문서가 삭제되면(작업/문서 행 없음) 다음 진행 보고 또는 완료 기록에서 중단하고
+#   이 실행이 올린 청크를 cleanup으로 삭제 (업로드 배치마다 진행 보고 → 모든 업로드 뒤에 확인이 있음)
+import os
+import time
+import socket
+import logging
+import threading
+from datetime import timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import func
+
+import models
+
+logger = logging.getLogger(__name__)
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+INGESTION_POLL_INTERVAL = float(os.getenv("INGESTION_POLL_INTERVAL", "5"))  # 초, 빈 큐 폴링 주기
+INGESTION_RETRY_BACKOFF = float(os.getenv("INGESTION_RETRY_BACKOFF", "30"))  # 초, 재시도 대기 = 값 × 2^(실행 횟수-1)
+INGESTION_STALE_AFTER = float(os.getenv("INGESTION_STALE_AFTER", "600"))  # 초
+INGESTION_HEARTBEAT_INTERVAL = float(os.getenv("INGESTION_HEARTBEAT_INTERVAL", "30"))  # 초, STALE_AFTER보다 충분히 짧게
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+PROGRESS_FIELDS = {"parsed": "chunks_parsed", "embedded": "chunks_embedded", "upserted": "chunks_upserted"}
+ERROR_MAX_LENGTH = 2000
+
+
+class IngestionCancelled(Exception):
+    """진행 보고 기록 실패 - 작업이 삭제되었거나 다시 큐에 들어가 다른 실행으로 넘어감"""
+
+
+def job_to_dict(job: models.IngestionJob) -> dict:
+    return {
+        "job_id": job.job_id,
+        "docs_id": job.docs_id,
+        "original_file_name": job.original_file_name,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "chunks_parsed": job.chunks_parsed,
+        "chunks_embedded": job.chunks_embedded,
+        "chunks_upserted": job.chunks_upserted,
+        "error": job.error,
+        "create_time": job.create_time,
+        "start_time": job.start_time,
+        "end_time": job.end_time,
+        "next_attempt_time": job.available_time if job.status == "queued" else None,
+    }
+
+
+class IngestionQueue:
+    """DB 기반 적재 작업 큐 + 고정 크기 작업자 스레드 풀"""
+
+    def __init__(self, session_factory, handler: Callable, workers: int = 2, max_attempts: int = 3,
+                 poll_interval: float = 5, retry_backoff: float = 30, stale_after: float = 600,
+                 heartbeat_interval: float = 30,
+                 document_key: Callable[[Optional[int]], Optional[str]] = lambda docs_id: None,
+                 cleanup: Optional[Callable] = None):
+        """
+        Args:
+            session_factory: SQLAlchemy SessionLocal
+            handler: handler(file_path, department_id, common_doc, original_file_name, progress, doc_key) → 적재 결과 (로그용)
+            document_key: docs_id → handler의 doc_key (문서마다 고유한 값, 재시도는 같은 키라 이미 올린 청크를 건너뜀)
+            cleanup: cleanup(file_path, department_id, common_doc, doc_key) - 실행 중 문서가 삭제된 작업의 청크 삭제
+        """
+        self.session_factory = session_factory
+        self.handler = handler
+        self.document_key = document_key
+        self.cleanup = cleanup
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.stale_after = stale_after
+        self.heartbeat_interval = min(heartbeat_interval, stale_after / 3)
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._last_stale_check = 0.0
+        self.counters = {
+            "enqueued": 0, "started": 0, "succeeded": 0, "retried": 0, "failed": 0, "requeued_stale": 0, "lost": 0,
+            "cancelled": 0
+        }
+
+    # ---------- 요청 경로 ----------
+
+    def enqueue(self, db, file_path: str, docs_id: Optional[int] = None, department_id: Optional[int] = None,
+                common_doc: bool = False, original_file_name: Optional[str] = None) -> models.IngestionJob:
+        job = models.IngestionJob(
+            docs_id=docs_id,
+            file_path=file_path,
+            original_file_name=original_file_name,
+            department_id=department_id,
+            common_doc=common_doc,
+            status="queued",
+            max_attempts=self.max_attempts,
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        with self._lock:
+            self.counters["enqueued"] += 1
+        self._wakeup.set()
+        logger.info(f"📥 적재 작업 등록: #{job.job_id} {original_file_name or file_path}")
+        return job
+
+    def retry(self, db, job_id: int) -> Optional[models.IngestionJob]:
+        """실패한 작업을 다시 큐에 넣음 (실행 횟수 초기화)"""
+        job = db.query(models.IngestionJob).filter(models.IngestionJob.job_id == job_id).with_for_update().first()
+        if job is None or job.status != "failed":
+            db.rollback()
+            return job
+        job.status = "queued"
+        job.attempts = 0
+        job.available_time = func.now()
+        job.end_time = None
+        db.commit()
+        db.refresh(job)
+        self._wakeup.set()
+        return job
+
+    # ---------- 작업자 ----------
+
+    def start(self):
+        """작업자 스레드 시작 (프로세스당 한 번)"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop, args=(f"{self.worker_prefix}:{i}",),
+                    name=f"ingestion-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"🏭 적재 작업자 {self.workers}개 시작 ({self.worker_prefix})")
+
+    def stop(self, timeout: float = 10):
+        self._stopping.set()
+        self._wakeup.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def _worker_loop(self, worker_id: str):
+        while not self._stopping.is_set():
+            try:
+                self._requeue_stale()
+                job = self._claim(worker_id)
+            except Exception as e:
+                logger.warning(f"⚠️ 적재 작업 조회 실패: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job, worker_id)
+
+    def _claim(self, worker_id: str) -> Optional[dict]:
+        """대기 중인 작업 하나를 running으로 바꾸고 실행에 필요한 값을 반환 (다른 작업자가 잠근 행은 건너뜀)"""
+        db = self.session_factory()
+        try:
+            job = (
+                db.query(models.IngestionJob)
+                .filter(models.IngestionJob.status == "queued", models.IngestionJob.available_time <= func.now())
+                .order_by(models.IngestionJob.available_time, models.IngestionJob.job_id)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+            if job is None:
+                db.rollback()
+                return None
+            job.status = "running"
+            job.attempts += 1
+            job.worker_id = worker_id
+            job.chunks_parsed = job.chunks_embedded = job.chunks_upserted = 0
+            job.start_time = job.heartbeat_time = func.now()
+            claimed = {
+                "job_id": job.job_id,
+                "docs_id": job.docs_id,
+                "file_path": job.file_path,
+                "department_id": job.department_id,
+                "common_doc": bool(job.common_doc),
+                "original_file_name": job.original_file_name,
+                "attempts": job.attempts,
+                "max_attempts": job.max_attempts,
+            }
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def _requeue_stale(self):
+        """heartbeat가 끊긴 running 작업 정리 (남은 횟수가 있으면 재큐, 없으면 실패) - poll_interval마다 한 번"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_stale_check < self.poll_interval:
+                return
+            self._last_stale_check = now
+        cutoff = func.now() - timedelta(seconds=self.stale_after)
+        db = self.session_factory()
+        try:
+            stale = models.IngestionJob.status == "running", models.IngestionJob.heartbeat_time < cutoff
+            failed = db.query(models.IngestionJob).filter(
+                *stale, models.IngestionJob.attempts >= models.IngestionJob.max_attempts
+            ).update({
+                "status": "failed", "error": "작업자 응답 없음 (프로세스 종료 추정)", "end_time": func.now()
+            }, synchronize_session=False)
+            requeued = db.query(models.IngestionJob).filter(*stale).update({
+                "status": "queued", "error": "작업자 응답 없음 (프로세스 종료 추정)", "available_time": func.now()
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if failed or requeued:
+            with self._lock:
+                self.counters["requeued_stale"] += requeued
+            logger.warning(f"⚠️ 중단된 적재 작업 정리: 재시도 {requeued}건, 실패 {failed}건")
+
+    def _update(self, job: dict, values: dict) -> bool:
+        """
+        실행 중인 작업 행 갱신 - 이 작업자가 가져간 실행(running + 같은 attempts)일 때만
+        (문서 삭제로 작업이 사라졌거나 stale 정리 후 다시 큐로/다른 작업자에게 넘어갔으면 False)
+        """
+        db = self.session_factory()
+        try:
+            updated = db.query(models.IngestionJob).filter(
+                models.IngestionJob.job_id == job["job_id"],
+                models.IngestionJob.status == "running",
+                models.IngestionJob.attempts == job["attempts"]
+            ).update(values, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def _run(self, job: dict, worker_id: str):
+        job_id = job["job_id"]
+        with self._lock:
+            self.counters["started"] += 1
+        logger.info(f"🏗️ 적재 작업 시작: #{job_id} (시도 {job['attempts']}/{job['max_attempts']}, {worker_id})")
+
+        def progress(**counts):
+            values = {PROGRESS_FIELDS[stage]: count for stage, count in counts.items()}
+            values["heartbeat_time"] = func.now()
+            if not self._update(job, values):
+                raise IngestionCancelled()  # 남은 임베딩/업로드 배치 중단
+
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop, args=(job, stop_heartbeat), name=f"ingestion-heartbeat-{job_id}", daemon=True
+        )
+        heartbeat.start()
+        try:
+            result = self.handler(
+                job["file_path"],
+                department_id=job["department_id"],
+                common_doc=job["common_doc"],
+                original_file_name=job["original_file_name"],
+                progress=progress,  # 재시도 시 이전 시도에서 업로드된 청크는 같은 ID라 건너뜀
+                doc_key=self.document_key(job["docs_id"])
+            )
+        except IngestionCancelled:
+            self._stopped(job)
+            return
+        except Exception as e:
+            self._fail(job, e)
+            return
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+        if self._update(job, {"status": "succeeded", "end_time": func.now(), "error": None}):
+            with self._lock:
+                self.counters["succeeded"] += 1
+            logger.info(f"✅ 적재 작업 완료: #{job_id} → {result}")
+        else:
+            self._stopped(job)
+
+    def _heartbeat_loop(self, job: dict, stop: threading.Event):
+        """handler 실행 동안 진행 보고와 무관하게 heartbeat 기록"""
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                if not self._update(job, {"heartbeat_time": func.now()}):
+                    return  # 작업이 삭제되었거나 다른 실행으로 넘어감
+            except Exception as e:
+                logger.warning(f"⚠️ 적재 작업 heartbeat 기록 실패: #{job['job_id']} - {e}")
+
+    def _document_exists(self, job: dict) -> bool:
+        """작업 행과 대상 문서 행이 남아 있는지 (문서 삭제 시 작업도 함께 삭제됨)"""
+        db = self.session_factory()
+        try:
+            if db.query(models.IngestionJob.job_id).filter(models.IngestionJob.job_id == job["job_id"]).first() is None:
+                return False
+            if job["docs_id"] is None:
+                return True
+            return db.query(models.Docs.docs_id).filter(models.Docs.docs_id == job["docs_id"]).first() is not None
+        finally:
+            db.close()
+
+    def _stopped(self, job: dict):
+        """실행 중 작업 행 갱신이 거부됨 - 문서가 삭제됐으면 이 실행이 올린 청크 삭제, 아니면 다른 실행으로 넘어감"""
+        if self._document_exists(job):
+            self._lost(job)
+            return
+        if self.cleanup is not None:
+            try:
+                self.cleanup(
+                    job["file_path"], department_id=job["department_id"], common_doc=job["common_doc"],
+                    doc_key=self.document_key(job["docs_id"])
+                )
+            except Exception as e:
+                logger.error(f"❌ 삭제된 문서의 청크 정리 실패: #{job['job_id']} - {e}")
+        with self._lock:
+            self.counters["cancelled"] += 1
+        logger.warning(f"🛑 적재 작업 #{job['job_id']} 중단: 실행 중 문서가 삭제되어 업로드한 청크 정리")
+
+    def _lost(self, job: dict):
+        with self._lock:
+            self.counters["lost"] += 1
+        logger.warning(
+            f"⚠️ 적재 작업 #{job['job_id']} (시도 {job['attempts']}) 결과 기록 생략: "
+            f"다시 큐에 들어가 다른 실행으로 넘어감"
+        )
+
+    def _fail(self, job: dict, error: Exception):
+        job_id = job["job_id"]
+        message = f"{type(error).__name__}: {error}"[:ERROR_MAX_LENGTH]
+        if job["attempts"] < job["max_attempts"]:
+            delay = self.retry_backoff * (2 ** (job["attempts"] - 1))
+            if not self._update(job, {
+                "status": "queued",
+                "error": message,
+                "available_time": func.now() + timedelta(seconds=delay),
+            }):
+                self._stopped(job)
+                return
+            with self._lock:
+                self.counters["retried"] += 1
+            logger.warning(f"🔁 적재 작업 실패, {delay:.0f}초 후 재시도: #{job_id} - {message}")
+        else:
+            if not self._update(job, {"status": "failed", "error": message, "end_time": func.now()}):
+                self._stopped(job)
+                return
+            with self._lock:
+                self.counters["failed"] += 1
+            logger.error(f"❌ 적재 작업 최종 실패: #{job_id} - {message}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "workers": self.workers,
+                "running_threads": sum(1 for t in self._threads if t.is_alive()),
+                "worker_prefix": self.worker_prefix,
+            }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, Numeric, text
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, Numeric, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -213,6 +213,11 @@ class ChatMessage(Base):
     # 관계 설정
     session = relationship("ChatSession", back_populates="messages")
 
+    # 최근 히스토리 조회용 (세션별 최신 메시지부터 LIMIT)
+    __table_args__ = (
+        Index("chatmsg_session_recent_idx", "session_id", create_time.desc(), message_id.desc()),
+    )
+
 
 class Docs(Base):
     """문서 테이블"""
@@ -228,4 +233,33 @@ class Docs(Base):
     original_file_name = Column(String(255), comment="원본 파일명")
     
     # 관계 설정
-    department = relationship("Department", back_populates="docs") 
\ No newline at end of file
+    department = relationship("Department", back_populates="docs")
+
+
+class IngestionJob(Base):
+    """문서 임베딩(적재) 작업 큐 테이블"""
+    __tablename__ = "core_ingestionjob"
+
+    job_id = Column(Integer, primary_key=True, index=True, comment="작업 고유 ID")
+    docs_id = Column(Integer, ForeignKey("core_docs.docs_id", ondelete="CASCADE"), nullable=True, comment="대상 문서")
+    file_path = Column(String(500), nullable=False, comment="저장된 파일 경로")
+    original_file_name = Column(String(255), comment="원본 파일명")
+    department_id = Column(Integer, nullable=True, comment="부서 ID")
+    common_doc = Column(Boolean, default=False, comment="공용 문서 여부")
+    status = Column(String(20), nullable=False, default="queued", comment="queued/running/succeeded/failed")
+    attempts = Column(Integer, nullable=False, default=0, comment="실행 횟수")
+    max_attempts = Column(Integer, nullable=False, default=3, comment="최대 실행 횟수")
+    chunks_parsed = Column(Integer, nullable=False, default=0, comment="분리된 청크 수")
+    chunks_embedded = Column(Integer, nullable=False, default=0, comment="임베딩된 청크 수")
+    chunks_upserted = Column(Integer, nullable=False, default=0, comment="업로드된 청크 수")
+    error = Column(Text, comment="마지막 실패 사유")
+    worker_id = Column(String(100), comment="실행 중인 작업자")
+    create_time = Column(DateTime, default=func.now(), comment="생성일시")
+    available_time = Column(DateTime, default=func.now(), comment="실행 가능 시각 (재시도 대기)")
+    start_time = Column(DateTime, comment="마지막 실행 시작 시각")
+    heartbeat_time = Column(DateTime, comment="마지막 진행 보고 시각")
+    end_time = Column(DateTime, comment="완료/실패 시각")
+
+    __table_args__ = (
+        Index("ingestjob_status_available_idx", "status", "available_time"),
+    ) 
\ No newline at end of file
@@ -1,11 +1,17 @@
 import re
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, HTTPException, Depends, Form
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 import crud
 import schemas
-from database import get_db
+from database import get_db, SessionLocal
 import logging
 import time
 import sys
@@ -45,6 +51,8 @@ logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
 
 
 # RAG 시스템 전역 변수
+rag_module = None
+render_context_list = None
 graph = None
 client = None
 COLLECTION_NAME = None
@@ -52,7 +60,7 @@ RAG_AVAILABLE = False
 
 def initialize_rag_system():
     """RAG 시스템 초기화"""
-    global graph, client, COLLECTION_NAME, RAG_AVAILABLE
+    global rag_module, render_context_list, graph, client, COLLECTION_NAME, RAG_AVAILABLE
     
     # 절대 경로로 Django 프로젝트 경로 찾기
     current_file = os.path.abspath(__file__)
@@ -71,6 +79,7 @@ def initialize_rag_system():
         graph = getattr(rag_module, 'graph')
         client = getattr(rag_module, 'client')
         COLLECTION_NAME = getattr(rag_module, 'COLLECTION_NAME')
+        render_context_list = getattr(__import__('retrieval_types'), 'render_context_list')
         
         RAG_AVAILABLE = True
         logging.info("✅ RAG 시스템 초기화 성공")
@@ -82,6 +91,107 @@ def initialize_rag_system():
 # 초기화 시도
 initialize_rag_system()
 
+# RAG 전용 스레드 풀: 동기 LangGraph/LLM/Qdrant/DB 호출이 uvicorn 이벤트 루프를 막지 않도록 격리
+# (풀이 가득 차면 이후 RAG 요청은 대기열에서 기다리고, 다른 라우트는 영향을 받지 않음)
+# SSE 스트림은 별도 풀: 스트림 하나가 스레드 하나를 끝까지 사용 → 그래프 실행이 밀려도 토큰 전송이 멈추지 않음
+RAG_GRAPH_MAX_WORKERS = int(os.getenv("RAG_GRAPH_MAX_WORKERS", "4"))
+RAG_STREAM_MAX_WORKERS = int(os.getenv("RAG_STREAM_MAX_WORKERS", "8"))
+
+
+class TrackedExecutor:
+    """ThreadPoolExecutor + 대기/실행 중 작업 수 집계 (지표용)"""
+
+    def __init__(self, max_workers: int, thread_name_prefix: str):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0}
+
+    def submit(self, func, *args):
+        def task():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        def on_done(future):
+            with self._lock:
+                if future.cancelled():
+                    self._queued -= 1  # 시작 전에 취소되어 task가 실행되지 않음
+                    self.counters["cancelled"] += 1
+                elif future.exception() is not None:
+                    self.counters["failed"] += 1
+                else:
+                    self.counters["completed"] += 1
+
+        with self._lock:
+            self._queued += 1
+            self.counters["submitted"] += 1
+        future = self._executor.submit(task)
+        future.add_done_callback(on_done)
+        return future
+
+    async def run(self, func, *args):
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "max_workers": self.max_workers, "queued": self._queued, "running": self._running}
+
+
+rag_pool = TrackedExecutor(RAG_GRAPH_MAX_WORKERS, "rag-graph")
+rag_stream_pool = TrackedExecutor(RAG_STREAM_MAX_WORKERS, "rag-stream")
+
+
+async def run_in_rag_pool(func, *args):
+    """동기 함수를 RAG 전용 스레드 풀에서 실행"""
+    return await rag_pool.run(func, *args)
+
+
+async def iterate_in_stream_pool(iterator):
+    """
+    동기 제너레이터 전체를 스트림 풀의 스레드 하나에서 실행하고 항목을 asyncio.Queue로 받아 전달
+    (클라이언트 연결이 끊기면 다음 항목에서 멈추고 제너레이터를 닫음)
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def produce():
+        error = None
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+            loop.call_soon_threadsafe(queue.put_nowait, (finished, error))
+
+    future = rag_stream_pool.submit(produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        future.cancel()  # 아직 스레드를 받지 못했으면 시작하지 않음
+
 # # 로깅 설정
 # logging.basicConfig(level=logging.INFO)
 # logger = logging.getLogger(__name__)
@@ -111,6 +221,8 @@ class RagChatResponse(BaseModel):
     contexts: List[str] = []
     summary: Optional[str] = None
     used_rag: bool = False
+    cached: bool = False
+    context_tokens: Optional[dict] = None  # context 조립 토큰 수 (raw / packed / saved)
     success: bool = True
 
 
@@ -174,7 +286,12 @@ async def create_chat_message(message: schemas.ChatMessageCreate, db: Session =
     if db_session is None:
         raise HTTPException(status_code=404, detail="채팅 세션을 찾을 수 없습니다")
     
-    return crud.create_chat_message(db=db, chat_message=message)
+    db_message = crud.create_chat_message(db=db, chat_message=message)
+    if rag_module:
+        rag_module.chat_history.record_message(
+            db_message.session_id, db_message.message_id, db_message.message_type, db_message.message_text
+        )
+    return db_message
 
 
 @router.get("/message/{message_id}", response_model=schemas.ChatMessage)
@@ -204,95 +321,115 @@ async def delete_chat_message(message_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="채팅 메시지를 찾을 수 없습니다")
     
     crud.delete_chat_message(db, message_id=message_id)
+    if rag_module:
+        rag_module.chat_history.invalidate(db_message.session_id)
     return {"message": "채팅 메시지가 성공적으로 삭제되었습니다"}
 
 
+def prepare_rag_state(request: RagChatRequest, db: Session):
+    """사용자/세션 검증, 사용자 메시지 저장, 히스토리 로드 후 (session_id, 초기 상태) 반환"""
+    # 사용자 검증
+    user = crud.get_user_by_id(db, request.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="사용자를 찾을 수 없습니다.")
+    
+    # 세션 ID가 없으면 새로 생성
+    if not request.session_id:
+        session = crud.create_chat_session(db, schemas.ChatSessionCreate(
+            user_id=request.user_id,
+            summary="새 대화"
+        ))
+        session_id = session.session_id
+        logger.info(f"새 세션 생성: {session_id}")
+    else:
+        session_id = request.session_id
+        # 세션 존재 여부 확인
+        session = crud.get_chat_session(db, session_id)
+        if not session or session.user_id != request.user_id:
+            raise HTTPException(status_code=404, detail="세션을 찾을 수 없습니다.")
+    
+    # 사용자 메시지 저장
+    user_message = crud.create_chat_message(db, schemas.ChatMessageCreate(
+        session_id=session_id,
+        # message_text=request.question
+        message_text=request.html_message or request.question,
+        message_type="user"
+    ))
+    rag_module.chat_history.record_message(session_id, user_message.message_id, "user", user_message.message_text)
+    
+    # 사용자 히스토리 로드 (최근 N턴, 활성 세션은 DB에 새 메시지가 없는지 확인 후 메모리 윈도우 사용)
+    history = rag_module.chat_history.recent_turns(
+        session_id,
+        loader=lambda sid, limit: [
+            (msg.message_id, msg.message_type, msg.message_text)
+            for msg in crud.get_recent_chat_messages(db, sid, limit)
+        ],
+        id_loader=lambda sid, after_id: crud.get_chat_message_ids_after(db, sid, after_id)
+    )
+    
+    # 초기 상태 설정
+    # state = {
+    #     "question": request.question,
+    #     "chat_history": history,
+    #     "rewrite_count": 0,
+    #     "session_id": str(session_id),
+    #     "user_department_id": request.department_id
+    # }
+    state = {
+        "question": request.question,
+        "chat_history": history,
+        "rewrite_count": 0,
+        "session_id": str(session_id),
+        "user_department_id": request.department_id,
+        "doc_filter": request.doc_filter  # ✅ 추가됨
+    }
+    return session_id, state
+
+
 # RAG 기반 채팅 엔드포인트
 @router.post("/rag", response_model=RagChatResponse)
 async def chat_with_rag(request: RagChatRequest, db: Session = Depends(get_db)):
-    """RAG 기반 챗봇 응답 생성"""
+    """RAG 기반 챗봇 응답 생성 (그래프 실행은 RAG 전용 스레드 풀에서 처리)"""
     if not RAG_AVAILABLE:
         raise HTTPException(status_code=500, detail="RAG 시스템이 로드되지 않았습니다.")
-    
+
+    return await run_in_rag_pool(run_rag_chat, request, db)
+
+
+def run_rag_chat(request: RagChatRequest, db: Session) -> RagChatResponse:
+    """세션 준비 → 답변 캐시/LangGraph 실행 → 봇 메시지 저장 (동기, 이벤트 루프 밖에서 실행)"""
     try:
         logger.info(f"🚨 프론트에서 받은 doc_filter: {request.doc_filter}")
 
         start_time = time.time()
         logger.info(f"RAG 요청 수신: {request.question[:50]}...")
         
-        # 사용자 검증
-        user = crud.get_user_by_id(db, request.user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="사용자를 찾을 수 없습니다.")
-        
-        # 세션 ID가 없으면 새로 생성
-        if not request.session_id:
-            session = crud.create_chat_session(db, schemas.ChatSessionCreate(
-                user_id=request.user_id,
-                summary="새 대화"
-            ))
-            session_id = session.session_id
-            logger.info(f"새 세션 생성: {session_id}")
+        session_id, state = prepare_rag_state(request, db)
+
+        # 의미 기반 답변 캐시 확인 → 적중 시 LangGraph 생략
+        cached, cache_ticket = rag_module.lookup_cached_answer(state)
+        if cached:
+            logger.info(f"🎯 답변 캐시 사용 (유사도 {cached['similarity']:.3f}) - 질문: {request.question}")
+            result = {**state, "answer": cached["answer"], "contexts": cached["contexts"]}
         else:
-            session_id = request.session_id
-            # 세션 존재 여부 확인
-            session = crud.get_chat_session(db, session_id)
-            if not session or session.user_id != request.user_id:
-                raise HTTPException(status_code=404, detail="세션을 찾을 수 없습니다.")
-        
-        # 사용자 메시지 저장
-        crud.create_chat_message(db, schemas.ChatMessageCreate(
-            session_id=session_id,
-            # message_text=request.question
-            message_text=request.html_message or request.question,
-            message_type="user"
-        ))
-        
-        # 사용자 히스토리 로드 (최근 10개)
-        messages = crud.get_chat_messages(db, session_id, limit=10)
-        
-        history = []
-        buffer = {}
-        for msg in messages:
-            if msg.message_type == "user":
-                buffer["user"] = msg.message_text
-            elif msg.message_type == "bot":
-                buffer["bot"] = msg.message_text
-            if "user" in buffer and "bot" in buffer:
-                history.append(f"Q: {buffer['user']}\nA: {buffer['bot']}")
-                buffer = {}
-        
-        # 초기 상태 설정
-        # state = {
-        #     "question": request.question,
-        #     "chat_history": history,
-        #     "rewrite_count": 0,
-        #     "session_id": str(session_id),
-        #     "user_department_id": request.department_id
-        # }
-        state = {
-    "question": request.question,
-    "chat_history": history,
-    "rewrite_count": 0,
-    "session_id": str(session_id),
-    "user_department_id": request.department_id,
-    "doc_filter": request.doc_filter  # ✅ 추가됨
-}
-        
-        # LangGraph 실행
-        logger.info("LangGraph 실행 시작...")
-        result = graph.invoke(state)
+            # LangGraph 실행
+            logger.info("LangGraph 실행 시작...")
+            result = graph.invoke(state)
+            rag_module.store_cached_answer(state, result, cache_ticket)
         
         used_rag = bool(result.get("contexts"))
         logger.info(f"[RAG 여부] {'🧾 사용함' if used_rag else '💬 사용 안 함'} - 질문: {request.question}")
         
         # 봇 응답 저장
         answer = result["answer"]
-        crud.create_chat_message(db, schemas.ChatMessageCreate(
+        bot_message = crud.create_chat_message(db, schemas.ChatMessageCreate(
             session_id=session_id,
             message_text=answer,
             message_type="bot"
         ))
+        rag_module.chat_history.record_message(session_id, bot_message.message_id, "bot", answer)
+        if cached:
+            result = rag_module.summarize_session(result)  # 그래프를 건너뛰었으므로 세션 요약 턴을 직접 기록
         
         logger.info(f"RAG 응답 생성 완료: {answer[:50]}...")
         
@@ -303,9 +440,11 @@ async def chat_with_rag(request: RagChatRequest, db: Session = Depends(get_db)):
         return RagChatResponse(
             answer=answer,
             session_id=session_id,
-            contexts=result.get("contexts", []),
+            contexts=render_context_list(result.get("contexts", [])),
             summary=result.get("summary"),
             used_rag=used_rag,
+            cached=bool(cached),
+            context_tokens=result.get("context_report"),
             success=True
         )
         
@@ -313,6 +452,122 @@ async def chat_with_rag(request: RagChatRequest, db: Session = Depends(get_db)):
         logger.error(f"RAG 처리 중 오류: {str(e)}")
         raise HTTPException(status_code=500, detail=f"RAG 처리 중 오류 발생: {str(e)}")
 
+def format_sse(event: str, data: dict) -> str:
+    """Server-Sent Events 메시지 포맷"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def save_bot_message(session_id: int, answer: str):
+    """스트리밍 응답용 봇 메시지 저장 (요청 스코프 DB 세션은 스트림 시작 전에 닫히므로 별도 세션 사용)"""
+    db = SessionLocal()
+    try:
+        bot_message = crud.create_chat_message(db, schemas.ChatMessageCreate(
+            session_id=session_id,
+            message_text=answer,
+            message_type="bot"
+        ))
+        rag_module.chat_history.record_message(session_id, bot_message.message_id, "bot", answer)
+    finally:
+        db.close()
+
+
+# RAG 기반 채팅 스트리밍 엔드포인트 (SSE)
+@router.post("/rag/stream")
+async def chat_with_rag_stream(request: RagChatRequest, db: Session = Depends(get_db)):
+    """
+    RAG 답변 토큰을 생성되는 대로 전송
+    - event: token → {"text": 토큰}
+    - event: done  → {"session_id", "answer"(참고 문서 포함 전체 답변), "references", "contexts", "used_rag", "cached", "context_tokens"}
+    - event: error → {"detail": 오류 메시지}
+    답변 평가(judge) / 세션 요약(summarize)은 스트림 종료 후 백그라운드에서 실행
+    """
+    if not RAG_AVAILABLE:
+        raise HTTPException(status_code=500, detail="RAG 시스템이 로드되지 않았습니다.")
+
+    logger.info(f"RAG 스트리밍 요청 수신: {request.question[:50]}...")
+    session_id, state = await rag_stream_pool.run(prepare_rag_state, request, db)
+    outcome = {}  # 스트림 종료 후 작업에 넘길 결과
+
+    def event_stream():
+        start_time = time.time()
+        try:
+            cached, cache_ticket = rag_module.lookup_cached_answer(state)
+            if cached:
+                logger.info(f"🎯 답변 캐시 사용 (유사도 {cached['similarity']:.3f}) - 질문: {request.question}")
+                result = {**state, "answer": cached["answer"], "contexts": cached["contexts"]}
+                yield format_sse("token", {"text": cached["answer"]})
+            else:
+                result = None
+                for kind, payload in rag_module.stream_answer(state):
+                    if kind == "token":
+                        yield format_sse("token", {"text": payload})
+                    else:
+                        result = payload
+
+            answer = result["answer"]
+            used_rag = bool(result.get("contexts"))
+            save_bot_message(session_id, answer)
+            if cached:
+                rag_module.summarize_session(result)  # 캐시 적중은 finalize를 건너뛰므로 세션 요약 턴을 직접 기록
+            outcome.update(result=result, cached=bool(cached), cache_ticket=cache_ticket)
+
+            elapsed = time.time() - start_time
+            logger.info(f"⏱️ 스트리밍 응답 생성 시간: {elapsed:.2f}초 - 질문: {request.question}")
+            yield format_sse("done", {
+                "session_id": session_id,
+                "answer": answer,
+                "references": result.get("references", ""),
+                "contexts": render_context_list(result.get("contexts", [])),
+                "used_rag": used_rag,
+                "cached": bool(cached),
+                "context_tokens": result.get("context_report"),
+                "success": True
+            })
+        except Exception as e:
+            logger.error(f"RAG 스트리밍 처리 중 오류: {str(e)}")
+            yield format_sse("error", {"detail": f"RAG 처리 중 오류 발생: {str(e)}", "session_id": session_id})
+
+    def finalize():
+        final = rag_module.finalize_streamed_answer(outcome["result"])
+        rag_module.store_cached_answer(state, final, outcome["cache_ticket"])
+
+    async def after_stream():
+        if not outcome or outcome["cached"]:
+            return
+        try:
+            await run_in_rag_pool(finalize)
+        except Exception as e:
+            logger.error(f"스트리밍 후처리(평가/요약) 오류: {str(e)}")
+
+    return StreamingResponse(
+        iterate_in_stream_pool(event_stream()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(after_stream)
+    )
+
+
+@router.get("/rag/metrics")
+async def get_rag_metrics():
+    """RAG 캐시/성능 지표 조회 (워커 프로세스 단위)"""
+    if not RAG_AVAILABLE:
+        raise HTTPException(status_code=500, detail="RAG 시스템이 로드되지 않았습니다.")
+
+    return {
+        "pid": os.getpid(),
+        "rag_pool": rag_pool.stats(),
+        "rag_stream_pool": rag_stream_pool.stats(),
+        "embedding_cache": rag_module.embeddings.stats(),
+        "answer_cache": rag_module.answer_cache.stats() if rag_module.answer_cache else {"enabled": False},
+        "question_router": rag_module.question_router.stats(),
+        "session_summarizer": rag_module.session_summarizer.stats(),
+        "db_pool": rag_module.db_pool.stats(),
+        "doc_index": rag_module.doc_index.stats(),
+        "context_packing": rag_module.context_packer.stats(),
+        "chat_history": rag_module.chat_history.stats()
+    }
+
+
 @router.post("/session/create")
 async def create_new_session(user_id: int = Form(...), db: Session = Depends(get_db)):
     """새 채팅 세션 생성"""
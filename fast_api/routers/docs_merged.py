@@ -3,15 +3,28 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 import crud
 import schemas
-from database import get_db
+from database import get_db, SessionLocal
 import os
 import logging
 from datetime import datetime
-from embed_and_upsert import advanced_embed_and_upsert, get_existing_point_ids
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from embed_and_upsert import (
+    ingest_document, delete_document_chunks, get_existing_point_ids, chunk_embedder, document_source, docs_key
+)
+from ingestion_queue import (
+    IngestionQueue, JOB_STATUSES, job_to_dict, INGESTION_WORKERS, INGESTION_MAX_ATTEMPTS,
+    INGESTION_POLL_INTERVAL, INGESTION_RETRY_BACKOFF, INGESTION_STALE_AFTER, INGESTION_HEARTBEAT_INTERVAL
+)
+import models
+from cache_versions import bump_versions
+from doc_index import DOC_INDEX_VERSION_KEY
+from storage_layout import SHARED_COLLECTION, is_shared_layout, tenant_condition
+from vector_store import build_vector_client
+from qdrant_client.models import Filter, FieldCondition, MatchValue, MatchAny
+from sqlalchemy import func
 from fastapi.responses import FileResponse
 from auth import get_current_user
+from config import settings
+from upload_stream import UploadTooLarge, save_upload
 from models import User
 from fastapi import Request
 # 환경 변수 및 경로 설정
@@ -22,12 +35,37 @@ QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 COLLECTION_NAME = "rag_multiformat"
 
 # Qdrant 클라이언트
-client = QdrantClient(url=QDRANT_URL)
+client = build_vector_client(QDRANT_URL)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/docs", tags=["docs"])
 
+# 문서 임베딩 작업 큐 (업로드 요청은 작업 등록 후 즉시 반환, 작업자 스레드가 백그라운드로 적재)
+ingestion_queue = IngestionQueue(
+    session_factory=SessionLocal,
+    handler=ingest_document,
+    workers=INGESTION_WORKERS,
+    max_attempts=INGESTION_MAX_ATTEMPTS,
+    poll_interval=INGESTION_POLL_INTERVAL,
+    retry_backoff=INGESTION_RETRY_BACKOFF,
+    stale_after=INGESTION_STALE_AFTER,
+    heartbeat_interval=INGESTION_HEARTBEAT_INTERVAL,
+    document_key=docs_key,
+    cleanup=delete_document_chunks  # 실행 중 문서가 삭제된 작업이 올린 청크 정리
+)
+
+
+@router.on_event("startup")
+def start_ingestion_workers():
+    ingestion_queue.start()
+
+
+@router.on_event("shutdown")
+def stop_ingestion_workers():
+    ingestion_queue.stop()
+
+
 @router.post("/rag/upload")
 async def upload_document_with_rag(
     file: UploadFile = File(...),
@@ -37,7 +75,7 @@ async def upload_document_with_rag(
     common_doc: bool = Form(False),
     db: Session = Depends(get_db)
 ):
-    """문서 업로드 + DB 저장 + Qdrant 임베딩"""
+    """문서 업로드 + DB 저장 + Qdrant 임베딩 작업 등록 (임베딩 진행 상황은 /rag/jobs/{job_id})"""
     try:
         # 부서 검증
         if department_id:
@@ -45,27 +83,16 @@ async def upload_document_with_rag(
             if db_department is None:
                 raise HTTPException(status_code=404, detail="부서를 찾을 수 없습니다")
 
-        # 파일 저장
+        # 파일 저장 (청크 단위 스트리밍, 크기 제한/해시/BOM 제거를 기록하면서 처리)
         os.makedirs(UPLOAD_BASE, exist_ok=True)
-        file_ext = os.path.splitext(file.filename)[1].lower()
         unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
         save_path = os.path.join(UPLOAD_BASE, unique_filename)
-        file_content = await file.read()
-        with open(save_path, "wb") as f:
-            f.write(file_content)
-
-        logger.info(f"📄 업로드 파일 저장 완료: {save_path}")
+        try:
+            stored = await save_upload(file, save_path, max_bytes=settings.max_file_size)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
 
-        # ✅ 텍스트 파일이라면 BOM 제거 후 재저장
-        if file_ext in [".txt", ".md"]:
-            try:
-                with open(save_path, "r", encoding="utf-8-sig") as f:
-                    text = f.read()
-                with open(save_path, "w", encoding="utf-8") as f:
-                    f.write(text)
-                logger.info(f"📎 BOM 제거 및 UTF-8 재저장 완료: {save_path}")
-            except Exception as e:
-                logger.warning(f"⚠ BOM 제거 중 오류: {e}")
+        logger.info(f"📄 업로드 파일 저장 완료: {save_path} ({stored.size}바이트, sha256={stored.sha256[:12]})")
 
 
         # DB 저장
@@ -78,36 +105,95 @@ async def upload_document_with_rag(
             original_file_name=file.filename
         )
         db_docs = crud.create_docs(db=db, docs=docs_data)
+        bump_versions([DOC_INDEX_VERSION_KEY])  # doc_filter → 컬렉션 인덱스 무효화
 
-        # Qdrant 임베딩
+        # Qdrant 임베딩 (백그라운드 작업)
         # existing_ids = get_existing_point_ids()
-        chunk_count = advanced_embed_and_upsert(
-        save_path,
-        department_id=department_id,
-        common_doc=common_doc,
-        original_file_name=file.filename
+        job = ingestion_queue.enqueue(
+            db,
+            save_path,
+            docs_id=db_docs.docs_id,
+            department_id=department_id,
+            common_doc=common_doc,
+            original_file_name=file.filename
         )
 
-        logger.info(f"문서 임베딩 완료: {file.filename} -> {chunk_count} chunks")
-
         return {
             "success": True,
-            "message": "문서가 성공적으로 업로드 및 임베딩되었습니다.",
+            "message": "문서가 업로드되었습니다. 임베딩은 백그라운드에서 진행됩니다.",
             "docs": {
                 "docs_id": db_docs.docs_id,
                 "title": db_docs.title,
                 "filename": unique_filename,
                 "original_filename": file.filename,
                 "file_path": save_path,
-                "file_size": len(file_content)
+                "file_size": stored.size,
+                "sha256": stored.sha256
             },
-            "chunks_uploaded": chunk_count
+            "job_id": job.job_id,
+            "job_status": job.status
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"문서 업로드/임베딩 중 오류: {str(e)}")
         raise HTTPException(status_code=500, detail=f"문서 업로드/임베딩 중 오류: {str(e)}")
 
 
+@router.get("/rag/jobs")
+async def list_ingestion_jobs(
+    status: Optional[str] = None,
+    docs_id: Optional[int] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """임베딩 작업 목록 (최신순)"""
+    if status and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status는 {', '.join(JOB_STATUSES)} 중 하나여야 합니다")
+    query = db.query(models.IngestionJob)
+    if status:
+        query = query.filter(models.IngestionJob.status == status)
+    if docs_id is not None:
+        query = query.filter(models.IngestionJob.docs_id == docs_id)
+    jobs = query.order_by(models.IngestionJob.job_id.desc()).limit(min(max(limit, 1), 500)).all()
+    return {"success": True, "jobs": [job_to_dict(job) for job in jobs]}
+
+
+@router.get("/rag/jobs/metrics")
+async def get_ingestion_metrics(db: Session = Depends(get_db)):
+    """상태별 작업 수 + 이 프로세스 작업자/임베딩 처리량/청크 임베딩 저장소 통계"""
+    counts = dict(
+        db.query(models.IngestionJob.status, func.count(models.IngestionJob.job_id))
+        .group_by(models.IngestionJob.status).all()
+    )
+    return {
+        "pid": os.getpid(),
+        "jobs": {status: counts.get(status, 0) for status in JOB_STATUSES},
+        "workers": ingestion_queue.stats(),
+        "embedding": chunk_embedder.stats()
+    }
+
+
+@router.get("/rag/jobs/{job_id}")
+async def get_ingestion_job(job_id: int, db: Session = Depends(get_db)):
+    """임베딩 작업 진행 상황 (분리/임베딩/업로드 청크 수, 재시도, 실패 사유)"""
+    job = db.query(models.IngestionJob).filter(models.IngestionJob.job_id == job_id).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다")
+    return {"success": True, "job": job_to_dict(job)}
+
+
+@router.post("/rag/jobs/{job_id}/retry")
+async def retry_ingestion_job(job_id: int, db: Session = Depends(get_db)):
+    """실패한 임베딩 작업 재시도"""
+    job = ingestion_queue.retry(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다")
+    if job.status != "queued":
+        raise HTTPException(status_code=409, detail=f"실패한 작업만 재시도할 수 있습니다 (현재 상태: {job.status})")
+    return {"success": True, "job": job_to_dict(job)}
+
+
 from fastapi.responses import JSONResponse
 
 @router.delete("/rag/{docs_id}")
@@ -157,42 +243,63 @@ async def delete_document_with_rag(
 
         # Qdrant 청크 삭제
         try:
-            normalized_source = f"documents/{os.path.basename(db_docs.file_path)}"
+            # 적재와 같은 문서 키(docs_id) + 이전 방식(저장 파일명 기준) source, 공통 파티션은 여러 부서가 섞여 부서 조건 필수
+            sources = [document_source(db_docs.file_path, docs_key(docs_id)), document_source(db_docs.file_path)]
             filter_must = [
-                FieldCondition(key="metadata.source", match=MatchValue(value=normalized_source))
-            ]
-
-            filter_common = Filter(must=filter_must + [
-                FieldCondition(key="metadata.common_doc", match=MatchValue(value=True))
-            ])
-            filter_dept = Filter(must=filter_must + [
+                FieldCondition(key="metadata.source", match=MatchAny(any=sources)),
                 FieldCondition(key="metadata.department_id", match=MatchValue(value=int(db_docs.department_id)))
-            ])
-
-            deleted_dept = client.delete(
-                collection_name=f"rag_{db_docs.department_id}",
-                points_selector=filter_dept
-            )
-            logger.info(f"Qdrant 부서 컬렉션 삭제 완료: rag_{db_docs.department_id} -> {deleted_dept}")
-
-            deleted_common = client.delete(
-                collection_name="rag_common",
-                points_selector=filter_common
-            )
-            logger.info(f"Qdrant 공통 컬렉션 삭제 완료: rag_common -> {deleted_common}")
+            ]
 
-            rag_result = {
-                "removed_from_vector_db": True,
-                "deleted_from_department": deleted_dept.status,  # e.g. 'completed'
-                "deleted_from_common": deleted_common.status
-            }
+            partitions = [f"rag_{db_docs.department_id}", "rag_common"]
+
+            if is_shared_layout():
+                # 단일 멀티테넌트 컬렉션: 부서/공통 파티션을 tenant 필터로 한 번에 삭제
+                deleted_shared = client.delete(
+                    collection_name=SHARED_COLLECTION,
+                    points_selector=Filter(must=filter_must + [tenant_condition(partitions)])
+                )
+                logger.info(f"Qdrant 공용 컬렉션 삭제 완료: {SHARED_COLLECTION} -> {deleted_shared}")
+                bump_versions(partitions)  # 답변 캐시 무효화
+
+                rag_result = {
+                    "removed_from_vector_db": True,
+                    "deleted_from_shared": deleted_shared.status
+                }
+            else:
+                filter_common = Filter(must=filter_must + [
+                    FieldCondition(key="metadata.common_doc", match=MatchValue(value=True))
+                ])
+                filter_dept = Filter(must=filter_must)
+
+                deleted_dept = client.delete(
+                    collection_name=f"rag_{db_docs.department_id}",
+                    points_selector=filter_dept
+                )
+                logger.info(f"Qdrant 부서 컬렉션 삭제 완료: rag_{db_docs.department_id} -> {deleted_dept}")
+
+                deleted_common = client.delete(
+                    collection_name="rag_common",
+                    points_selector=filter_common
+                )
+                logger.info(f"Qdrant 공통 컬렉션 삭제 완료: rag_common -> {deleted_common}")
+                bump_versions(partitions)  # 답변 캐시 무효화
+
+                rag_result = {
+                    "removed_from_vector_db": True,
+                    "deleted_from_department": deleted_dept.status,  # e.g. 'completed'
+                    "deleted_from_common": deleted_common.status
+                }
         except Exception as e:
             logger.exception("Qdrant 삭제 중 오류")
             rag_result = {"removed_from_vector_db": False, "error": str(e)}
 
-        # DB 삭제
+        # DB 삭제 (문서의 적재 작업도 함께 삭제 → 실행 중인 작업은 다음 진행 보고에서 중단하고 올린 청크 정리)
         try:
+            db.query(models.IngestionJob).filter(models.IngestionJob.docs_id == docs_id).delete(
+                synchronize_session=False
+            )
             crud.delete_docs(db, docs_id=docs_id)
+            bump_versions([DOC_INDEX_VERSION_KEY])  # doc_filter → 컬렉션 인덱스 무효화
             db_deleted = True
             logger.info(f"DB에서 문서 삭제 완료: docs_id={docs_id}")
         except Exception as e:
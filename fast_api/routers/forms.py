@@ -8,6 +8,7 @@ import schemas
 import models
 from database import get_db
 import aiofiles
+from upload_stream import UploadTooLarge, save_upload
 import os
 from datetime import datetime
 import shutil
@@ -292,24 +293,15 @@ async def upload_file(
                 detail=f"허용되지 않는 파일 형식입니다. 허용되는 형식: {', '.join(allowed_extensions)}"
             )
         
-        # 파일 크기 검증 (10MB 제한)
-        file_size = 0
-        content = await file.read()
-        file_size = len(content)
-        
-        if file_size > 10 * 1024 * 1024:  # 10MB
-            raise HTTPException(
-                status_code=400,
-                detail="파일 크기가 너무 큽니다. 최대 10MB까지 업로드 가능합니다."
-            )
-        
-        # 파일 저장
+        # 파일 저장 (청크 단위 스트리밍, 10MB 초과 시 기록 도중 중단)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{timestamp}_{file.filename}"
         file_path = os.path.join(UPLOAD_DIR, filename)
-        
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
+        try:
+            stored = await save_upload(file, file_path, max_bytes=10 * 1024 * 1024, strip_bom=False)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        file_size = stored.size
         
         upload_response = {
             "filename": filename,
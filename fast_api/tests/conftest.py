@@ -0,0 +1,9 @@
+import os
+import sys
+
+# 라우터/모델은 fast_api 디렉토리 기준 import (main.py와 동일)
+FAST_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if FAST_API_DIR not in sys.path:
+    sys.path.insert(0, FAST_API_DIR)
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")  # RAG 모듈 import 시 클라이언트 생성용 (호출하지 않음)
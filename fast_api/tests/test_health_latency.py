@@ -0,0 +1,74 @@
+# 이벤트 루프 블로킹 테스트: RAG 요청 N개가 그래프를 실행하는 동안 /health가 제한 시간 안에 응답하는지 확인
+# (graph.invoke를 블로킹 sleep으로 대체, DB/LLM 없이 앱 라우팅 + RAG 스레드 풀만 사용)
+import time
+import types
+import asyncio
+
+import httpx
+import pytest
+
+RAG_SECONDS = 0.5  # 요청당 그래프 실행 시간 (블로킹)
+RAG_REQUESTS = 4
+HEALTH_BOUND = 0.2  # 초, 루프가 막히면 RAG_SECONDS 이상 걸림
+
+
+@pytest.fixture
+def app(monkeypatch):
+    import models
+    monkeypatch.setattr(models.Base.metadata, "create_all", lambda *args, **kwargs: None)  # 테이블 생성(DB 연결) 생략
+    import main
+    import crud
+    from database import get_db
+    from routers import chat
+
+    def blocking_invoke(state):
+        time.sleep(RAG_SECONDS)
+        return {**state, "answer": "답변", "contexts": []}
+
+    monkeypatch.setattr(chat, "RAG_AVAILABLE", True)
+    monkeypatch.setattr(chat, "graph", types.SimpleNamespace(invoke=blocking_invoke))
+    monkeypatch.setattr(chat, "rag_module", types.SimpleNamespace(
+        lookup_cached_answer=lambda state: (None, None),
+        store_cached_answer=lambda state, result, ticket: None,
+        chat_history=types.SimpleNamespace(record_message=lambda *args: None),
+    ))
+    monkeypatch.setattr(chat, "render_context_list", lambda contexts: [])
+    monkeypatch.setattr(chat, "prepare_rag_state", lambda request, db: (1, {
+        "question": request.question, "chat_history": [], "rewrite_count": 0, "session_id": "1",
+        "user_department_id": request.department_id, "doc_filter": request.doc_filter
+    }))
+    monkeypatch.setattr(crud, "create_chat_message", lambda db, message: types.SimpleNamespace(message_id=1))
+    main.app.dependency_overrides[get_db] = lambda: None
+    yield main.app
+    main.app.dependency_overrides.pop(get_db, None)
+
+
+async def measure(app):
+    """RAG 요청을 동시에 보내고, 처리되는 동안 /health 지연 시간(초) 목록 반환"""
+    payload = {"question": "연차 신청 방법 알려줘", "user_id": 1, "department_id": 1, "doc_filter": []}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        start = time.perf_counter()
+        rag_requests = [asyncio.create_task(client.post("/api/chat/rag", json=payload)) for _ in range(RAG_REQUESTS)]
+        await asyncio.sleep(0.05)  # RAG 요청이 풀에 들어갈 때까지
+
+        latencies = []
+        while not all(task.done() for task in rag_requests):
+            probe = time.perf_counter()
+            response = await client.get("/health")
+            assert response.status_code == 200
+            latencies.append(time.perf_counter() - probe)
+            await asyncio.sleep(0.02)
+
+        responses = await asyncio.gather(*rag_requests)
+        return latencies, responses, time.perf_counter() - start
+
+
+def test_health_stays_responsive_while_rag_runs(app):
+    latencies, responses, elapsed = asyncio.run(measure(app))
+
+    assert [response.status_code for response in responses] == [200] * RAG_REQUESTS
+    assert all(response.json()["answer"] == "답변" for response in responses)
+    assert elapsed >= RAG_SECONDS  # /health 측정이 RAG 실행 중에 이뤄짐
+    assert len(latencies) >= 5
+    assert max(latencies) < HEALTH_BOUND, f"/health 지연 {max(latencies):.3f}초 (RAG 실행 중 이벤트 루프 블로킹)"
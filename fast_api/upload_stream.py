@@ -0,0 +1,88 @@
+# 업로드 파일 스트리밍 저장
+#
+# - UploadFile을 UPLOAD_CHUNK_SIZE 단위로 읽어 바로 디스크에 기록 (업로드당 메모리 ≈ 청크 크기)
+# - 기록하면서 SHA-256을 갱신하고, 누적 크기가 한도를 넘는 순간 중단 (UploadTooLarge)
+# - .txt/.md는 첫 청크에서 UTF-8 BOM을 제거 (저장 후 다시 읽고 쓰지 않음)
+# - 임시 파일(.part)에 쓰고 끝까지 성공했을 때만 최종 경로로 이동 → 실패 시 부분 파일이 남지 않음
+import os
+import hashlib
+import logging
+from typing import NamedTuple, Optional
+
+import aiofiles
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 바이트
+
+UTF8_BOM = b"\xef\xbb\xbf"
+BOM_STRIP_EXTENSIONS = (".txt", ".md")
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"파일 크기가 너무 큽니다. 최대 {max_bytes // (1024 * 1024)}MB까지 업로드 가능합니다.")
+        self.max_bytes = max_bytes
+
+
+class StoredUpload(NamedTuple):
+    path: str
+    size: int  # 저장된 바이트 수 (BOM 제거 후)
+    sha256: str  # 저장된 내용의 해시
+    bom_stripped: bool
+
+
+async def save_upload(file: UploadFile, dest_path: str, max_bytes: Optional[int] = None,
+                      strip_bom: Optional[bool] = None, chunk_size: int = UPLOAD_CHUNK_SIZE) -> StoredUpload:
+    """
+    업로드 파일을 청크 단위로 dest_path에 저장
+    Args:
+        max_bytes: 최대 크기 (None이면 제한 없음), 초과 시 UploadTooLarge
+        strip_bom: UTF-8 BOM 제거 여부 (None이면 확장자가 .txt/.md일 때)
+    """
+    if strip_bom is None:
+        strip_bom = os.path.splitext(file.filename or dest_path)[1].lower() in BOM_STRIP_EXTENSIONS
+    # 멀티파트 파싱 때 크기가 이미 알려졌으면 읽기 전에 거절
+    if max_bytes is not None and file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    part_path = f"{dest_path}.part"
+    digest = hashlib.sha256()
+    received = written = 0
+    head = b""  # BOM 판별 전까지 모아 두는 앞부분 (최대 3바이트)
+    bom_stripped = False
+    try:
+        async with aiofiles.open(part_path, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if max_bytes is not None and received > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                if strip_bom:
+                    head += chunk
+                    if len(head) < len(UTF8_BOM) and UTF8_BOM.startswith(head):
+                        continue
+                    if head.startswith(UTF8_BOM):
+                        head, bom_stripped = head[len(UTF8_BOM):], True
+                    chunk, head, strip_bom = head, b"", False
+                digest.update(chunk)
+                written += len(chunk)
+                await out.write(chunk)
+            if head:  # BOM 앞부분처럼 보였던 3바이트 미만 파일
+                digest.update(head)
+                written += len(head)
+                await out.write(head)
+        os.replace(part_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+
+    if bom_stripped:
+        logger.info(f"📎 BOM 제거 후 저장: {dest_path}")
+    return StoredUpload(dest_path, written, digest.hexdigest(), bom_stripped)